@@ -0,0 +1,129 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+
+from .config import settings
+
+# Number of recent wait times kept for the percentile in stats()
+_WAIT_SAMPLES = 1000
+_MAX_RETRY_AFTER = 60
+
+
+class AdmissionController:
+    """
+    Admission control for the OCR path: at most `limit` requests run at once,
+    up to `max_waiting` more wait their turn in FIFO order, and the rest are
+    turned away immediately instead of piling up decoded images in memory.
+
+    A request that can't even join the queue gets a 429; one that waited longer
+    than `max_wait_seconds` gets a 503. Both carry a Retry-After estimated from
+    the current queue and recent service times.
+    """
+
+    def __init__(self, limit: int, max_waiting: int, max_wait_seconds: float):
+        self.limit = max(1, limit)
+        self.max_waiting = max_waiting
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._wait_ms: deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        # Moving average of how long an admitted request holds its slot
+        self._service_seconds = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would likely be admitted."""
+        batches_ahead = (len(self._waiters) + 1) / self.limit
+        return min(_MAX_RETRY_AFTER, max(1, math.ceil(batches_ahead * self._service_seconds)))
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after())}
+        )
+
+    async def _acquire(self) -> None:
+        start = time.monotonic()
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+        else:
+            if len(self._waiters) >= self.max_waiting:
+                self.rejected_queue_full += 1
+                raise self._reject(429, "Too many receipts are being processed. Please try again shortly.")
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait_seconds)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just as we gave up: pass it on
+                    self._release()
+                else:
+                    waiter.cancel()
+                    self._waiters.remove(waiter)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.rejected_timeout += 1
+                raise self._reject(503, "Timed out waiting for an OCR worker. Please try again shortly.")
+
+        self.admitted += 1
+        self._wait_ms.append((time.monotonic() - start) * 1000)
+
+    def _release(self) -> None:
+        # Hand the slot straight to the next waiter, so nobody can jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Holds one of the `limit` slots for the duration of the block.
+
+        :raises HTTPException: 429 if the wait queue is full, 503 if no slot
+                               freed up within `max_wait_seconds`.
+        """
+        await self._acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_seconds = 0.9 * self._service_seconds + 0.1 * (time.monotonic() - start)
+            self._release()
+
+    def stats(self) -> dict:
+        """Current queue depth, rejection counters and recent wait times."""
+        waits = sorted(self._wait_ms)
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "max_waiting": self.max_waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_ms": {
+                "mean": sum(waits) / len(waits) if waits else 0.0,
+                "p95": waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0,
+                "max": waits[-1] if waits else 0.0,
+            },
+            "service_seconds_avg": self._service_seconds,
+            "retry_after": self.retry_after(),
+        }
+
+
+ocr_admission = AdmissionController(
+    limit=settings.OCR_WORKERS,
+    max_waiting=settings.OCR_ADMISSION_MAX_WAITING,
+    max_wait_seconds=settings.OCR_ADMISSION_WAIT_SECONDS,
+)
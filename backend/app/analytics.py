@@ -1,5 +1,5 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import case, select, func
 from . import schemas
 import asyncio
 
@@ -17,15 +17,30 @@ async def get_spending_by_category(db: AsyncSession):
     return result.all()
 
 async def get_spending_by_merchant(db: AsyncSession):
-    """Calculates total spending for each merchant."""
-    query = (
+    """
+    Calculates total spending for each canonical merchant (see merchants.py), so
+    the spellings of one store add up. Totals are grouped by the integer merchant
+    id, and only the top merchants are joined to their names. Expenses not
+    linked to a merchant (not backfilled yet, or whose name normalized to
+    nothing) are grouped by the name they were saved with.
+    """
+    unlinked_name = case((schemas.Expense.merchant_id.is_(None), schemas.Expense.merchant))
+    totals = (
         select(
-            schemas.Expense.merchant.label("name"),
+            schemas.Expense.merchant_id,
+            unlinked_name.label("merchant"),
             func.sum(schemas.Expense.normalized_amount).label("total")
         )
-        .group_by(schemas.Expense.merchant)
+        .group_by(schemas.Expense.merchant_id, unlinked_name)
         .order_by(func.sum(schemas.Expense.normalized_amount).desc())
         .limit(20) # Limit to top 20 merchants for clarity
+        .subquery()
+    )
+    query = (
+        select(func.coalesce(schemas.Merchant.name, totals.c.merchant).label("name"), totals.c.total)
+        .select_from(totals)
+        .outerjoin(schemas.Merchant, schemas.Merchant.id == totals.c.merchant_id)
+        .order_by(totals.c.total.desc())
     )
     result = await db.execute(query)
     return result.all()
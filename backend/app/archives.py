@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import zipfile
+from typing import AsyncIterator, BinaryIO
+
+from fastapi import HTTPException
+
+from . import admission, crud, ocr, parser, receipts, uploads
+from .config import settings
+from .database import AsyncSessionLocal
+
+RECEIPT_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp", ".bmp", ".pdf"}
+
+
+class ArchiveTooLarge(Exception):
+    pass
+
+
+def _receipt_members(archive: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    """Receipt files in the archive, skipping folders and macOS metadata."""
+    return [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not os.path.basename(info.filename).startswith(".")
+        and "__MACOSX/" not in info.filename
+        and os.path.splitext(info.filename)[1].lower() in RECEIPT_EXTENSIONS
+    ]
+
+
+def _read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, budget: int) -> bytes:
+    """
+    Decompresses one member, counting the bytes actually produced rather than
+    trusting the sizes in the zip headers, which a zip bomb can fake.
+
+    :raises ArchiveTooLarge: If the member is bigger than the per-file upload
+                             limit or than the remaining `budget`.
+    """
+    limit = min(settings.OCR_MAX_UPLOAD_BYTES, budget)
+    with archive.open(info) as member:
+        data = member.read(limit + 1)
+    if len(data) > limit:
+        if limit == budget:
+            raise ArchiveTooLarge(
+                f"The archive expands to more than {settings.ZIP_MAX_UNCOMPRESSED_BYTES} bytes."
+            )
+        raise HTTPException(status_code=413, detail=f"'{info.filename}' is larger than the upload limit.")
+    return data
+
+
+async def _process_member(
+    index: int, name: str, data: bytes, create_expenses: bool, category: str, locale: str
+) -> dict:
+    try:
+        uploads.check_receipt_header(data, name)
+        if create_expenses:
+            # ingest_receipt takes an OCR slot for the OCR itself
+            async with AsyncSessionLocal() as db:
+                expense = await receipts.ingest_receipt(db, data, category=category)
+            return {"index": index, "filename": name, "expense_id": str(expense.id)}
+
+        async with admission.ocr_admission.slot():
+            result = await ocr.extract_receipt_data(data)
+        return {
+            "index": index,
+            "filename": name,
+            "parsed_data": receipts.jsonable(parser.parse_receipt(result["text"], locale)),
+            "field_confidence": ocr.field_confidences(result),
+        }
+    except HTTPException as e:
+        return {"index": index, "filename": name, "error": e.detail}
+    except Exception as e:
+        return {"index": index, "filename": name, "error": f"Could not process file: {e}"}
+
+
+async def stream_zip_receipts(zip_file: BinaryIO, create_expenses: bool, category: str) -> AsyncIterator[str]:
+    """
+    Reads receipts out of a zip archive one member at a time and OCRs them in
+    parallel, yielding one NDJSON line per receipt as it finishes (the parsed
+    fields, or the created expense id with `create_expenses`).
+
+    Only as many members as there are OCR workers are decompressed at once, and
+    the total decompressed size is capped at ZIP_MAX_UNCOMPRESSED_BYTES.
+    Takes ownership of `zip_file` and closes it when done.
+    """
+    pending: set[asyncio.Task] = set()
+    try:
+        try:
+            archive = zipfile.ZipFile(zip_file)
+        except zipfile.BadZipFile:
+            yield json.dumps({"error": "The upload is not a valid zip archive."}) + "\n"
+            return
+
+        async with AsyncSessionLocal() as db:
+            locale = (await crud.get_user_preferences(db)).locale
+
+        with archive:
+            members = _receipt_members(archive)
+            if len(members) > settings.ZIP_MAX_MEMBERS:
+                yield json.dumps({"error": f"The archive has more than {settings.ZIP_MAX_MEMBERS} receipts."}) + "\n"
+                return
+
+            budget = settings.ZIP_MAX_UNCOMPRESSED_BYTES
+            for index, info in enumerate(members):
+                # Backpressure: wait for a worker to free up before decompressing the next member
+                while len(pending) >= settings.OCR_WORKERS:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield json.dumps(task.result()) + "\n"
+
+                try:
+                    data = await asyncio.to_thread(_read_member, archive, info, budget)
+                except ArchiveTooLarge as e:
+                    yield json.dumps({"error": str(e)}) + "\n"
+                    break
+                except HTTPException as e:
+                    yield json.dumps({"index": index, "filename": info.filename, "error": e.detail}) + "\n"
+                    continue
+                except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                    # Corrupt or encrypted member
+                    yield json.dumps({"index": index, "filename": info.filename, "error": f"Could not extract: {e}"}) + "\n"
+                    continue
+                budget -= len(data)
+                pending.add(asyncio.create_task(
+                    _process_member(index, info.filename, data, create_expenses, category, locale)
+                ))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield json.dumps(task.result()) + "\n"
+    finally:
+        # Client went away: don't keep OCRing for nobody
+        for task in pending:
+            task.cancel()
+        zip_file.close()
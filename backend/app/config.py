@@ -1,3 +1,4 @@
+import os
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -6,6 +7,95 @@ class Settings(BaseSettings):
 
     # For external currency conversion API
     EXCHANGE_RATE_API_KEY: str = ""
+
+    # OCR worker pool: number of processes, how many jobs may be queued or
+    # running at once, and how long a single OCR job may take. OCR_MAX_QUEUE only
+    # turns away a request's first job; the up to OCR_WORKERS strips or PDF page
+    # batches it then fans out into are always queued (see ocr.run_in_pool).
+    OCR_WORKERS: int = os.cpu_count() or 1
+    OCR_MAX_QUEUE: int = 32
+    OCR_TIMEOUT_SECONDS: float = 30.0
+    # Admission control for OCR requests: OCR_WORKERS run at once, up to
+    # OCR_ADMISSION_MAX_WAITING more wait at most OCR_ADMISSION_WAIT_SECONDS,
+    # anything beyond that is rejected straight away
+    OCR_ADMISSION_MAX_WAITING: int = 64
+    OCR_ADMISSION_WAIT_SECONDS: float = 10.0
+    # "pytesseract" (tesseract subprocess per call) or "tesserocr" (warm in-process engine)
+    OCR_BACKEND: str = "pytesseract"
+    OCR_LANG: str = "eng"
+    # "full" reads the whole page. "roi" runs a low-resolution layout pass first and
+    # then only reads the header and the totals/date lines at full resolution,
+    # falling back to the full page when no amount is found.
+    OCR_MODE: str = "full"
+    OCR_LAYOUT_SCALE: float = 0.5
+    OCR_ROI_HEADER_LINES: int = 3
+    # Fast/accurate cascade: OCR with a cheap profile (smaller text, --psm 6, a
+    # digit-friendly whitelist on totals bands) and only re-run with the accurate
+    # settings when the parser can't find the amount, date or merchant.
+    OCR_CASCADE: bool = False
+    OCR_FAST_TEXT_HEIGHT: int = 22
+    # A fast result is also escalated if any field was read below this confidence (0-1)
+    OCR_CASCADE_MIN_CONFIDENCE: float = 0.6
+    # Receipts at least OCR_STRIP_MIN_ASPECT times taller than wide are cut into
+    # overlapping strips that are OCRed in parallel (full page, accurate profile).
+    OCR_STRIPS: bool = True
+    OCR_STRIP_MIN_ASPECT: float = 2.5
+    OCR_BATCH_MAX_FILES: int = 100
+
+    # Upload limits. Images are rejected from their header alone if they exceed
+    # OCR_MAX_PIXELS, and JPEGs are decoded at reduced scale (Image.draft) so the
+    # long side is no bigger than needed for OCR_DECODE_MAX_SIDE.
+    OCR_MAX_UPLOAD_BYTES: int = 15 * 1024 * 1024
+    OCR_MAX_PIXELS: int = 40_000_000
+    OCR_DECODE_MAX_SIDE: int = 4000
+    # PDF pages without a text layer are rendered at this resolution for OCR
+    OCR_PDF_DPI: int = 200
+    OCR_PDF_MAX_PAGES: int = 50
+    # Zip archives of receipts: upload size, number of receipts, and the total size
+    # the members may expand to (zip bomb guard)
+    ZIP_MAX_UPLOAD_BYTES: int = 500 * 1024 * 1024
+    ZIP_MAX_MEMBERS: int = 2000
+    ZIP_MAX_UNCOMPRESSED_BYTES: int = 2 * 1024 * 1024 * 1024
+
+    # Receipt images are kept in this directory, re-encoded (WEBP or JPEG) with
+    # the longest side capped, plus thumbnails for listings
+    RECEIPT_STORE_DIR: str = "receipt_images"
+    RECEIPT_IMAGE_FORMAT: str = "WEBP"
+    RECEIPT_IMAGE_MAX_SIDE: int = 2000
+    RECEIPT_IMAGE_QUALITY: int = 80
+    RECEIPT_THUMBNAIL_SIZE: int = 320
+
+    # Receipts whose perceptual hashes differ by at most this many bits (of 64),
+    # and that have the same amount and date, are flagged as the same receipt
+    # added twice.
+    DUPLICATE_MAX_DISTANCE: int = 8
+    # A merchant name spelled in a way not seen before joins the known merchant whose
+    # spelling is most similar (Dice coefficient of character trigrams, 0-1) if it is
+    # at least this similar, and becomes a new merchant otherwise.
+    MERCHANT_MATCH_THRESHOLD: float = 0.7
+    # Number of background OCR jobs (POST /ocr/jobs) processed at once
+    OCR_JOB_WORKERS: int = 2
+    # A job that finds the OCR queue full waits and retries this many times, doubling
+    # the wait each time from OCR_JOB_RETRY_SECONDS, before it fails
+    OCR_JOB_MAX_RETRIES: int = 6
+    OCR_JOB_RETRY_SECONDS: float = 1.0
+
+    # OCR result cache. Leave OCR_CACHE_DIR empty to keep the cache in memory only.
+    OCR_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    OCR_CACHE_DIR: str = ""
+
+    # Image preprocessing before OCR; each step can be switched off on its own.
+    # Images are shrunk until a line of text is about OCR_TARGET_TEXT_HEIGHT pixels
+    # tall (or to OCR_TARGET_DPI when no lines can be measured).
+    OCR_PREPROCESS_EXIF: bool = True
+    OCR_PREPROCESS_GRAYSCALE: bool = True
+    OCR_PREPROCESS_DOWNSCALE: bool = True
+    OCR_PREPROCESS_BINARIZE: bool = True
+    OCR_PREPROCESS_CROP: bool = True
+    OCR_TARGET_TEXT_HEIGHT: int = 32
+    OCR_TARGET_DPI: int = 300
+    OCR_BINARIZE_RADIUS: int = 15
+    OCR_BINARIZE_OFFSET: int = 10
     
     # model_config replaces the old `class Config`
     model_config = SettingsConfigDict(env_file="../.env")
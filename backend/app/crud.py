@@ -2,7 +2,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from fastapi import HTTPException
 from uuid import UUID
-from . import models, schemas, currency
+from . import models, schemas, currency, merchants, phash, receipt_text
 
 async def get_user_preferences(db: AsyncSession) -> schemas.UserPreferences:
     """
@@ -34,9 +34,12 @@ async def update_user_preferences(db: AsyncSession, prefs_data: models.UserPrefe
     await db.refresh(prefs)
     return prefs
 
-async def create_expense(db: AsyncSession, expense: models.ExpenseCreate) -> schemas.Expense:
+async def create_expense(db: AsyncSession, expense: models.ExpenseCreate, **receipt_fields) -> schemas.Expense:
     """
     Creates a new expense in the database, including currency conversion.
+    `receipt_fields` fills the extra columns known when the expense was read
+    from a receipt (e.g. ocr_confidence, image_phash). The expense's OCR text,
+    if given, is stored compressed.
     """
     # Fetch user preferences to get the base currency
     user_prefs = await get_user_preferences(db)
@@ -58,9 +61,18 @@ async def create_expense(db: AsyncSession, expense: models.ExpenseCreate) -> sch
     # Calculate the normalized amount
     normalized_amount = expense.amount * exchange_rate
 
+    expense_values = expense.model_dump(exclude={"ocr_text"})
+    if expense.ocr_text is not None:
+        receipt_fields["ocr_text"] = receipt_text.compress(expense.ocr_text)
+        receipt_fields["ocr_fields"] = receipt_text.parser_fields(
+            expense_values, expense.ocr_text, user_prefs.locale
+        )
+
     db_expense = schemas.Expense(
-        **expense.model_dump(),
-        normalized_amount=normalized_amount
+        **expense_values,
+        normalized_amount=normalized_amount,
+        merchant_id=await merchants.resolve(db, expense.merchant),
+        **receipt_fields,
     )
     
     db.add(db_expense)
@@ -92,6 +104,9 @@ async def update_expense(db: AsyncSession, expense_id: UUID, expense_data: model
         if key in ["amount", "currency"]:
             recalculate_normalized = True
 
+    if "merchant" in update_data:
+        db_expense.merchant_id = await merchants.resolve(db, db_expense.merchant)
+
     if recalculate_normalized:
         user_prefs = await get_user_preferences(db)
         exchange_rate = await currency.get_exchange_rate(db_expense.currency, user_prefs.base_currency)
@@ -112,4 +127,5 @@ async def delete_expense(db: AsyncSession, expense_id: UUID) -> schemas.Expense
     
     await db.delete(db_expense)
     await db.commit()
+    phash.index.discard(expense_id)
     return db_expense
\ No newline at end of file
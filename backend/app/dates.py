@@ -0,0 +1,198 @@
+"""
+Date recognition for receipts.
+
+parser.tokenize() finds the candidate spans (numeric dates such as 2024-03-15,
+15.03.2024 or 03/15/24, month names, and date keywords) in its single scan;
+this module turns them into dates and scores them. Each numeric shape has a
+precomputed list of readings (field order and plausibility), so parsing is a
+table lookup plus integer checks rather than strptime calls that fail.
+
+A candidate's score combines how plausible its format is, whether its field
+order matches the user's locale (DD/MM vs MM/DD), and how close it is to a
+keyword such as "Date:".
+"""
+import re
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Month names and abbreviations, lowercase, in the languages our users write in.
+# Words that are also common English words on receipts ("set", "ago") are left out.
+MONTH_NAMES = {
+    1: ("january", "jan", "januar", "janvier", "janv", "enero", "ene", "gennaio", "januari"),
+    2: ("february", "feb", "februar", "février", "févr", "fevrier", "febrero", "febbraio", "februari"),
+    3: ("march", "mar", "märz", "mär", "mrz", "mars", "marzo", "maart", "mrt"),
+    4: ("april", "apr", "avril", "avr", "abril", "abr", "aprile"),
+    5: ("may", "mai", "mayo", "maggio", "mei"),
+    6: ("june", "jun", "juni", "juin", "junio", "giugno"),
+    7: ("july", "jul", "juli", "juillet", "juil", "julio", "luglio"),
+    8: ("august", "aug", "août", "aout", "agosto", "augustus"),
+    9: ("september", "sep", "sept", "septembre", "septiembre", "settembre"),
+    10: ("october", "oct", "oktober", "okt", "octobre", "octubre", "ottobre"),
+    11: ("november", "nov", "novembre", "noviembre"),
+    12: ("december", "dec", "dezember", "dez", "décembre", "déc", "decembre", "diciembre", "dic", "dicembre"),
+}
+MONTHS = {name: month for month, names in MONTH_NAMES.items() for name in names}
+
+# Words that label the receipt's date
+DATE_KEYWORDS = ("date", "dated", "datum", "fecha", "data")
+
+# Field order most locales write numeric dates in; unlisted regions are day first
+_MONTH_FIRST_REGIONS = frozenset({"US", "PH", "FM", "MH", "PW", "GU", "AS", "PR", "VI", "UM", "BZ"})
+_YEAR_FIRST_REGIONS = frozenset({"CN", "JP", "KR", "KP", "TW", "HU", "LT", "MN", "IR", "SE"})
+_YEAR_FIRST_LANGUAGES = frozenset({"zh", "ja", "ko", "hu", "lt", "mn", "fa"})
+
+
+class DateReading(NamedTuple):
+    order: str  # "YMD", "MDY" or "DMY"
+    plausibility: float
+
+
+def _numeric_readings() -> dict:
+    """
+    (separator, digits in each part) -> possible readings, best first.
+    Built once at import; only the shapes listed here are ever read as dates.
+    """
+    table = {}
+    for separator in "-/.":
+        # ISO-like: the year first; dashes are by far the most common
+        for month_digits in (1, 2):
+            for day_digits in (1, 2):
+                table[(separator, 4, month_digits, day_digits)] = [
+                    DateReading("YMD", 1.0 if separator == "-" and month_digits == day_digits == 2 else 0.8)
+                ]
+        # Day and month first, 4- or 2-digit year; dots are a European habit
+        for first_digits in (1, 2):
+            for second_digits in (1, 2):
+                for year_digits in (4, 2):
+                    base = 0.8 if year_digits == 4 else 0.6
+                    month_first = DateReading("MDY", base)
+                    day_first = DateReading("DMY", base + (0.1 if separator == "." else 0.0))
+                    table[(separator, first_digits, second_digits, year_digits)] = sorted(
+                        (month_first, day_first), key=lambda reading: -reading.plausibility
+                    )
+    return table
+
+
+_NUMERIC_READINGS = _numeric_readings()
+_NUMERIC_PARTS = re.compile(r'(\d+)([-/.])(\d+)\2(\d+)')
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+# Receipts are never older or much newer than this
+MIN_YEAR, MAX_YEAR = 1990, 2099
+
+# Score bonuses
+_LOCALE_BONUS = 0.3
+_KEYWORD_SAME_LINE_BONUS = 0.5
+_KEYWORD_PREVIOUS_LINE_BONUS = 0.2
+
+
+@lru_cache(maxsize=64)
+def date_order(locale: Optional[str]) -> str:
+    """
+    The field order a locale writes numeric dates in: "MDY", "DMY" or "YMD".
+    Accepts tags like "en-US", "de_DE" or "fr"; None means US-style MDY.
+    """
+    if not locale:
+        return "MDY"
+    parts = locale.replace("_", "-").split("-")
+    language = parts[0].lower()
+    region = next((part.upper() for part in parts[1:] if len(part) == 2), None)
+    if region in _MONTH_FIRST_REGIONS:
+        return "MDY"
+    if region in _YEAR_FIRST_REGIONS or (region is None and language in _YEAR_FIRST_LANGUAGES):
+        return "YMD"
+    if region is None and language == "en":
+        return "MDY"
+    return "DMY"
+
+
+def make_date(year: int, month: int, day: int) -> Optional[date]:
+    """The date, or None if the fields don't form one (no exceptions involved)."""
+    if not (MIN_YEAR <= year <= MAX_YEAR and 1 <= month <= 12 and day >= 1):
+        return None
+    days = _DAYS_IN_MONTH[month - 1]
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        days = 29
+    return date(year, month, day) if day <= days else None
+
+
+def expand_year(digits: str) -> int:
+    """Two-digit years pivot like strptime's %y: 69-99 -> 19xx, 00-68 -> 20xx."""
+    year = int(digits)
+    if len(digits) == 2:
+        return year + (1900 if year >= 69 else 2000)
+    return year
+
+
+def numeric_candidates(value: str) -> list[tuple[date, str, float]]:
+    """
+    Every valid reading of a numeric date like "03/04/24", as (date, order,
+    plausibility), best first.
+    """
+    match = _NUMERIC_PARTS.fullmatch(value)
+    if not match:
+        return []
+    first, separator, second, third = match.groups()
+    readings = _NUMERIC_READINGS.get((separator, len(first), len(second), len(third)))
+    if not readings:
+        return []
+
+    candidates = []
+    for order, plausibility in readings:
+        if order == "YMD":
+            found = make_date(int(first), int(second), int(third))
+        elif order == "MDY":
+            found = make_date(expand_year(third), int(first), int(second))
+        else:
+            found = make_date(expand_year(third), int(second), int(first))
+        if found is not None:
+            candidates.append((found, order, plausibility))
+    return candidates
+
+
+# A month name with the day before it ("15 Mar 2024", "15. März 2024") or after it
+# ("Mar 15, 2024"), matched around a month token on the lowercased text
+_DAY_BEFORE = re.compile(r'(\d{1,2})(?:st|nd|rd|th)?[\s.,/-]{0,3}$')
+_YEAR_AFTER = re.compile(r"[\s.,/'-]{0,3}(\d{4}|\d{2})(?!\d)")
+_DAY_YEAR_AFTER = re.compile(r'[\s./-]{0,3}(\d{1,2})(?:st|nd|rd|th)?(?!\d)[\s.,/-]{0,3}(\d{4}|\d{2})(?!\d)')
+
+
+def textual_candidate(lowered: str, start: int, end: int) -> Optional[tuple[date, int, int, float]]:
+    """
+    Reads a date around the month name at lowered[start:end].
+
+    :return: (date, span start, span end, plausibility), or None if there is no
+             day and year next to the month.
+    """
+    month = MONTHS[lowered[start:end]]
+    before = _DAY_BEFORE.search(lowered, max(0, start - 8), start)
+    if before and (before.start() == 0 or not lowered[before.start() - 1].isdigit()):
+        year = _YEAR_AFTER.match(lowered, end)
+        if year:
+            found = make_date(expand_year(year.group(1)), month, int(before.group(1)))
+            if found:
+                return found, before.start(), year.end(), _textual_plausibility(year.group(1))
+
+    after = _DAY_YEAR_AFTER.match(lowered, end)
+    if after:
+        found = make_date(expand_year(after.group(2)), month, int(after.group(1)))
+        if found:
+            return found, start, after.end(), _textual_plausibility(after.group(2))
+    return None
+
+
+def _textual_plausibility(year_digits: str) -> float:
+    return 0.9 if len(year_digits) == 4 else 0.7
+
+
+def score(plausibility: float, order: Optional[str], locale_order: str, line: int, keyword_lines: set) -> float:
+    """Score of a date candidate: format plausibility plus locale and keyword bonuses."""
+    total = plausibility
+    # Unambiguous forms (year first, month names) count as agreeing with any locale
+    if order is None or order == "YMD" or order == locale_order:
+        total += _LOCALE_BONUS
+    if line in keyword_lines:
+        total += _KEYWORD_SAME_LINE_BONUS
+    elif line - 1 in keyword_lines:
+        total += _KEYWORD_PREVIOUS_LINE_BONUS
+    return total
@@ -0,0 +1,257 @@
+"""
+Hot-folder receipt ingestion daemon.
+
+Watches a directory for scanned receipts (images or PDFs) and pushes each one
+through OCR -> parser.parse_receipt -> crud.create_expense (via
+receipts.ingest_receipt). Processed files are moved to `done/` or, with an
+`.error.txt` note next to them, to `failed/`.
+
+    python -m app.hotfolder /srv/receipts --workers 4
+
+Files are claimed by moving them into `processing/`; anything left there by a
+crash is picked up again on the next start. Content hashes of ingested files are
+kept in `.processed`, so the same file dropped twice is only ingested once; the
+expense itself also records the hash, which covers a crash between its insert
+and the ledger write. Files the OCR pool is too busy for (503, 504) are retried
+later; other errors move them to `failed/`.
+Uses inotify (through the optional `watchdog` package) to notice new files
+immediately, and falls back to polling the directory.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+from . import merchants, migrations, ocr, phash, receipts, uploads
+from .config import settings
+from .database import AsyncSessionLocal, engine
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional dependency
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp", ".bmp", ".pdf"}
+# A file must be left untouched this long before we read it, so scanners can finish writing
+_SETTLE_SECONDS = 2.0
+# Files turned away by a busy or timed-out OCR pool are retried after these many
+# seconds, doubling each time, before they are given up on
+_RETRY_SECONDS = 5.0
+_MAX_RETRIES = 5
+_RETRY_STATUSES = (503, 504)
+
+
+class HotFolder:
+    def __init__(self, root: str, workers: int, poll_interval: float, category: str):
+        self.root = os.path.abspath(root)
+        self.processing_dir = os.path.join(self.root, "processing")
+        self.done_dir = os.path.join(self.root, "done")
+        self.failed_dir = os.path.join(self.root, "failed")
+        self.ledger_path = os.path.join(self.root, ".processed")
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.category = category
+        # Bounded, so the scanner stops claiming files while the workers are behind
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=workers * 2)
+        self.wake = asyncio.Event()
+        self.processed_hashes: set[str] = set()
+        self.retries: dict[str, int] = {}
+        self.retry_tasks: set[asyncio.Task] = set()
+
+    def _setup(self) -> None:
+        for directory in (self.processing_dir, self.done_dir, self.failed_dir):
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.ledger_path):
+            with open(self.ledger_path) as f:
+                self.processed_hashes = {line.split()[0] for line in f if line.strip()}
+
+    def _record(self, content_hash: str, expense_id: str) -> None:
+        with open(self.ledger_path, "a") as f:
+            f.write(f"{content_hash} {expense_id}\n")
+        self.processed_hashes.add(content_hash)
+
+    @staticmethod
+    def _move(path: str, directory: str) -> str:
+        target = os.path.join(directory, os.path.basename(path))
+        if os.path.exists(target):
+            stem, extension = os.path.splitext(target)
+            target = f"{stem}-{int(time.time() * 1000)}{extension}"
+        os.replace(path, target)
+        return target
+
+    def _claimable(self) -> list[str]:
+        """Receipt files in the inbox that have finished being written, oldest first."""
+        now = time.time()
+        candidates = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in RECEIPT_EXTENSIONS:
+                    continue
+                stat = entry.stat()
+                if now - stat.st_mtime >= _SETTLE_SECONDS:
+                    candidates.append((stat.st_mtime, entry.path))
+        return [path for _, path in sorted(candidates)]
+
+    async def _scan(self) -> None:
+        # Resume files claimed before a crash
+        for name in sorted(os.listdir(self.processing_dir)):
+            await self.queue.put(os.path.join(self.processing_dir, name))
+
+        while True:
+            for path in self._claimable():
+                try:
+                    claimed = self._move(path, self.processing_dir)
+                except FileNotFoundError:
+                    continue  # removed while we were looking
+                await self.queue.put(claimed)
+
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=self.poll_interval)
+                # Let the file settle before it becomes claimable
+                await asyncio.sleep(_SETTLE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read(settings.OCR_MAX_UPLOAD_BYTES + 1)
+
+    async def _process(self, path: str) -> None:
+        data = await asyncio.to_thread(self._read, path)
+        if len(data) > settings.OCR_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="File is larger than the upload limit.")
+
+        content_hash = hashlib.sha256(data).hexdigest()
+        if content_hash in self.processed_hashes:
+            logger.info("%s was already ingested, skipping", os.path.basename(path))
+            self._move(path, self.done_dir)
+            return
+
+        uploads.check_receipt_header(data, os.path.basename(path))
+        async with AsyncSessionLocal() as db:
+            # Ingested, but we crashed before writing the ledger
+            expense = await receipts.find_ingested(db, content_hash)
+            if expense is None:
+                # Bounded by the worker count, so it doesn't queue for admission
+                expense = await receipts.ingest_receipt(db, data, category=self.category, admit=False)
+            expense_id = expense.id
+        self._record(content_hash, str(expense_id))
+        self._move(path, self.done_dir)
+        logger.info("Ingested %s as expense %s", os.path.basename(path), expense_id)
+
+    def _fail(self, path: str, reason: str) -> None:
+        logger.warning("Failed to ingest %s: %s", os.path.basename(path), reason)
+        target = self._move(path, self.failed_dir)
+        with open(f"{target}.error.txt", "w") as f:
+            f.write(f"{reason}\n")
+
+    def _retry(self, path: str, reason: str) -> None:
+        """Puts a file back on the queue after a backoff delay, or fails it after _MAX_RETRIES."""
+        attempt = self.retries.get(path, 0)
+        if attempt == _MAX_RETRIES:
+            del self.retries[path]
+            self._fail(path, f"{reason} (gave up after {_MAX_RETRIES} retries)")
+            return
+        self.retries[path] = attempt + 1
+        delay = _RETRY_SECONDS * 2 ** attempt
+        logger.info("Retrying %s in %.0fs: %s", os.path.basename(path), delay, reason)
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            await self.queue.put(path)
+
+        # The file stays in processing/, so a restart picks it up even if this never runs
+        task = asyncio.create_task(requeue())
+        self.retry_tasks.add(task)
+        task.add_done_callback(self.retry_tasks.discard)
+
+    async def _worker(self) -> None:
+        while True:
+            path = await self.queue.get()
+            try:
+                await self._process(path)
+                self.retries.pop(path, None)
+            except HTTPException as e:
+                if e.status_code in _RETRY_STATUSES:
+                    self._retry(path, str(e.detail))
+                else:
+                    self.retries.pop(path, None)
+                    self._fail(path, str(e.detail))
+            except Exception as e:
+                logger.exception("Unexpected error while ingesting %s", path)
+                self.retries.pop(path, None)
+                self._fail(path, f"Unexpected error: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _watch(self, loop: asyncio.AbstractEventLoop):
+        """Starts an inotify watch that wakes the scanner, if watchdog is available."""
+        if Observer is None:
+            logger.info("watchdog is not installed; polling %s every %.0fs", self.root, self.poll_interval)
+            return None
+
+        wake = self.wake
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                loop.call_soon_threadsafe(wake.set)
+
+        observer = Observer()
+        observer.schedule(Handler(), self.root, recursive=False)
+        observer.start()
+        return observer
+
+    async def run(self) -> None:
+        self._setup()
+        async with engine.begin() as conn:
+            await conn.run_sync(migrations.upgrade)
+        async with AsyncSessionLocal() as db:
+            await phash.load_index(db)
+            await merchants.load_index(db)
+        ocr.start_ocr_pool()
+
+        observer = self._watch(asyncio.get_running_loop())
+        tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        tasks.append(asyncio.create_task(self._scan()))
+        logger.info("Watching %s with %d workers", self.root, self.workers)
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in [*tasks, *self.retry_tasks]:
+                task.cancel()
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            ocr.shutdown_ocr_pool()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Ingest receipts dropped into a directory.")
+    arg_parser.add_argument("directory", help="Directory to watch")
+    arg_parser.add_argument("--workers", type=int, default=settings.OCR_WORKERS, help="Receipts processed at once")
+    arg_parser.add_argument("--poll-interval", type=float, default=10.0, help="Seconds between directory scans")
+    arg_parser.add_argument("--category", default="Uncategorized", help="Category for created expenses")
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    folder = HotFolder(args.directory, args.workers, args.poll_interval, args.category)
+    try:
+        asyncio.run(folder.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Content-addressed on-disk store for receipt images.
+
+Images are re-encoded (WebP or JPEG, longest side capped) and saved under the
+SHA-256 of the stored bytes, sharded two directory levels deep, next to a small
+thumbnail:
+
+    RECEIPT_STORE_DIR/ab/cd/abcd...ef.webp
+    RECEIPT_STORE_DIR/ab/cd/abcd...ef.thumb.webp
+
+PDFs are kept as uploaded, with a thumbnail of their first page. Identical
+images are stored once, and files never change once written, so they can be
+served with a strong ETag and cached forever.
+"""
+import hashlib
+import io
+import os
+import re
+import tempfile
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from . import pdf
+from .config import settings
+
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+MEDIA_TYPES = {".webp": "image/webp", ".jpg": "image/jpeg", ".pdf": "application/pdf"}
+_THUMB_DPI = 50
+
+
+def _shard_dir(image_hash: str) -> str:
+    return os.path.join(settings.RECEIPT_STORE_DIR, image_hash[:2], image_hash[2:4])
+
+
+def _encode(image: Image.Image, max_side: int, quality: int) -> tuple[bytes, str]:
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    if settings.RECEIPT_IMAGE_FORMAT.upper() == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=4)
+        return buffer.getvalue(), ".webp"
+    image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue(), ".jpg"
+
+
+def _open(image_data: bytes) -> Image.Image:
+    # Not preprocess.open_image: that may decode JPEGs in grayscale for OCR, and
+    # at the OCR size rather than the stored one
+    Image.MAX_IMAGE_PIXELS = settings.OCR_MAX_PIXELS
+    image = Image.open(io.BytesIO(image_data))
+    if image.width * image.height > settings.OCR_MAX_PIXELS:
+        raise Image.DecompressionBombError(f"Image has {image.width * image.height} pixels")
+    if image.format == "JPEG":
+        scale = min(1.0, settings.RECEIPT_IMAGE_MAX_SIDE / max(image.size))
+        image.draft(image.mode, (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    return image
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Write to a temporary name and rename, so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def store(image_data: bytes) -> str:
+    """
+    Re-encodes and saves a receipt image (or PDF) with its thumbnail.
+    CPU bound: run it in the OCR pool.
+
+    :return: The SHA-256 hex digest the image is stored under.
+    """
+    if pdf.is_pdf(image_data):
+        data, extension = image_data, ".pdf"
+        first_page = pdf.render_page(image_data, 0, dpi=_THUMB_DPI)
+    else:
+        image = ImageOps.exif_transpose(_open(image_data))
+        data, extension = _encode(image, settings.RECEIPT_IMAGE_MAX_SIDE, settings.RECEIPT_IMAGE_QUALITY)
+        first_page = image
+
+    image_hash = hashlib.sha256(data).hexdigest()
+    directory = _shard_dir(image_hash)
+    path = os.path.join(directory, image_hash + extension)
+    if os.path.exists(path):
+        return image_hash
+
+    os.makedirs(directory, exist_ok=True)
+    thumbnail, thumb_extension = _encode(first_page, settings.RECEIPT_THUMBNAIL_SIZE, settings.RECEIPT_IMAGE_QUALITY)
+    # Thumbnail first: once the main file exists the entry counts as complete
+    _write_atomic(os.path.join(directory, f"{image_hash}.thumb{thumb_extension}"), thumbnail)
+    _write_atomic(path, data)
+    return image_hash
+
+
+def find(image_hash: str, thumbnail: bool = False) -> Optional[tuple[str, str]]:
+    """
+    Locates a stored image or its thumbnail.
+
+    :return: (path, media type), or None if there is no such image.
+    """
+    if not HASH_PATTERN.match(image_hash):
+        return None
+    directory = _shard_dir(image_hash)
+    for extension, media_type in MEDIA_TYPES.items():
+        if thumbnail and extension == ".pdf":
+            continue
+        path = os.path.join(directory, f"{image_hash}.thumb{extension}" if thumbnail else image_hash + extension)
+        if os.path.isfile(path):
+            return path, media_type
+    return None
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from typing import Optional
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, ocr, schemas
+from .config import settings
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("done", "failed")
+_KEEPALIVE_SECONDS = 15
+
+_queue: "asyncio.Queue[UUID]" = asyncio.Queue()
+_workers: list[asyncio.Task] = []
+# Set whenever a job changes state, one per open event stream; the streams wait
+# on these instead of polling the DB
+_changed: dict[UUID, set[asyncio.Event]] = {}
+
+
+def _notify(job_id: UUID) -> None:
+    for event in _changed.pop(job_id, ()):
+        event.set()
+
+
+async def stream_events(job_id: UUID):
+    """
+    Yields server-sent events for a job: one `status` event per state change,
+    ending once the job is done or failed. Comments are sent periodically to keep
+    idle connections open through proxies.
+    """
+    last_status = None
+    changed = asyncio.Event()
+    try:
+        while True:
+            # Register before reading, so a change between the read and the wait isn't missed
+            changed.clear()
+            _changed.setdefault(job_id, set()).add(changed)
+            async with AsyncSessionLocal() as db:
+                job = await db.get(schemas.OcrJob, job_id)
+            if job is None:
+                return
+
+            if job.status != last_status:
+                last_status = job.status
+                payload = models.OcrJob.model_validate(job).model_dump_json()
+                yield f"event: status\ndata: {payload}\n\n"
+            if job.status in FINISHED_STATUSES:
+                return
+
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        # The stream ended or the client went away: stop listening
+        listeners = _changed.get(job_id)
+        if listeners is not None:
+            listeners.discard(changed)
+            if not listeners:
+                del _changed[job_id]
+
+
+async def create_job(db: AsyncSession, image_data: bytes, filename: Optional[str]) -> schemas.OcrJob:
+    """Stores a new OCR job and queues it for the workers."""
+    job = schemas.OcrJob(image_data=image_data, filename=filename, status="queued")
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    _queue.put_nowait(job.id)
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: UUID) -> Optional[schemas.OcrJob]:
+    """Retrieves a single OCR job by its ID."""
+    return await db.get(schemas.OcrJob, job_id)
+
+
+async def _set_status(job_id: UUID, **values) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(schemas.OcrJob).where(schemas.OcrJob.id == job_id).values(**values))
+        await db.commit()
+    _notify(job_id)
+
+
+async def _run_job(job_id: UUID) -> None:
+    async with AsyncSessionLocal() as db:
+        job = await db.get(schemas.OcrJob, job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return
+        image_data = job.image_data
+
+    await _set_status(job_id, status="running")
+    for attempt in range(settings.OCR_JOB_MAX_RETRIES + 1):
+        try:
+            text = await ocr.extract_text_from_image(image_data)
+            break
+        except ocr.OcrQueueFull as e:
+            # The shared OCR queue is full; this job can wait its turn, up to a point
+            if attempt == settings.OCR_JOB_MAX_RETRIES:
+                await _set_status(job_id, status="failed", error=str(e.detail), image_data=None)
+                return
+            await asyncio.sleep(settings.OCR_JOB_RETRY_SECONDS * 2 ** attempt)
+        except HTTPException as e:
+            await _set_status(job_id, status="failed", error=str(e.detail), image_data=None)
+            return
+        except Exception as e:
+            logger.exception("OCR job %s failed", job_id)
+            await _set_status(job_id, status="failed", error=f"Could not process image: {e}", image_data=None)
+            return
+
+    # The image is no longer needed once we have the text
+    await _set_status(job_id, status="done", text=text, image_data=None)
+
+
+async def _worker() -> None:
+    while True:
+        job_id = await _queue.get()
+        try:
+            await _run_job(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error while running OCR job %s", job_id)
+        finally:
+            _queue.task_done()
+
+
+async def start_workers() -> None:
+    """
+    Re-queues jobs left unfinished by a previous run and starts the job workers.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(schemas.OcrJob.id)
+            .where(schemas.OcrJob.status.in_(["queued", "running"]))
+            .order_by(schemas.OcrJob.created_at)
+        )
+        for job_id in result.scalars().all():
+            _queue.put_nowait(job_id)
+
+    for _ in range(settings.OCR_JOB_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+
+
+async def stop_workers() -> None:
+    """Cancels the job workers. Unfinished jobs stay in the table and resume on next start."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
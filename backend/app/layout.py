@@ -0,0 +1,177 @@
+import statistics
+from typing import Optional
+
+from . import parser
+
+# Tokens of a line the parser reads the total or the date from: total keywords,
+# numeric dates in any field order, month names and date keywords ("Date:")
+_BAND_TOKENS = frozenset(('keyword', 'date', 'month', 'date_keyword'))
+
+
+def _is_totals_or_date_line(text: str) -> bool:
+    return any(token[0] in _BAND_TOKENS for token in parser.tokenize(text))
+
+
+def group_lines(words: list[dict]) -> list[dict]:
+    """
+    Groups word boxes from ocr_engines.image_to_data into text lines,
+    ordered top to bottom. Each line has `text`, `left`, `top`, `right`, `bottom`
+    and the `words` it was built from.
+    """
+    lines: dict[int, dict] = {}
+    for word in words:
+        line = lines.get(word["line"])
+        right, bottom = word["left"] + word["width"], word["top"] + word["height"]
+        if line is None:
+            lines[word["line"]] = {
+                "text": word["text"],
+                "left": word["left"], "top": word["top"], "right": right, "bottom": bottom,
+                "words": [word],
+            }
+        else:
+            line["text"] += " " + word["text"]
+            line["left"] = min(line["left"], word["left"])
+            line["top"] = min(line["top"], word["top"])
+            line["right"] = max(line["right"], right)
+            line["bottom"] = max(line["bottom"], bottom)
+            line["words"].append(word)
+    return sorted(lines.values(), key=lambda l: l["top"])
+
+
+def find_roi_bands(
+    lines: list[dict], scale: float, image_height: int, header_lines: int
+) -> Optional[list[tuple[int, int, bool]]]:
+    """
+    Picks the horizontal bands of a receipt the parser actually needs: the first
+    `header_lines` lines (merchant), and every line that mentions a total or looks
+    like a date. Lines come from a layout pass run on an image shrunk by `scale`;
+    the bands are returned as (top, bottom, is_header) in full-resolution pixels,
+    merged where they overlap.
+
+    :return: The bands, or None if the layout pass found nothing worth cropping to.
+    """
+    if not lines:
+        return None
+
+    header = lines[:header_lines]
+    totals = [
+        line for line in lines[header_lines:]
+        if _is_totals_or_date_line(line["text"])
+    ]
+    if not totals and len(lines) > header_lines:
+        # No totals line found at low resolution; a crop would just miss the amount
+        return None
+
+    # Pad every band by a line height so low-resolution boxes that are slightly off
+    # don't clip characters.
+    padding = statistics.median(line["bottom"] - line["top"] for line in lines)
+    bands = sorted(
+        (
+            max(0, (line["top"] - padding) / scale),
+            min(image_height, (line["bottom"] + padding) / scale),
+            is_header,
+        )
+        for is_header, group in ((True, header), (False, totals))
+        for line in group
+    )
+
+    merged = [list(bands[0])]
+    for top, bottom, is_header in bands[1:]:
+        if top <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], bottom)
+            merged[-1][2] = merged[-1][2] or is_header
+        else:
+            merged.append([top, bottom, is_header])
+    return [(int(top), int(round(bottom)), is_header) for top, bottom, is_header in merged]
+
+
+def plan_strips(text_rows: list[tuple[int, int]], height: int, count: int) -> list[tuple[int, int]]:
+    """
+    Splits a tall page into about `count` horizontal strips, cutting only in the
+    whitespace between text rows (from preprocess.find_text_rows) so no line is
+    sliced in half. Each strip also starts one line above its cut, so lines on
+    the boundary are read in full twice and merge_strip_lines() can drop the copy.
+
+    :return: (top, bottom) pixel ranges, top to bottom.
+    """
+    gaps = [(end + next_start) // 2 for (_, end), (next_start, _) in zip(text_rows, text_rows[1:])]
+    if not gaps or count < 2:
+        return [(0, height)]
+
+    cut_indexes = []
+    for k in range(1, count):
+        target = height * k / count
+        index = min(range(len(gaps)), key=lambda i: abs(gaps[i] - target))
+        if not cut_indexes or index > cut_indexes[-1]:
+            cut_indexes.append(index)
+
+    strips = []
+    top = 0
+    for index in cut_indexes:
+        strips.append((top, gaps[index]))
+        # Overlap: the next strip starts at the gap before this cut
+        top = gaps[index - 1] if index > 0 else gaps[index]
+    strips.append((top, height))
+    return strips
+
+
+# Longest run of lines that can be duplicated where two strips overlap
+_MAX_OVERLAP_LINES = 5
+
+
+def _normalize_line(line: str) -> str:
+    return "".join(line.lower().split())
+
+
+def merge_strip_lines(strips: list[list[list[dict]]]) -> list[list[dict]]:
+    """
+    Joins the OCR lines (see ocr_lines) of overlapping strips in order, dropping
+    the lines at the start of each strip that repeat the end of the previous one.
+    """
+    merged: list[list[dict]] = []
+    for lines in strips:
+        tail = [_normalize_line(line_text(line)) for line in merged[-_MAX_OVERLAP_LINES:]]
+        head = [_normalize_line(line_text(line)) for line in lines[:_MAX_OVERLAP_LINES]]
+        overlap = 0
+        for k in range(min(len(tail), len(head)), 0, -1):
+            if tail[-k:] == head[:k]:
+                overlap = k
+                break
+        merged.extend(lines[overlap:])
+    return merged
+
+
+def ocr_lines(words: list[dict]) -> list[list[dict]]:
+    """
+    Reduces word boxes from ocr_engines.image_to_data to what the rest of the
+    pipeline needs: lines top to bottom, each a list of {"text", "conf"} words.
+    """
+    return [
+        [{"text": word["text"], "conf": word["conf"]} for word in line["words"]]
+        for line in group_lines(words)
+    ]
+
+
+def line_text(line: list[dict]) -> str:
+    return " ".join(word["text"] for word in line)
+
+
+def build_ocr_result(lines: list[list[dict]]) -> dict:
+    """
+    Builds the OCR result passed around the app: the receipt `text`, and its
+    `words`, each with a confidence (0-100) and its (start, end) span in the text.
+    """
+    words = []
+    parts = []
+    offset = 0
+    for line in lines:
+        for i, word in enumerate(line):
+            if i:
+                parts.append(" ")
+                offset += 1
+            words.append({"text": word["text"], "conf": word["conf"], "start": offset, "end": offset + len(word["text"])})
+            parts.append(word["text"])
+            offset += len(word["text"])
+        parts.append("\n")
+        offset += 1
+    return {"text": "".join(parts), "words": words}
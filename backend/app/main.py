@@ -1,13 +1,16 @@
-from fastapi import FastAPI, Depends, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import BinaryIO, List
 from uuid import UUID
+import asyncio
 import io
 import csv
+import json
 
-from . import crud, models, ocr, analytics  # Added analytics import
-from .database import engine, Base, get_db
+from . import crud, models, admission, image_store, ocr, ocr_cache, jobs, merchants, migrations, parser, phash, receipts, uploads, archives, analytics  # Added analytics import
+from .database import engine, get_db, AsyncSessionLocal
+from .config import settings
 
 
 app = FastAPI(
@@ -20,22 +23,256 @@ app = FastAPI(
 @app.on_event("startup")
 async def on_startup():
     """
-    Create database tables on startup.
+    Create database tables on startup, and add columns newer than the database.
     """
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)  
-        # For production, you would use a migration tool like Alembic
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(migrations.upgrade)
+    async with AsyncSessionLocal() as db:
+        await phash.load_index(db)
+        await merchants.load_index(db)
+    ocr.start_ocr_pool()
+    await jobs.start_workers()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """
+    Stop the OCR job workers and worker processes.
+    """
+    await jobs.stop_workers()
+    ocr.shutdown_ocr_pool()
+
+
+# Room for multipart boundaries, part headers and the small form fields next to a file
+_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def _max_request_bytes(path: str) -> int | None:
+    """The largest request body an upload route accepts, None for other routes."""
+    if path == "/ocr/receipts/batch":
+        return (settings.OCR_MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD_BYTES) * settings.OCR_BATCH_MAX_FILES
+    if path == "/receipts/zip":
+        return settings.ZIP_MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD_BYTES
+    if path.startswith(("/ocr/", "/receipts/")):
+        return settings.OCR_MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD_BYTES
+    return None
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Rejects oversized OCR uploads from their Content-Length, before the
+    multipart body is parsed, with the limit of the route: one file, a batch of
+    files or a zip archive. Individual files are also capped while being read.
+    """
+    max_request_bytes = _max_request_bytes(request.url.path.rstrip("/"))
+    if max_request_bytes is not None:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_request_bytes:
+            return JSONResponse(status_code=413, content={"detail": "Upload is too large."})
+    return await call_next(request)
 
 
 @app.post("/ocr/receipt")
-async def ocr_receipt(file: UploadFile = File(...)):
+async def ocr_receipt(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    """
+    Accepts a receipt image or PDF, performs OCR, and returns the extracted text with its
+    overall and per-field (amount, date, merchant) confidence, both 0-1, and the fields
+    parsed from it. Send the text back as the expense's `ocr_text` when saving it.
+    """
+    async with admission.ocr_admission.slot():
+        image_data = await uploads.read_receipt_upload(file)
+        result = await ocr.extract_receipt_data(image_data)
+    prefs = await crud.get_user_preferences(db)
+    return {
+        "text": result["text"],
+        "confidence": ocr.mean_confidence(result),
+        "field_confidence": ocr.field_confidences(result),
+        "parsed_data": receipts.jsonable(parser.parse_receipt(result["text"], locale=prefs.locale)),
+    }
+
+
+async def _ocr_batch_item(index: int, filename: str, upload: BinaryIO, limiter: asyncio.Semaphore) -> dict:
+    """
+    OCRs one spooled file of a batch, and closes it; failures are reported per
+    item instead of failing the batch.
+    """
+    try:
+        async with limiter:
+            try:
+                # Read only now, so just the files being OCRed are held in memory
+                image_data = upload.read()
+                uploads.check_receipt_header(image_data, filename)
+                async with admission.ocr_admission.slot():
+                    text = await ocr.extract_text_from_image(image_data)
+            except HTTPException as e:
+                return {"index": index, "filename": filename, "error": e.detail}
+            except Exception as e:
+                return {"index": index, "filename": filename, "error": f"Could not process image: {e}"}
+    finally:
+        upload.close()
+    return {"index": index, "filename": filename, "text": text}
+
+
+@app.post("/ocr/receipts/batch")
+async def ocr_receipts_batch(files: List[UploadFile] = File(...), stream: bool = False):
+    """
+    Accepts many receipt images and OCRs them in parallel across the worker pool.
+
+    By default returns all results in input order. With `?stream=true` each result
+    is sent as a line of NDJSON as soon as it finishes; use `index` to match it
+    back to its file.
+    """
+    if len(files) > settings.OCR_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch can contain at most {settings.OCR_BATCH_MAX_FILES} files."
+        )
+
+    # Copy every file up front, as uploaded files may be closed before a streamed
+    # response finishes; spooled to disk, so a full batch isn't held in memory.
+    batch = []
+    try:
+        for file in files:
+            batch.append((file.filename, await uploads.spool_upload(file, settings.OCR_MAX_UPLOAD_BYTES)))
+    except BaseException:
+        for _, upload in batch:
+            upload.close()
+        raise
+
+    # Keep this batch's in-flight jobs to the pool size, so a big batch keeps every
+    # worker busy without filling the shared OCR queue and starving other requests.
+    limiter = asyncio.Semaphore(settings.OCR_WORKERS)
+    tasks = [
+        asyncio.create_task(_ocr_batch_item(index, filename, upload, limiter))
+        for index, (filename, upload) in enumerate(batch)
+    ]
+
+    if not stream:
+        return {"results": await asyncio.gather(*tasks)}
+
+    async def ndjson():
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away: don't keep OCRing for nobody
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.post("/ocr/jobs", response_model=models.OcrJob, status_code=202)
+async def create_ocr_job(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    """
+    Queues a receipt image for OCR and returns the job immediately.
+    Poll GET /ocr/jobs/{job_id} or subscribe to /ocr/jobs/{job_id}/events for the result.
+    """
+    image_data = await uploads.read_receipt_upload(file)
+    return await jobs.create_job(db, image_data=image_data, filename=file.filename)
+
+
+@app.get("/ocr/jobs/{job_id}", response_model=models.OcrJob)
+async def read_ocr_job(job_id: UUID, db: AsyncSession = Depends(get_db)):
+    """
+    Retrieve the status, and once done the text, of an OCR job.
+    """
+    job = await jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job
+
+
+@app.get("/ocr/jobs/{job_id}/events")
+async def stream_ocr_job_events(job_id: UUID, db: AsyncSession = Depends(get_db)):
+    """
+    Server-sent events with the job's status each time it changes, until it finishes.
+    """
+    if await jobs.get_job(db, job_id) is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return StreamingResponse(
+        jobs.stream_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/ocr/cache/stats")
+def read_ocr_cache_stats():
+    """
+    Hit/miss counters and memory usage of the OCR result cache.
+    """
+    return ocr_cache.cache.stats()
+
+
+@app.get("/ocr/admission/stats")
+def read_ocr_admission_stats():
+    """
+    Queue depth, rejections and recent wait times of OCR admission control.
     """
-    Accepts a receipt image, performs OCR, and returns the extracted text.
+    return admission.ocr_admission.stats()
+
+
+@app.post("/receipts/ingest", response_model=models.Expense)
+async def ingest_receipt_endpoint(
+    file: UploadFile = File(...),
+    category: str = Form("Uncategorized"),
+    notes: str | None = Form(None),
+    currency: str | None = Form(None, max_length=3),
+    reject_duplicate: bool = Form(False),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Creates an expense straight from a receipt image: OCR, parsing, currency
+    detection and normalization all happen server-side. Returns the created expense,
+    with `duplicate_of` set if it looks like an already ingested receipt (or 409
+    instead with reject_duplicate), or 422 with the partially parsed fields if the
+    amount or date can't be read.
+    """
+    image_data = await uploads.read_receipt_upload(file)
+    return await receipts.ingest_receipt(
+        db, image_data, category=category, notes=notes, currency=currency,
+        reject_duplicate=reject_duplicate,
+    )
+
+
+@app.post("/receipts/zip")
+async def import_receipts_zip(
+    file: UploadFile = File(...),
+    create_expenses: bool = Form(False),
+    category: str = Form("Uncategorized"),
+):
     """
-    image_data = await file.read()
-    extracted_text = await ocr.extract_text_from_image(image_data)
-    return {"text": extracted_text}
+    Accepts a zip archive of receipt images/PDFs and streams back one NDJSON line
+    per receipt as it is processed: the parsed fields, or with `create_expenses`
+    the id of the created expense. Members are extracted one at a time and fed to
+    the OCR workers as they are read.
+    """
+    zip_file = await uploads.spool_upload(file, settings.ZIP_MAX_UPLOAD_BYTES)
+    return StreamingResponse(
+        archives.stream_zip_receipts(zip_file, create_expenses=create_expenses, category=category),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.get("/receipts/{image_hash}")
+def read_receipt_image(image_hash: str, request: Request, thumbnail: bool = False):
+    """
+    Serves a stored receipt image (or its thumbnail) straight from disk, with
+    Range support. Stored files never change, so they carry a strong ETag and
+    may be cached indefinitely.
+    """
+    found = image_store.find(image_hash, thumbnail=thumbnail)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Receipt image not found")
+    path, media_type = found
+
+    etag = f'"{image_hash}.thumb"' if thumbnail else f'"{image_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
 
 
 @app.get("/")
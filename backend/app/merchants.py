@@ -0,0 +1,294 @@
+"""
+Canonical merchants.
+
+Receipts spell the same store many ways ("WAL*MART SUPERCTR #1234", "Walmart
+Supercenter 0042"), so every expense is also linked to a canonical merchant.
+A merchant name is first normalized (case, punctuation, store numbers, common
+abbreviations). Every normalized spelling seen so far is an alias of one
+merchant, in the merchant_aliases table. A new spelling is matched against the
+known ones through an in-memory trigram index. It becomes an alias of the
+closest merchant if it is similar enough, or else a new merchant.
+
+Expenses created before merchants existed are linked with:
+
+    python -m app.merchants
+"""
+import argparse
+import asyncio
+import logging
+import re
+from collections import Counter
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import schemas
+from .config import settings
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Longer forms of the abbreviations that card terminals print to fit their line width
+ABBREVIATIONS = {
+    "superctr": "supercenter", "suprctr": "supercenter", "sprctr": "supercenter", "supercentre": "supercenter",
+    "ctr": "center", "centre": "center", "mkt": "market", "mkts": "markets", "mrkt": "market",
+    "phcy": "pharmacy", "pharm": "pharmacy", "rest": "restaurant", "rstrnt": "restaurant",
+    "whse": "warehouse", "wholesle": "wholesale", "intl": "international", "svc": "service",
+    "svcs": "services", "&": "and",
+}
+# Words that don't tell stores apart: payment processor prefixes and company suffixes
+NOISE_WORDS = frozenset({
+    "sq", "tst", "paypal", "pp", "sp", "inc", "llc", "ltd", "corp", "co", "gmbh", "plc", "store", "no",
+})
+# Words, keeping hyphenated codes like "T-1234" together so their numbers can be dropped
+_WORD_PATTERN = re.compile(r"[^\W_]+(?:-[^\W_]+)*|&")
+# Numbers marked as store numbers: "#1234", "No. 42"
+_STORE_NUMBER_PATTERN = re.compile(r"(?:#|\bno\b\.?)\s*\d[^\W_]*(?:-[^\W_]+)*")
+_APOSTROPHES = str.maketrans("", "", "'’`")
+
+
+def _has_digit(word: str) -> bool:
+    return any(c.isdigit() for c in word)
+
+
+def normalize(name: str) -> str:
+    """
+    The key a merchant name is matched by: lowercase words, without punctuation,
+    store numbers or noise words, with abbreviations spelled out.
+    "WAL*MART SUPERCTR #1234" -> "wal mart supercenter", "7-Eleven 35512" -> "7 eleven".
+    """
+    name = name.casefold().translate(_APOSTROPHES)
+    # Store and terminal numbers differ from branch to branch: marked ones
+    # anywhere, and numbers or codes after the name. Digits that are part of the
+    # name, as in "3M" or "7-Eleven", stay, and so does a name that is only a number.
+    words = _WORD_PATTERN.findall(_STORE_NUMBER_PATTERN.sub(" ", name)) or _WORD_PATTERN.findall(name)
+    while len(words) > 1 and _has_digit(words[-1]) and any(c.isalpha() for word in words[:-1] for c in word):
+        words.pop()
+
+    parts = []
+    for word in words:
+        for part in word.split("-"):
+            part = ABBREVIATIONS.get(part, part)
+            if part not in NOISE_WORDS:
+                parts.append(part)
+    return " ".join(parts)[:100]
+
+
+def trigrams(key: str) -> frozenset:
+    """
+    Character trigrams of a normalized name, ignoring spaces (so "wal mart" and
+    "walmart" agree) and marking where it starts and ends.
+    """
+    padded = "^" + key.replace(" ", "") + "$"
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class MerchantIndex:
+    """
+    Every known alias (normalized spelling) and the merchant it belongs to, with
+    an inverted index from trigram to aliases. Exact spellings are a dict
+    lookup; a new spelling is compared only with the aliases it shares a trigram
+    with, which keeps a search sub-millisecond for tens of thousands of aliases.
+    Aliases are added one at a time as they are learnt; nothing is ever rebuilt.
+    """
+
+    def __init__(self):
+        self._merchants: dict[str, int] = {}
+        self._trigrams: dict[str, frozenset] = {}
+        self._postings: dict[str, set] = {}
+
+    def __len__(self) -> int:
+        return len(self._merchants)
+
+    def add(self, key: str, merchant_id: int) -> None:
+        if self._merchants.get(key) == merchant_id:
+            return
+        self._merchants[key] = merchant_id
+        if key not in self._trigrams:
+            grams = trigrams(key)
+            self._trigrams[key] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+
+    def items(self):
+        """(alias, merchant id) pairs."""
+        return self._merchants.items()
+
+    def lookup(self, key: str) -> Optional[int]:
+        """The merchant of an alias seen before, else None."""
+        return self._merchants.get(key)
+
+    def search(self, key: str, min_similarity: float) -> Optional[tuple[float, int]]:
+        """
+        The merchant whose alias is most similar to `key`, by the Dice coefficient
+        of their trigrams, if it reaches `min_similarity`.
+
+        :return: (similarity, merchant id), or None.
+        """
+        query = trigrams(key)
+        shared = Counter()
+        for gram in query:
+            postings = self._postings.get(gram)
+            if postings:
+                shared.update(postings)
+
+        best = None
+        for alias, count in shared.items():
+            similarity = 2 * count / (len(query) + len(self._trigrams[alias]))
+            if similarity >= min_similarity and (best is None or similarity > best[0]):
+                best = (similarity, self._merchants[alias])
+        return best
+
+
+index = MerchantIndex()
+
+# Session.info key of the aliases learnt in a session's open transaction
+_PENDING = "merchant_aliases"
+
+
+def _pending(db: AsyncSession) -> MerchantIndex:
+    """
+    The aliases learnt in the session's current transaction. They only join the
+    shared index once it commits, so a rollback can't leave it pointing at
+    merchants that were never saved.
+    """
+    return db.info.setdefault(_PENDING, MerchantIndex())
+
+
+@event.listens_for(Session, "after_commit")
+def _index_committed_aliases(session: Session) -> None:
+    # Also called when a savepoint is released, which saves nothing yet
+    if session.in_nested_transaction():
+        return
+    pending = session.info.pop(_PENDING, None)
+    if pending is not None:
+        for key, merchant_id in pending.items():
+            index.add(key, merchant_id)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_uncommitted_aliases(session: Session, transaction) -> None:
+    # Runs after _index_committed_aliases on commit; on rollback it drops them
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+async def load_index(db: AsyncSession) -> None:
+    """Fills the in-memory index with every stored alias."""
+    result = await db.execute(select(schemas.MerchantAlias.alias, schemas.MerchantAlias.merchant_id))
+    for alias, merchant_id in result.all():
+        index.add(alias, merchant_id)
+
+
+async def _stored_merchant_id(db: AsyncSession, key: str) -> Optional[int]:
+    result = await db.execute(select(schemas.MerchantAlias.merchant_id).where(schemas.MerchantAlias.alias == key))
+    return result.scalar_one_or_none()
+
+
+async def resolve(db: AsyncSession, name: str) -> Optional[int]:
+    """
+    Returns the id of the canonical merchant for a merchant name, learning the
+    name's spelling as a new alias (and creating the merchant, if no known one
+    is similar enough) when it hasn't been seen before. New rows are flushed,
+    not committed; they are saved with the caller's transaction, and the
+    in-memory index learns them when that commits.
+
+    :return: The merchant id, or None if nothing is left of the name once normalized.
+    """
+    key = normalize(name)
+    if not key:
+        return None
+    pending = _pending(db)
+    merchant_id = index.lookup(key)
+    if merchant_id is None:
+        merchant_id = pending.lookup(key)
+    if merchant_id is not None:
+        return merchant_id
+
+    # Another process may have learnt this spelling after our index was loaded
+    merchant_id = await _stored_merchant_id(db, key)
+    if merchant_id is not None:
+        index.add(key, merchant_id)
+        return merchant_id
+
+    matches = [
+        match for match in (
+            index.search(key, settings.MERCHANT_MATCH_THRESHOLD),
+            pending.search(key, settings.MERCHANT_MATCH_THRESHOLD),
+        )
+        if match is not None
+    ]
+    merchant = None
+    if matches:
+        merchant_id = max(matches)[1]
+    else:
+        merchant = schemas.Merchant(name=key.title())
+        db.add(merchant)
+        await db.flush()
+        merchant_id = merchant.id
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    inserted = await db.execute(
+        dialect.insert(schemas.MerchantAlias)
+        .values(alias=key, merchant_id=merchant_id)
+        .on_conflict_do_nothing(index_elements=["alias"])
+    )
+    if inserted.rowcount == 0:
+        # A concurrent request learnt the same spelling first
+        if merchant is not None:
+            await db.delete(merchant)
+            await db.flush()
+        merchant_id = await _stored_merchant_id(db, key)
+        index.add(key, merchant_id)
+        return merchant_id
+    pending.add(key, merchant_id)
+    return merchant_id
+
+
+async def backfill(batch_size: int) -> int:
+    """Links every expense without a canonical merchant to one; returns how many were linked."""
+    linked = 0
+    last_id: Optional[UUID] = None
+    async with AsyncSessionLocal() as db:
+        await load_index(db)
+        while True:
+            query = (
+                select(schemas.Expense.id, schemas.Expense.merchant)
+                .where(schemas.Expense.merchant_id.is_(None))
+                .order_by(schemas.Expense.id)
+                .limit(batch_size)
+            )
+            if last_id is not None:
+                query = query.where(schemas.Expense.id > last_id)
+            rows = (await db.execute(query)).all()
+            if not rows:
+                return linked
+            last_id = rows[-1].id
+            updates = [
+                {"id": row.id, "merchant_id": merchant_id}
+                for row in rows
+                if (merchant_id := await resolve(db, row.merchant)) is not None
+            ]
+            if updates:
+                await db.execute(update(schemas.Expense), updates)
+            await db.commit()
+            linked += len(updates)
+            logger.info("Linked %d expenses to merchants", linked)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Link expenses without a canonical merchant to one.")
+    arg_parser.add_argument("--batch-size", type=int, default=1000, help="Expenses per transaction")
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    linked = asyncio.run(backfill(max(1, args.batch_size)))
+    logger.info("Done: linked %d expenses, %d known aliases", linked, len(index))
+
+
+if __name__ == "__main__":
+    main()
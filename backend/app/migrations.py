@@ -0,0 +1,45 @@
+"""
+Schema upgrades at startup.
+
+Base.metadata.create_all() creates missing tables but never touches existing
+ones, so a database created by an older version lacks the columns added since
+(image_phash, ocr_text, image_hash, source_hash, user_preferences.locale,
+merchant_id, ...). upgrade() adds them, with their indexes and foreign keys,
+before anything reads them. Columns are only ever added; nothing is altered or
+dropped.
+"""
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import AddConstraint, CreateColumn
+
+from . import schemas  # noqa: F401  (registers the tables on Base.metadata)
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade(connection: Connection) -> None:
+    """Creates missing tables and adds missing columns to existing ones. Run with AsyncConnection.run_sync."""
+    existing_tables = set(inspect(connection).get_table_names())
+    Base.metadata.create_all(connection)
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspect(connection).get_columns(table.name)}
+        added = [column for column in table.columns if column.name not in existing_columns]
+        for column in added:
+            logger.info("Adding column %s.%s", table.name, column.name)
+            ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+            # SQLite can't add constraints to an existing table
+            if connection.dialect.name != "sqlite":
+                for foreign_key in column.foreign_keys:
+                    connection.execute(AddConstraint(foreign_key.constraint))
+
+        added_names = {column.name for column in added}
+        for index in table.indexes:
+            if added_names & {column.name for column in index.columns}:
+                index.create(connection, checkfirst=True)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field, Json
 from uuid import UUID
+import datetime as dt
 from datetime import date, datetime
 from decimal import Decimal
 from typing import List, Optional
@@ -8,6 +9,8 @@ from typing import List, Optional
 class UserPreferences(BaseModel):
     base_currency: str = Field(default="USD", max_length=3)
     theme: str = "light"
+    # Decides how ambiguous receipt dates like 03/04/2024 are read (e.g. "en-GB" is day first)
+    locale: str = Field(default="en-US", max_length=35)
     custom_categories: Json | None = None
 
 # Pydantic model for creating an expense (input)
@@ -18,6 +21,9 @@ class ExpenseCreate(BaseModel):
     merchant: str
     date: date
     notes: str | None = None
+    # The OCR text the fields were read from (from POST /ocr/receipt), stored so
+    # the receipt can be re-parsed later
+    ocr_text: str | None = None
 
 # Pydantic model for representing an expense in the database (output)
 class Expense(BaseModel):
@@ -30,6 +36,10 @@ class Expense(BaseModel):
     date: date
     notes: str | None = None
     ocr_confidence: float | None = None
+    # Served at GET /receipts/{image_hash}
+    image_hash: str | None = None
+    # Set when the receipt looks like one already added; the expense it duplicates
+    duplicate_of: UUID | None = None
     created_at: datetime
 
     class Config:
@@ -40,7 +50,7 @@ class ExpenseUpdate(BaseModel):
     currency: str | None = None
     category: str | None = None
     merchant: str | None = None
-    date: date | None = None
+    date: dt.date | None = None
     notes: str | None = None
 
 # --- Add these new models for Analytics ---
@@ -60,4 +70,17 @@ class AnalyticsResponse(BaseModel):
     by_category: List[AnalyticsTotal]
     by_merchant: List[AnalyticsTotal]
     over_time: List[AnalyticsOverTime]
-    base_currency: str
\ No newline at end of file
+    base_currency: str
+
+class OcrJob(BaseModel):
+    """Status of an asynchronous OCR job."""
+    id: UUID
+    status: str  # queued, running, done or failed
+    filename: str | None = None
+    text: str | None = None
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,70 @@
+"""
+Money amounts as printed on receipts.
+
+parser.tokenize() finds amount-shaped runs of digits: with a two-digit
+decimal part after a dot or a comma (12.50, 12,50), with thousands grouped by
+dots, commas, apostrophes or spaces (1,234.56, 1.234,56, 1'234.50, 1 234,56,
+1,23,456.00), or plain integers next to a currency sign or code (¥1200). This
+module reads them as Decimals, using the currency's minor units where a shape
+is ambiguous: "1.250" is 1250 euros but 1.25 Kuwaiti dinars, and yen have no
+decimals.
+"""
+import re
+from decimal import Decimal
+from typing import Optional
+
+# ISO 4217 minor units of the currencies where they aren't 2
+CURRENCY_EXPONENTS = {
+    "JPY": 0, "KRW": 0, "VND": 0, "CLP": 0, "ISK": 0, "PYG": 0, "UGX": 0, "XAF": 0, "XOF": 0,
+    "BHD": 3, "KWD": 3, "OMR": 3, "JOD": 3, "TND": 3, "IQD": 3, "LYD": 3,
+}
+
+# Spaces that group thousands: plain, narrow no-break (French, SI) and no-break.
+# Only the no-break ones are unambiguous; a plain space also separates a quantity,
+# store number or time from a price (see parser.tokenize).
+NO_BREAK_SPACES = "\u202f\u00a0"
+GROUP_SPACES = " " + NO_BREAK_SPACES
+
+# Integer part either plain or grouped in threes by one separator (or in the Indian
+# lakh style, 1,23,456), then an optional two-digit decimal part after a dot or
+# comma that isn't the grouping separator.
+AMOUNT_PATTERN = re.compile(
+    rf"(\d{{1,3}}(?:([,.'{GROUP_SPACES}])\d{{3}}(?:\2\d{{3}})*|(?:,\d{{2}})+,\d{{3}})|\d+)"
+    r"(?:(?(2)(?!\2))[.,](\d{2}))?"
+)
+
+
+def exponent(currency: Optional[str]) -> int:
+    """Digits after the decimal point in `currency`; 2 if it's unknown."""
+    return CURRENCY_EXPONENTS.get(currency, 2)
+
+
+def read_amount(value: str, currency: Optional[str] = None) -> Optional[Decimal]:
+    """
+    Reads an amount such as "1,234.56", "1.234,56", "1 234,56" or "1200".
+
+    :param currency: The ISO code the amount is in, if known. In currencies with
+                     three decimals, a single group of three after the last
+                     separator is the decimal part; in ones without decimals,
+                     a nonzero decimal part means `value` isn't an amount.
+    :return: The amount, or None if `value` isn't shaped like one.
+    """
+    match = AMOUNT_PATTERN.fullmatch(value)
+    if not match:
+        return None
+    integer, separator, decimals = match.groups()
+    digits = exponent(currency)
+
+    if (
+        digits == 3 and decimals is None and separator and separator not in GROUP_SPACES
+        and integer.count(separator) == 1
+    ):
+        whole, _, decimals = integer.partition(separator)
+        return Decimal(f"{whole}.{decimals}")
+    if separator or "," in integer:
+        integer = integer.replace(separator or ",", "")
+    if decimals is None:
+        return Decimal(integer)
+    if digits == 0:
+        return Decimal(integer) if decimals == "00" else None
+    return Decimal(f"{integer}.{decimals}")
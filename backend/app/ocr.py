@@ -1,6 +1,364 @@
+import asyncio
+import io
+import json
+import logging
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
+from typing import Any, Callable, NamedTuple, Optional
+
 import pytesseract
+from fastapi import HTTPException
 from PIL import Image
-import io
+
+from . import dates, layout, ocr_cache, ocr_engines, parser, pdf, preprocess
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tesseract is CPU bound and blocks for seconds, so it never runs on the event loop.
+# The pool is created/torn down by the app lifecycle in main.py.
+_executor: Optional[ProcessPoolExecutor] = None
+_pending_jobs = 0
+# Cache keys currently being OCRed, so concurrent uploads of the same image share one job
+_inflight: dict[str, asyncio.Task] = {}
+
+
+class OcrQueueFull(HTTPException):
+    """The pool already has OCR_MAX_QUEUE jobs; unlike other 503s, retrying later is expected to work."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=503, detail="OCR queue is full. Please try again shortly.", headers={"Retry-After": "1"}
+        )
+
+
+def start_ocr_pool() -> None:
+    """Creates the OCR process pool if it isn't running yet."""
+    global _executor
+    if _executor is None:
+        ocr_engines.check_backend()
+        _executor = ProcessPoolExecutor(max_workers=settings.OCR_WORKERS, initializer=ocr_engines.warm_up)
+
+
+def shutdown_ocr_pool() -> None:
+    """Stops the OCR process pool, dropping any jobs that haven't started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def run_in_pool(
+    func: Callable[..., Any], *args: Any, timeout: Optional[float] = None, sub_job: bool = False
+) -> Any:
+    """
+    Runs `func(*args)` in the OCR process pool without blocking the event loop.
+
+    :param timeout: Seconds the job may take; OCR_TIMEOUT_SECONDS by default.
+    :param sub_job: The job is one of the parts (strips, PDF page batches) a request
+                    fanned out into after its first job was accepted. It counts
+                    towards the queue but is never turned away by OCR_MAX_QUEUE,
+                    so a request isn't failed halfway through.
+
+    :raises OcrQueueFull: If the queue is full.
+    :raises HTTPException: 503 if a worker died, 504 if the job times out.
+    """
+    global _executor, _pending_jobs
+    if _executor is None:
+        # Scripts and workers outside the FastAPI app don't go through startup
+        start_ocr_pool()
+
+    if _pending_jobs >= settings.OCR_MAX_QUEUE and not sub_job:
+        raise OcrQueueFull()
+
+    _pending_jobs += 1
+    executor = _executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(executor, func, *args),
+            timeout=timeout or settings.OCR_TIMEOUT_SECONDS,
+        )
+    except (asyncio.TimeoutError, TimeoutError):
+        raise HTTPException(status_code=504, detail="OCR timed out.")
+    except BrokenProcessPool:
+        # A worker died (killed for memory, or crashed in native code), which
+        # breaks the whole pool; every job in it fails, and the first one to
+        # get here replaces it.
+        if _executor is executor:
+            logger.error("OCR worker died; restarting the OCR pool")
+            executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+            start_ocr_pool()
+        raise HTTPException(
+            status_code=503, detail="OCR worker crashed. Please try again.", headers={"Retry-After": "1"}
+        )
+    finally:
+        _pending_jobs -= 1
+
+
+@lru_cache(maxsize=1)
+def _tesseract_version() -> str:
+    # get_tesseract_version() spawns a subprocess, so only ask once
+    try:
+        return str(pytesseract.get_tesseract_version())
+    except pytesseract.TesseractNotFoundError:
+        return "unknown"
+
+
+def ocr_config_fingerprint() -> str:
+    """Describes every setting that affects OCR output; part of the cache key."""
+    return (
+        f"backend={settings.OCR_BACKEND}:{settings.OCR_LANG},tesseract={_tesseract_version()};"
+        f"{preprocess.options_fingerprint()};mode={settings.OCR_MODE}:{settings.OCR_LAYOUT_SCALE}:"
+        f"{settings.OCR_ROI_HEADER_LINES};cascade={settings.OCR_CASCADE}:{settings.OCR_FAST_TEXT_HEIGHT};"
+        f"strips={settings.OCR_STRIPS}:{settings.OCR_STRIP_MIN_ASPECT};"
+        f"cascade_confidence={settings.OCR_CASCADE_MIN_CONFIDENCE};pdf_dpi={settings.OCR_PDF_DPI};"
+        f"totals_whitelist={_TOTALS_WHITELIST};result=words"
+    )
+
+
+def _remaining(deadline: float) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("OCR timed out")
+    return remaining
+
+
+# Tesseract page segmentation mode for a cropped band: a uniform block of text
+_PSM_SINGLE_BLOCK = 6
+# If the bands cover more than this share of the page, full-page OCR is cheaper
+_MAX_ROI_COVERAGE = 0.7
+
+
+def _totals_whitelist() -> str:
+    # Characters allowed in the totals and date bands in the fast profile: numbers,
+    # separators, currency signs and the letters of every word the parser reads
+    # there (total keywords, ISO currency codes, month names and date keywords)
+    words = [*parser.AMOUNT_KEYWORDS, *parser.CURRENCY_CODES, *dates.MONTHS, *dates.DATE_KEYWORDS]
+    letters = "".join(sorted(set("".join(words).lower())))
+    return "0123456789.,':/-" + "".join(parser.CURRENCY_SYMBOLS) + letters + letters.upper()
+
+
+_TOTALS_WHITELIST = _totals_whitelist()
+
+
+class OcrProfile(NamedTuple):
+    """Tesseract settings for one tier of the fast/accurate cascade."""
+    name: str
+    text_height: Optional[int]  # None uses OCR_TARGET_TEXT_HEIGHT
+    psm: Optional[int]  # None uses Tesseract's default page segmentation
+    totals_whitelist: Optional[str]  # only applied to totals bands in ROI mode
+
+
+def _fast_profile() -> OcrProfile:
+    return OcrProfile("fast", settings.OCR_FAST_TEXT_HEIGHT, _PSM_SINGLE_BLOCK, _TOTALS_WHITELIST)
+
+
+ACCURATE_PROFILE = OcrProfile("accurate", None, None, None)
+
+
+def _ocr_regions(image: Image.Image, profile: OcrProfile, deadline: float) -> Optional[list[list[dict]]]:
+    """
+    Two-pass OCR: a cheap layout pass on a shrunk copy finds the header and the
+    totals/date lines, then only those bands are read at full resolution.
+    Returns None when the layout doesn't allow a useful crop.
+    """
+    scale = settings.OCR_LAYOUT_SCALE
+    small = image
+    if scale < 1.0:
+        small = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.Resampling.BILINEAR,
+        )
+    words = ocr_engines.image_to_data(small, _remaining(deadline))
+    bands = layout.find_roi_bands(
+        layout.group_lines(words), scale, image.height, settings.OCR_ROI_HEADER_LINES
+    )
+    if not bands or sum(bottom - top for top, bottom, _ in bands) > _MAX_ROI_COVERAGE * image.height:
+        return None
+
+    lines = []
+    for top, bottom, is_header in bands:
+        band_words = ocr_engines.image_to_data(
+            image.crop((0, top, image.width, bottom)),
+            _remaining(deadline),
+            psm=_PSM_SINGLE_BLOCK,
+            whitelist=None if is_header else profile.totals_whitelist,
+        )
+        lines.extend(layout.ocr_lines(band_words))
+    return lines
+
+
+def _ocr_with_profile(image: Image.Image, profile: OcrProfile, deadline: float) -> dict:
+    image, _ = preprocess.preprocess_image(image, target_text_height=profile.text_height)
+
+    if settings.OCR_MODE == "roi":
+        lines = _ocr_regions(image, profile, deadline)
+        if lines is not None:
+            result = layout.build_ocr_result(lines)
+            # Fall back to the whole page if the crop lost the amount
+            if parser.parse_amount(result["text"]) is not None:
+                return result
+
+    words = ocr_engines.image_to_data(image, _remaining(deadline), psm=profile.psm)
+    return layout.build_ocr_result(layout.ocr_lines(words))
+
+
+def _ocr_image(image_data: bytes, timeout: float) -> tuple[dict, str]:
+    """
+    Worker-side OCR. Must stay a module-level function so it can be pickled.
+
+    :return: The OCR result (see layout.build_ocr_result) and the name of the
+             profile that produced it.
+    """
+    deadline = time.monotonic() + timeout
+    image = preprocess.open_image(image_data)
+
+    if settings.OCR_CASCADE:
+        # Most receipts read fine with the fast profile; only escalate when the
+        # parser can't find every field, or reads one with low confidence.
+        result = _ocr_with_profile(image, _fast_profile(), deadline)
+        confidences = field_confidences(result)
+        if all(
+            confidence is not None and confidence >= settings.OCR_CASCADE_MIN_CONFIDENCE
+            for confidence in confidences.values()
+        ):
+            return result, "fast"
+
+    return _ocr_with_profile(image, ACCURATE_PROFILE, deadline), ACCURATE_PROFILE.name
+
+
+def field_confidences(result: dict) -> dict:
+    """
+    Confidence (0-1) of each field parser.match_receipt finds in an OCR result:
+    the mean confidence of the OCR words it was read from. None for fields the
+    parser couldn't find.
+    """
+    confidences = {}
+    for field, match in parser.match_receipt(result["text"]).items():
+        if match is None:
+            confidences[field] = None
+            continue
+        start, end = match[1]
+        word_confidences = [
+            word["conf"] for word in result["words"] if word["start"] < end and word["end"] > start
+        ]
+        confidences[field] = (
+            round(sum(word_confidences) / len(word_confidences) / 100, 3) if word_confidences else None
+        )
+    return confidences
+
+
+def mean_confidence(result: dict) -> Optional[float]:
+    """Mean confidence (0-1) over every word in an OCR result."""
+    if not result["words"]:
+        return None
+    return round(sum(word["conf"] for word in result["words"]) / len(result["words"]) / 100, 3)
+
+
+def _split_into_strips(image_data: bytes) -> Optional[list[bytes]]:
+    """
+    Worker-side: preprocesses a tall receipt and cuts it into overlapping strips
+    at whitespace gaps, one per available worker.
+
+    :return: The strips as PNG bytes, or None if the page can't be usefully split.
+    """
+    image, _ = preprocess.preprocess_image(preprocess.open_image(image_data))
+    count = min(settings.OCR_WORKERS, math.ceil(image.height / image.width))
+    if count < 2:
+        return None
+
+    ink = image if settings.OCR_PREPROCESS_BINARIZE else preprocess.adaptive_binarize(
+        image, settings.OCR_BINARIZE_RADIUS, settings.OCR_BINARIZE_OFFSET
+    )
+    strips = layout.plan_strips(preprocess.find_text_rows(ink), image.height, count)
+    if len(strips) < 2:
+        return None
+
+    encoded = []
+    for top, bottom in strips:
+        buffer = io.BytesIO()
+        # Strips are grayscale or bilevel, so PNG keeps them small for the trip between processes
+        image.crop((0, top, image.width, bottom)).save(buffer, format="PNG", compress_level=1)
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+def _ocr_strip(strip_data: bytes, timeout: float) -> list[list[dict]]:
+    """Worker-side OCR of an already preprocessed strip."""
+    return layout.ocr_lines(ocr_engines.image_to_data(Image.open(io.BytesIO(strip_data)), timeout))
+
+
+def _is_tall(image_data: bytes) -> bool:
+    # Image.open only parses the header, so this is cheap enough for the event loop
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        width, height = image.size
+        if image.getexif().get(_EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+            # Rotated by 90 degrees once the orientation is applied
+            width, height = height, width
+    except Exception:
+        return False
+    return height >= settings.OCR_STRIP_MIN_ASPECT * width
+
+
+_EXIF_ORIENTATION = 0x0112
+
+
+async def _recognize_pdf(pdf_data: bytes) -> dict:
+    """
+    Pages with an embedded text layer are read directly; only pages without one
+    are rasterized at OCR_PDF_DPI and OCRed, in parallel across the pool.
+    """
+    texts = await run_in_pool(pdf.text_layer, pdf_data)
+    scanned = [index for index, text in enumerate(texts) if text is None]
+
+    # One batch of pages per worker: each worker gets the document once rather than
+    # once per page, and renders one page at a time
+    batches = [scanned[i::settings.OCR_WORKERS] for i in range(min(settings.OCR_WORKERS, len(scanned)))]
+    results = await asyncio.gather(*(
+        run_in_pool(pdf.ocr_pages, pdf_data, batch, settings.OCR_TIMEOUT_SECONDS,
+                    timeout=settings.OCR_TIMEOUT_SECONDS * len(batch), sub_job=True)
+        for batch in batches
+    ))
+    page_lines = {
+        page_index: lines
+        for batch, batch_lines in zip(batches, results)
+        for page_index, lines in zip(batch, batch_lines)
+    }
+    logger.info(
+        "PDF with %d pages: %d read from the text layer, %d OCRed",
+        len(texts), len(texts) - len(scanned), len(scanned),
+    )
+
+    lines = []
+    for index, text in enumerate(texts):
+        lines.extend(page_lines[index] if text is None else pdf.text_lines(text))
+    return layout.build_ocr_result(lines)
+
+
+async def _recognize(image_data: bytes) -> dict:
+    if pdf.is_pdf(image_data):
+        return await _recognize_pdf(image_data)
+
+    if settings.OCR_STRIPS and settings.OCR_WORKERS > 1 and _is_tall(image_data):
+        # A long receipt is read as several strips in parallel instead of by one worker
+        strips = await run_in_pool(_split_into_strips, image_data)
+        if strips:
+            strip_lines = await asyncio.gather(
+                *(run_in_pool(_ocr_strip, strip, settings.OCR_TIMEOUT_SECONDS, sub_job=True) for strip in strips)
+            )
+            logger.info("OCR finished in %d parallel strips", len(strips))
+            return layout.build_ocr_result(layout.merge_strip_lines(strip_lines))
+
+    result, tier = await run_in_pool(_ocr_image, image_data, settings.OCR_TIMEOUT_SECONDS)
+    logger.info("OCR finished with the %s profile", tier)
+    return result
+
 
 async def extract_text_from_image(image_data: bytes) -> str:
     """
@@ -9,12 +367,42 @@ async def extract_text_from_image(image_data: bytes) -> str:
     :param image_data: The image file in bytes.
     :return: The extracted text as a string.
     """
-    # Open the image from the in-memory bytes
-    image = Image.open(io.BytesIO(image_data))
-    
-    # Use pytesseract to extract text
-    # You can specify a language, e.g., lang='eng'
-    text = pytesseract.image_to_string(image)
-    
-    return text
+    return (await extract_receipt_data(image_data))["text"]
+
+
+async def extract_receipt_data(image_data: bytes) -> dict:
+    """
+    Runs OCR on an in-memory image (or PDF) in a single word-level pass.
+
+    Results are cached by image content, so re-uploads skip Tesseract entirely.
+
+    :param image_data: The image file in bytes.
+    :return: A dict with the extracted `text` and its `words`, each with a
+             confidence (0-100) and its (start, end) span in the text.
+    """
+    key = ocr_cache.make_key(image_data, ocr_config_fingerprint())
+    cached = ocr_cache.cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    # The OCR runs in a task of its own, so one requester giving up (a client
+    # disconnecting) doesn't cancel it for the others waiting on the same image
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_recognize_and_cache(key, image_data))
+        _inflight[key] = task
+        task.add_done_callback(partial(_forget_inflight, key))
+    return await asyncio.shield(task)
+
+
+async def _recognize_and_cache(key: str, image_data: bytes) -> dict:
+    result = await _recognize(image_data)
+    ocr_cache.cache.put(key, json.dumps(result))
+    return result
+
 
+def _forget_inflight(key: str, task: asyncio.Task) -> None:
+    del _inflight[key]
+    if not task.cancelled():
+        # Mark the exception as retrieved in case every requester gave up
+        task.exception()
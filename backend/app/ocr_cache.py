@@ -0,0 +1,103 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Optional
+
+from .config import settings
+
+
+def make_key(image_data: bytes, ocr_config: str) -> str:
+    """
+    Builds a content-addressed cache key from the uploaded bytes and the OCR config,
+    so changing the OCR settings never serves text produced under the old ones.
+    """
+    digest = hashlib.sha256(image_data)
+    digest.update(b"\0")
+    digest.update(ocr_config.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Two-tier cache for OCR results: an in-memory LRU bounded by total bytes,
+    and an optional directory on disk that survives restarts.
+    """
+
+    def __init__(self, max_bytes: int, cache_dir: str = ""):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        # key -> (text, size in bytes)
+        self._entries: "OrderedDict[str, tuple[str, int]]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        # Shard by the first two hex characters to keep directories small
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _remember(self, key: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+        self._entries[key] = (text, size)
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached text for `key`, or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), encoding="utf-8") as f:
+                    text = f.read()
+            except FileNotFoundError:
+                text = None
+            if text is not None:
+                self._remember(key, text)
+                self.disk_hits += 1
+                return text
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, text: str) -> None:
+        """Stores `text` in memory and, if enabled, on disk."""
+        self._remember(key, text)
+        if self.cache_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current memory usage."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+cache = OCRCache(max_bytes=settings.OCR_CACHE_MAX_BYTES, cache_dir=settings.OCR_CACHE_DIR)
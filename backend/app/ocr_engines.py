@@ -0,0 +1,162 @@
+"""
+OCR backends. These run inside the OCR worker processes, never on the event loop.
+
+- "pytesseract" runs the tesseract binary for each call (simple, no extra dependency).
+- "tesserocr" keeps a warm Tesseract API handle per worker process and passes the
+  image buffer in directly, skipping the subprocess, temp files and traineddata
+  reload on every call. Requires the optional `tesserocr` package.
+"""
+import shlex
+from contextlib import contextmanager
+from typing import Optional
+
+import pytesseract
+from PIL import Image
+
+from .config import settings
+
+try:
+    import tesserocr
+except ImportError:  # optional dependency
+    tesserocr = None
+
+BACKENDS = ("pytesseract", "tesserocr")
+
+# One Tesseract handle per worker process, created on first use
+_tesserocr_api = None
+
+
+def check_backend() -> None:
+    """Fails fast (at startup) if the configured backend can't be used."""
+    if settings.OCR_BACKEND not in BACKENDS:
+        raise RuntimeError(f"Unknown OCR_BACKEND '{settings.OCR_BACKEND}'. Expected one of {BACKENDS}.")
+    if settings.OCR_BACKEND == "tesserocr" and tesserocr is None:
+        raise RuntimeError("OCR_BACKEND is 'tesserocr' but the tesserocr package is not installed.")
+
+
+def _get_tesserocr_api():
+    global _tesserocr_api
+    if _tesserocr_api is None:
+        _tesserocr_api = tesserocr.PyTessBaseAPI(lang=settings.OCR_LANG)
+    return _tesserocr_api
+
+
+def warm_up() -> None:
+    """Process-pool initializer: loads the engine before the first job arrives."""
+    if settings.OCR_BACKEND == "tesserocr":
+        _get_tesserocr_api()
+
+
+@contextmanager
+def _recognized(image: Image.Image, timeout: float, psm: Optional[int], whitelist: Optional[str] = None):
+    """Runs recognition on the warm tesserocr handle and resets it afterwards."""
+    api = _get_tesserocr_api()
+    try:
+        if psm is not None:
+            api.SetPageSegMode(psm)
+        if whitelist:
+            api.SetVariable("tessedit_char_whitelist", whitelist)
+        api.SetImage(image)
+        # Recognize() returns False when it is stopped by the timeout (milliseconds)
+        if not api.Recognize(timeout=int(timeout * 1000)):
+            raise TimeoutError("Tesseract recognition timed out")
+        yield api
+    finally:
+        api.Clear()
+        if psm is not None:
+            api.SetPageSegMode(tesserocr.PSM.AUTO)
+        if whitelist:
+            api.SetVariable("tessedit_char_whitelist", "")
+
+
+@contextmanager
+def _pytesseract_timeout():
+    """
+    Turns pytesseract's timeout, a bare RuntimeError, into TimeoutError. Other
+    failures propagate as they are; TesseractError is a RuntimeError too.
+    """
+    try:
+        yield
+    except RuntimeError as e:
+        if isinstance(e, pytesseract.TesseractError) or str(e) != "Tesseract process timeout":
+            raise
+        raise TimeoutError(str(e)) from e
+
+
+def _pytesseract_config(psm: Optional[int], whitelist: Optional[str] = None) -> str:
+    config = f"--psm {psm}" if psm is not None else ""
+    if whitelist:
+        # pytesseract shlex-splits the config, so quotes in the whitelist must be escaped
+        config += " -c " + shlex.quote(f"tessedit_char_whitelist={whitelist}")
+    return config
+
+
+def image_to_data(
+    image: Image.Image, timeout: float, psm: Optional[int] = None, whitelist: Optional[str] = None
+) -> list[dict]:
+    """
+    Recognizes the words in `image` with the configured backend, with their
+    positions and confidences.
+
+    :param psm: Tesseract page segmentation mode; None uses Tesseract's default.
+    :param whitelist: If given, the only characters Tesseract may output
+                      (must not contain whitespace).
+
+    :return: One dict per word, in reading order, with `text`, `conf` (0-100),
+             `left`, `top`, `width`, `height`, `block` and `line` (a page-wide
+             line number).
+    :raises TimeoutError: If recognition takes longer than `timeout` seconds.
+    """
+    words = []
+
+    if settings.OCR_BACKEND == "tesserocr":
+        level = tesserocr.RIL.WORD
+        with _recognized(image, timeout, psm, whitelist) as api:
+            iterator = api.GetIterator()
+            block = line = 0
+            while iterator is not None and not iterator.Empty(level):
+                if iterator.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    block += 1
+                if iterator.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+                text = (iterator.GetUTF8Text(level) or "").strip()
+                bbox = iterator.BoundingBox(level)
+                if text and bbox:
+                    left, top, right, bottom = bbox
+                    words.append({
+                        "text": text,
+                        "conf": float(iterator.Confidence(level)),
+                        "left": left, "top": top, "width": right - left, "height": bottom - top,
+                        "block": block, "line": line,
+                    })
+                if not iterator.Next(level):
+                    break
+        return words
+
+    # The timeout kills the tesseract subprocess, so an abandoned job
+    # doesn't keep occupying a worker after the caller gave up on it.
+    with _pytesseract_timeout():
+        data = pytesseract.image_to_data(
+            image,
+            lang=settings.OCR_LANG,
+            config=_pytesseract_config(psm, whitelist),
+            output_type=pytesseract.Output.DICT,
+            timeout=timeout,
+        )
+
+    line_numbers = {}
+    for i, text in enumerate(data["text"]):
+        text = text.strip()
+        conf = float(data["conf"][i])
+        if not text or conf < 0:
+            continue
+        line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        words.append({
+            "text": text,
+            "conf": conf,
+            "left": data["left"][i], "top": data["top"][i],
+            "width": data["width"][i], "height": data["height"][i],
+            "block": data["block_num"][i],
+            "line": line_numbers.setdefault(line_key, len(line_numbers) + 1),
+        })
+    return words
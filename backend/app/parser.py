@@ -1,94 +1,655 @@
+import argparse
+import itertools
+import json
+import os
 import re
-from datetime import datetime
-from decimal import Decimal, InvalidOperation
-from typing import Optional
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+from functools import partial
+from typing import Callable, Iterable, Iterator, Optional
 
-def parse_amount(text: str) -> Optional[Decimal]:
+from . import dates, money
+
+# A match is the parsed value plus the (start, end) character span it was read from,
+# so callers can map a field back to the OCR words it came from.
+Match = tuple[object, tuple[int, int]]
+
+# Keywords that mark the line holding the total
+AMOUNT_KEYWORDS = ('total', 'amount', 'balance', 'due')
+# Currency symbols and the ISO code they most often mean on a receipt
+CURRENCY_SYMBOLS = {"€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR", "₩": "KRW", "$": "USD"}
+# Signs several currencies share; an ISO code elsewhere on the receipt says which one is meant
+SHARED_SYMBOLS = {"$": ("USD", "CAD", "AUD"), "¥": ("JPY", "CNY")}
+CURRENCY_CODES = (
+    "USD", "EUR", "GBP", "JPY", "INR", "CAD", "AUD", "CHF", "CNY", "SEK", "NOK", "DKK", "PLN",
+    "KRW", "KWD", "BHD",
+)
+
+
+# A token is (kind, start, end, line): kind is 'newline', 'date', 'money' (an
+# amount with decimals or grouped thousands), 'number' (a plain integer),
+# 'symbol' (a currency sign), 'keyword', 'code', 'month' or 'date_keyword', the
+# span is in the original text and line is 0-based.
+Token = tuple[str, int, int, int]
+
+
+def _word_alternatives() -> list[str]:
+    words: dict[str, list[str]] = {}
+    for keyword in AMOUNT_KEYWORDS:
+        words.setdefault(keyword[0], []).append(re.escape(keyword[1:]))
+    # Codes, month names and date keywords are whole words; the start of the word
+    # is checked in tokenize()
+    whole_words = [code.lower() for code in CURRENCY_CODES] + list(dates.MONTHS) + list(dates.DATE_KEYWORDS)
+    for word in whole_words:
+        words.setdefault(word[0], []).append(re.escape(word[1:]) + r'\b')
+    return [first + '(?:' + '|'.join(rests) + ')' for first, rests in words.items()]
+
+
+def _token_pattern() -> re.Pattern:
+    # Every alternative starts with a plain character, so the regex engine can skip
+    # straight past characters no token starts with. Run over lowercased text, which
+    # avoids IGNORECASE (it defeats that optimization).
+    # Runs of digits and separators, including no-break spaces that are followed
+    # by a group of three digits ("1\u202f234,56"); plain spaces are joined later,
+    # next to a currency only (see _join_spaced_amounts)
+    number = rf"[\d.,'/-]*(?:[{money.NO_BREAK_SPACES}](?=\d{{3}}(?!\d))[\d.,'/-]*)*"
+    alternatives = [r'\n'] + [digit + number for digit in '0123456789']
+    alternatives += [re.escape(symbol) for symbol in CURRENCY_SYMBOLS]
+    alternatives += _word_alternatives()
+    return re.compile('|'.join(alternatives))
+
+
+_TOKEN_PATTERN = _token_pattern()
+# The keywords, codes, month names and date keywords alone, and the currency signs (see _outline)
+_WORD_PATTERN = re.compile('|'.join(_word_alternatives()))
+_SYMBOL_PATTERN = re.compile('|'.join(re.escape(symbol) for symbol in CURRENCY_SYMBOLS))
+# Numeric dates with one kind of separator, not cut out of a longer number
+_DATE_PATTERN = re.compile(r'(?<!\d)\d{1,4}([-/.])\d{1,2}\1\d{2,4}(?!\d)')
+# The middle of a numeric date ("/30/" in 05/30/2024): far rarer than digits, and
+# without the lookbehind the regex engine can skip to it quickly (see _outline)
+_DATE_MIDDLE_PATTERN = re.compile(r'[-/.]\d{1,2}[-/.]')
+# Dates, ranges and prices like "3.99/lb": amounts are found between these
+_PIECE_PATTERN = re.compile(r'[^/-]+')
+_GROUP_SPACE_PATTERN = re.compile(f'[{money.NO_BREAK_SPACES}]')
+_NOT_GROUP_SPACE_PATTERN = re.compile(f'[^{money.NO_BREAK_SPACES}]+')
+_KEYWORD_SET = frozenset(AMOUNT_KEYWORDS)
+_DATE_KEYWORD_SET = frozenset(dates.DATE_KEYWORDS)
+
+
+def _is_word_char(text: str, index: int) -> bool:
+    return 0 <= index < len(text) and (text[index].isalnum() or text[index] == '_')
+
+
+def _lowercase(text: str) -> str:
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters lowercase to two; keep spans valid at the cost of some matches
+        lowered = ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+    return lowered
+
+
+def _amount_kind(value: str) -> Optional[str]:
+    found = money.AMOUNT_PATTERN.fullmatch(value)
+    if not found:
+        return None
+    # Space-grouped integers ("555 123") are as likely phone or account numbers
+    # as amounts, so they need a currency next to them like plain integers
+    if found.group(3) is None and found.group(2) and found.group(2) in money.GROUP_SPACES:
+        return 'number'
+    return 'money'
+
+
+def _scan_number(value: str, start: int, line: int, append: Callable[[Token], None]) -> None:
+    # A run of digits and separators: look for dates and amounts in it
+    if _GROUP_SPACE_PATTERN.search(value):
+        kind = _amount_kind(value)
+        if kind:
+            append((kind, start, start + len(value), line))
+            return
+        # Not a space-grouped amount after all: the words between the spaces on their own
+        for part in _NOT_GROUP_SPACE_PATTERN.finditer(value):
+            _scan_number(part.group(), start + part.start(), line, append)
+        return
+
+    # The shortest date is "1.2.24"; most runs are prices and skip the date scan
+    if len(value) >= 6 and (value.count('/') >= 2 or value.count('-') >= 2 or value.count('.') >= 2):
+        for found in _DATE_PATTERN.finditer(value):
+            append(('date', start + found.start(), start + found.end(), line))
+    if value.isdigit():
+        append(('number', start, start + len(value), line))
+    elif value[-1].isdigit() and '/' not in value and '-' not in value:
+        # Dotted dates like "15.03.2024" never fit the amount shape
+        if money.AMOUNT_PATTERN.fullmatch(value):
+            append(('money', start, start + len(value), line))
+    else:
+        pieces = [piece.span() for piece in _PIECE_PATTERN.finditer(value)]
+        self_contained = len(pieces) == 1
+        for piece_start, piece_end in pieces:
+            # Punctuation after an amount ("12.50,") is not part of it
+            while piece_end > piece_start and not value[piece_end - 1].isdigit():
+                piece_end -= 1
+            while piece_start < piece_end and not value[piece_start].isdigit():
+                piece_start += 1
+            piece = value[piece_start:piece_end]
+            if piece.isdigit():
+                # Integers between dashes or slashes are dates, ranges or codes
+                if self_contained:
+                    append(('number', start + piece_start, start + piece_end, line))
+            elif piece and money.AMOUNT_PATTERN.fullmatch(piece):
+                append(('money', start + piece_start, start + piece_end, line))
+
+
+def tokenize(text: str) -> list[Token]:
     """
-    Finds the total amount by looking for keywords like 'total' or 'amount'
-    and then finding the largest number on that line.
-    Falls back to finding the largest number in the text if no keywords are found.
+    Scans receipt text once into typed tokens with their positions: line
+    boundaries, numeric dates, money amounts, total keywords, ISO currency
+    codes, month names and date keywords.
     """
-    lines = text.lower().split('\n')
-    amount_pattern = r'(\d+\.\d{2})'
-    # Keywords to look for
-    keyword_pattern = r'total|amount|balance|due'
+    return _tokenize(text, _lowercase(text), 0, len(text), 0)
 
-    potential_amounts = []
 
-    # --- New, Smarter Logic ---
-    # First, try to find amounts on lines that contain a keyword
-    for line in lines:
-        if re.search(keyword_pattern, line):
-            matches = re.findall(amount_pattern, line)
-            for match in matches:
-                try:
-                    # Add any numbers found on this line to our list
-                    potential_amounts.append(Decimal(match))
-                except InvalidOperation:
-                    continue
-    
-    # If we found any amounts on keyword lines, return the largest one.
-    if potential_amounts:
-        return max(potential_amounts)
-
-    # --- Fallback Logic ---
-    # If we didn't find any keywords, revert to the original strategy.
-    all_matches = re.findall(r'\b\d+\.\d{2}\b', text)
-    if not all_matches:
-        return None
-    
-    fallback_amounts = []
-    for match in all_matches:
-        try:
-            fallback_amounts.append(Decimal(match))
-        except InvalidOperation:
-            continue
-            
-    return max(fallback_amounts) if fallback_amounts else None
+def _tokenize(text: str, lowered: str, pos: int, endpos: int, line: int) -> list[Token]:
+    # tokenize() of text[pos:endpos], which starts on line `line`
+    tokens: list[Token] = []
+    append = tokens.append
+    currencies = []
+    for match in _TOKEN_PATTERN.finditer(lowered, pos, endpos):
+        value = match.group()
+        first = value[0]
+        start = match.start()
+        if first == '\n':
+            append(('newline', start, start + 1, line))
+            line += 1
+        elif first.isdigit():
+            _scan_number(value, start, line, append)
+        elif first in CURRENCY_SYMBOLS:
+            currencies.append(len(tokens))
+            append(('symbol', start, start + 1, line))
+        elif value in _KEYWORD_SET:
+            append(('keyword', start, match.end(), line))
+        elif not _is_word_char(text, start - 1):
+            if value in dates.MONTHS:
+                append(('month', start, match.end(), line))
+            elif value in _DATE_KEYWORD_SET:
+                append(('date_keyword', start, match.end(), line))
+            else:
+                currencies.append(len(tokens))
+                append(('code', start, match.end(), line))
+    if currencies:
+        _join_spaced_amounts(text, tokens, currencies)
+    return tokens
+
+
+def _spaced(text: str, start: int, end: int) -> bool:
+    # Nothing but spaces between two tokens on one line
+    return start == end or text[start:end].isspace()
+
+
+def _is_spaced_group(text: str, tokens: list[Token], index: int) -> bool:
+    # A number token one plain space after the previous one on its line
+    kind, start, _, line = tokens[index]
+    previous_kind, _, previous_end, previous_line = tokens[index - 1]
+    return (
+        kind in ('number', 'money') and previous_kind in ('number', 'money')
+        and previous_line == line and text[previous_end:start] == ' '
+    )
+
 
-def parse_date(text: str) -> Optional[datetime.date]:
+def _join_spaced_amounts(text: str, tokens: list[Token], currencies: list[int]) -> None:
     """
-    Finds a date in various common formats (MM/DD/YY, YYYY-MM-DD, etc.).
+    Joins amounts grouped by plain spaces ("1 234,56 €") into one token, in place.
+    A plain space also separates a quantity, store number or time from a price
+    ("1 299,00", "#12 112.97", "12:45 128.00"), so the groups are only joined
+    when a currency sign or code is right next to them.
     """
-    # Regex for formats like 01/25/2023, 25-01-23, etc.
-    pattern = r'(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})'
-    match = re.search(pattern, text)
-    
-    if match:
-        try:
-            # Use datetime.strptime to parse the found date string
-            date_str = "/".join(match.groups())
-            # This handles multiple formats, but you might need to make it smarter
-            # For now, we assume a common format like MM/DD/YYYY
-            dt_object = datetime.strptime(date_str, '%m/%d/%Y')
-            return dt_object.date()
-        except ValueError:
-            # Try another format, e.g., MM/DD/YY
-            try:
-                dt_object = datetime.strptime(date_str, '%m/%d/%y')
-                return dt_object.date()
-            except ValueError:
-                return None
+    # Last first, so joining keeps the indexes of earlier currencies valid
+    for index in reversed(currencies):
+        _, currency_start, currency_end, line = tokens[index]
+        # The amount after the currency ("€ 1 234,56"): the longest run that reads as one
+        first = index + 1
+        if first < len(tokens) and tokens[first][3] == line and _spaced(text, currency_end, tokens[first][1]):
+            last = first
+            while last + 1 < len(tokens) and _is_spaced_group(text, tokens, last + 1):
+                last += 1
+            for end in range(last, first, -1):
+                if _join(text, tokens, first, end):
+                    break
+        # The amount before it ("1 234,56 EUR"), starting a word, so that "#12" or
+        # "12:45" don't join the price after them
+        last = index - 1
+        if last >= 0 and tokens[last][3] == line and _spaced(text, tokens[last][2], currency_start):
+            first = last
+            while first > 0 and _is_spaced_group(text, tokens, first):
+                first -= 1
+            for start in range(first, last):
+                word_start = tokens[start][1] == 0 or text[tokens[start][1] - 1].isspace()
+                if word_start and _join(text, tokens, start, last):
+                    break
+
+
+def _join(text: str, tokens: list[Token], first: int, last: int) -> bool:
+    # Replaces tokens[first:last + 1] with one amount token if together they read as one
+    start, end, line = tokens[first][1], tokens[last][2], tokens[first][3]
+    kind = _amount_kind(text[start:end])
+    if kind is None:
+        return False
+    tokens[first:last + 1] = [(kind, start, end, line)]
+    return True
+
+
+def _outline(text: str, lowered: str) -> list[Token]:
+    """
+    The tokens parse_receipt needs, without classifying every price on the
+    receipt: all tokens of the lines with a total keyword, and elsewhere only
+    numeric dates, codes, month names, date keywords and the first currency sign.
+    Amounts off the keyword lines are missing, so when those lines have no total
+    the full tokenize() is needed after all.
+    """
+    # Line starts of the keyword lines, by line number
+    keyword_lines: dict[int, int] = {}
+    tokens: list[Token] = []
+    line = counted = 0
+    for match in _WORD_PATTERN.finditer(lowered):
+        start = match.start()
+        line += lowered.count('\n', counted, start)
+        counted = start
+        value = match.group()
+        if value in _KEYWORD_SET:
+            if line not in keyword_lines:
+                keyword_lines[line] = lowered.rfind('\n', 0, start) + 1
+        elif not _is_word_char(text, start - 1):
+            if value in dates.MONTHS:
+                tokens.append(('month', start, match.end(), line))
+            elif value in _DATE_KEYWORD_SET:
+                tokens.append(('date_keyword', start, match.end(), line))
+            else:
+                tokens.append(('code', start, match.end(), line))
+
+    # A date is always a whole run of digits and separators or part of one, so
+    # searching the text finds the same ones as tokenize(). Each starts at the
+    # digits right before the middle of it.
+    line = counted = pos = 0
+    while middle := _DATE_MIDDLE_PATTERN.search(lowered, pos):
+        start = middle.start()
+        while start > pos and lowered[start - 1].isdecimal():
+            start -= 1
+        found = _DATE_PATTERN.match(lowered, start)
+        if not found:
+            pos = middle.start() + 1
+            continue
+        line += lowered.count('\n', counted, start)
+        counted = start
+        tokens.append(('date', start, found.end(), line))
+        pos = found.end()
+    symbol = _SYMBOL_PATTERN.search(lowered)
+    if symbol:
+        tokens.append(('symbol', symbol.start(), symbol.end(), lowered.count('\n', 0, symbol.start())))
+
+    tokens = [token for token in tokens if token[3] not in keyword_lines]
+    for line, line_start in keyword_lines.items():
+        line_end = lowered.find('\n', line_start)
+        tokens += _tokenize(text, lowered, line_start, len(lowered) if line_end < 0 else line_end, line)
+    tokens.sort(key=lambda token: token[1])
+    return tokens
+
+
+def _token_currency(text: str, token: Token, document_code: Optional[str]) -> str:
+    value = text[token[1]:token[2]]
+    if token[0] == 'code':
+        return value.upper()
+    if document_code in SHARED_SYMBOLS.get(value, ()):
+        return document_code
+    return CURRENCY_SYMBOLS[value]
+
+
+def _adjacent_currency(text: str, tokens: list[Token], index: int, document_code: Optional[str]) -> Optional[str]:
+    # A sign or code right before or after the amount on its line ("$12.50", "12,50 €", "JPY 1200")
+    _, start, end, line = tokens[index]
+    for neighbour in (index - 1, index + 1):
+        if 0 <= neighbour < len(tokens):
+            kind, neighbour_start, neighbour_end, neighbour_line = tokens[neighbour]
+            if kind not in ('symbol', 'code') or neighbour_line != line:
+                continue
+            gap = text[neighbour_end:start] if neighbour < index else text[end:neighbour_start]
+            if not gap or gap.isspace():
+                return _token_currency(text, tokens[neighbour], document_code)
     return None
 
-def parse_merchant(text: str) -> Optional[str]:
+
+def _money_candidates(
+    text: str, tokens: list[Token], indexes: list[int], document_code: Optional[str]
+) -> list[tuple[int, int, Optional[str]]]:
+    # (start, end, currency next to it) of the money tokens at `indexes`; a plain
+    # integer is only an amount with a currency sign or code next to it
+    candidates = []
+    for index in indexes:
+        kind, start, end, _ = tokens[index]
+        currency = _adjacent_currency(text, tokens, index, document_code)
+        if kind == 'money' or currency is not None:
+            candidates.append((start, end, currency))
+    return candidates
+
+
+def _money_from_tokens(text: str, tokens: list[Token]) -> Optional[tuple[Decimal, Optional[str], tuple[int, int]]]:
+    # The total and the currency it is in: the currency sign or code next to it,
+    # or else the receipt's currency, which also decides how the amount is read
+    keyword_lines = set()
+    money_indexes = []
+    document_code = None
+    for index, (kind, start, end, line) in enumerate(tokens):
+        if kind == 'money' or kind == 'number':
+            money_indexes.append(index)
+        elif kind == 'keyword':
+            keyword_lines.add(line)
+        elif kind == 'code' and document_code is None:
+            document_code = text[start:end].upper()
+    if not money_indexes:
+        return None
+
+    # Amounts on lines with a total keyword win; the largest of them is the total
+    candidates = _money_candidates(
+        text, tokens, [index for index in money_indexes if tokens[index][3] in keyword_lines], document_code
+    )
+    if not candidates:
+        # No keyword: any free-standing amount (not glued to other letters or digits)
+        candidates = [
+            candidate for candidate in _money_candidates(text, tokens, money_indexes, document_code)
+            if not _is_word_char(text, candidate[0] - 1) and not _is_word_char(text, candidate[1])
+        ]
+
+    document_currency = None
+    best = None
+    for start, end, currency in candidates:
+        if currency is None:
+            if document_currency is None:
+                document_currency = _currency_from_tokens(text, tokens) or ''
+            currency = document_currency or None
+        amount = money.read_amount(text[start:end], currency)
+        if amount is not None and (best is None or amount > best[0]):
+            best = (amount, currency, (start, end))
+    return best
+
+
+def _total_and_tokens(text: str) -> tuple[Optional[tuple[Decimal, Optional[str], tuple[int, int]]], list[Token]]:
+    # The total (see _money_from_tokens) and tokens enough to read the other fields.
+    # Most receipts print it on a keyword line, so first only those lines are fully
+    # tokenized (see _outline), and the whole text only if they don't have it.
+    lowered = _lowercase(text)
+    tokens = _outline(text, lowered)
+    total = _money_from_tokens(text, tokens)
+    if total is None:
+        tokens = _tokenize(text, lowered, 0, len(text), 0)
+        total = _money_from_tokens(text, tokens)
+    return total, tokens
+
+
+def _date_from_tokens(text: str, tokens: list[Token], locale: Optional[str] = None) -> Optional[Match]:
+    # Every numeric date and month name is a candidate; the best scored one wins,
+    # the earliest on a tie. Scoring waits until all date keywords have been seen.
+    keyword_lines = set()
+    candidates = []
+    lowered = None
+    for kind, start, end, line in tokens:
+        if kind == 'date':
+            for found, order, plausibility in dates.numeric_candidates(text[start:end]):
+                candidates.append((plausibility, order, line, found, (start, end)))
+        elif kind == 'month':
+            lowered = lowered or _lowercase(text)
+            candidate = dates.textual_candidate(lowered, start, end)
+            if candidate:
+                found, span_start, span_end, plausibility = candidate
+                candidates.append((plausibility, None, line, found, (span_start, span_end)))
+        elif kind == 'date_keyword':
+            keyword_lines.add(line)
+    if not candidates:
+        return None
+
+    locale_order = dates.date_order(locale)
+    best = None
+    for plausibility, order, line, found, span in candidates:
+        score = dates.score(plausibility, order, locale_order, line, keyword_lines)
+        if best is None or score > best[0]:
+            best = (score, found, span)
+    return best[1], best[2]
+
+
+def _merchant_from_text(text: str) -> Optional[Match]:
+    # The first non-empty line
+    line_start = 0
+    while line_start <= len(text):
+        line_end = text.find('\n', line_start)
+        if line_end < 0:
+            line_end = len(text)
+        line = text[line_start:line_end]
+        stripped = line.strip()
+        if stripped:
+            start = line_start + len(line) - len(line.lstrip())
+            return stripped, (start, start + len(stripped))
+        line_start = line_end + 1
+    return None
+
+
+def _currency_from_tokens(text: str, tokens: list[Token]) -> Optional[str]:
+    # An ISO code anywhere beats a symbol; symbols are ambiguous ($ is also CAD, AUD, ...)
+    symbol = None
+    for token in tokens:
+        if token[0] == 'code':
+            return text[token[1]:token[2]].upper()
+        if token[0] == 'symbol' and symbol is None:
+            symbol = token
+    return _token_currency(text, symbol, None) if symbol else None
+
+
+def match_amount(text: str) -> Optional[Match]:
+    """
+    Finds the total amount by looking for keywords like 'total' or 'amount'
+    and then finding the largest amount on that line.
+    Falls back to finding the largest amount in the text if no keywords are found.
+    Amounts may use either decimal convention and group thousands (1,234.56,
+    1.234,56, 12,50), or be plain integers next to a currency sign or code
+    (¥1200); see money.py.
+    """
+    found = _total_and_tokens(text)[0]
+    return (found[0], found[2]) if found else None
+
+def parse_amount(text: str) -> Optional[Decimal]:
+    """Returns the receipt total, see match_amount."""
+    match = match_amount(text)
+    return match[0] if match else None
+
+def parse_money(text: str) -> Optional[tuple[Decimal, Optional[str]]]:
+    """
+    Returns the receipt total (see match_amount) and the ISO code of the currency
+    it is in: from the sign or code printed next to it, else the receipt's
+    currency (see parse_currency), else None.
+    """
+    found = _total_and_tokens(text)[0]
+    return (found[0], found[1]) if found else None
+
+def match_date(text: str, locale: Optional[str] = None) -> Optional[Match]:
+    """
+    Finds the receipt date among every date in the text: numeric ones in year,
+    month or day first order (2024-03-15, 03/15/24, 15.03.2024) and ones with
+    a month name (15 Mar 2024, March 15, 2024), scored as described in dates.py.
+
+    :param locale: The user's locale (e.g. "en-GB"), which decides whether
+                   ambiguous dates like 03/04/2024 are read day or month first.
+                   Defaults to month first.
+    """
+    return _date_from_tokens(text, tokenize(text), locale)
+
+def parse_date(text: str, locale: Optional[str] = None) -> Optional[date]:
+    """Returns the receipt date, see match_date."""
+    match = match_date(text, locale)
+    return match[0] if match else None
+
+def match_merchant(text: str) -> Optional[Match]:
     """
     A simple heuristic to find the merchant: assume it's the first line.
     """
-    lines = text.split('\n')
-    for line in lines:
-        if line.strip():
-            # Return the first non-empty line
-            return line.strip()
-    return None
+    return _merchant_from_text(text)
+
+def parse_merchant(text: str) -> Optional[str]:
+    """Returns the merchant name, see match_merchant."""
+    match = match_merchant(text)
+    return match[0] if match else None
+
+def parse_currency(text: str) -> Optional[str]:
+    """
+    Detects the receipt's currency from an ISO code (e.g. 'EUR') or, failing that,
+    a currency symbol. Returns None if neither appears.
+    """
+    return _currency_from_tokens(text, tokenize(text))
 
-def parse_receipt(text: str) -> dict:
+def match_receipt(text: str, locale: Optional[str] = None) -> dict:
+    """
+    Like parse_receipt, but each found field is a (value, span) match; missing fields are None.
+    """
+    total, tokens = _total_and_tokens(text)
+    return {
+        "amount": (total[0], total[2]) if total else None,
+        "date": _date_from_tokens(text, tokens, locale),
+        "merchant": _merchant_from_text(text),
+    }
+
+def parse_receipt(text: str, locale: Optional[str] = None) -> dict:
     """
     Orchestrates the parsing of the entire receipt text.
+    `locale` decides how ambiguous dates are read, see match_date.
     """
+    total, tokens = _total_and_tokens(text)
+    receipt_date = _date_from_tokens(text, tokens, locale)
+    merchant = _merchant_from_text(text)
     return {
-        "amount": parse_amount(text),
-        "date": parse_date(text),
-        "merchant": parse_merchant(text),
+        "amount": total[0] if total else None,
+        "date": receipt_date[0] if receipt_date else None,
+        "merchant": merchant[0] if merchant else None,
+        # The currency the total is in, or else the receipt's
+        "currency": (total and total[1]) or _currency_from_tokens(text, tokens),
     }
+
+
+def _parse_chunk(texts: list[str], locale: Optional[str] = None) -> list[dict]:
+    return [parse_receipt(text, locale) for text in texts]
+
+
+def _map_chunks(func, items: Iterable, workers: int, chunksize: int) -> Iterator:
+    """
+    Yields func(chunk) for consecutive chunks of `items`, in order, computed
+    across `workers` processes. `items` is consumed lazily and at most two chunks
+    per worker are in flight, so memory stays bounded however long the input is.
+    """
+    iterator = iter(items)
+    chunks = iter(lambda: list(itertools.islice(iterator, max(1, chunksize))), [])
+    if workers <= 1:
+        yield from map(func, chunks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(func, chunk))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def parse_receipts(
+    texts: Iterable[str], workers: Optional[int] = None, chunksize: int = 500, locale: Optional[str] = None
+) -> Iterator[dict]:
+    """
+    parse_receipt over many texts, in chunks spread across worker processes.
+    Results are yielded in input order as they become available, with bounded
+    memory: `texts` is read lazily, a few chunks ahead of the output.
+
+    :param workers: Worker processes; defaults to the CPU count. With 1, texts are
+                    parsed in this process.
+    :param chunksize: Texts sent to a worker at a time. Larger chunks cost less
+                      to hand over; smaller ones keep the output flowing.
+    :param locale: Passed on to parse_receipt.
+    """
+    for results in _map_chunks(partial(_parse_chunk, locale=locale), texts, workers or os.cpu_count() or 1, chunksize):
+        yield from results
+
+
+def read_text(line: str) -> str:
+    """
+    The receipt text of an NDJSON line: a JSON string, or an object with a
+    string "text" key.
+
+    :raises ValueError: If the line is anything else.
+    """
+    if not line.strip():
+        raise ValueError("blank line")
+    item = json.loads(line)
+    if isinstance(item, dict):
+        item = item.get("text")
+    if not isinstance(item, str):
+        raise ValueError('expected a JSON string or an object with a "text" string')
+    return item
+
+
+def read_texts(lines: Iterable[str]) -> Iterator[str]:
+    """Receipt texts from NDJSON lines (see read_text). Blank lines are skipped."""
+    for line in lines:
+        if line.strip():
+            yield read_text(line)
+
+
+def _parse_ndjson_chunk(lines: list[str], locale: Optional[str] = None) -> tuple[str, int, int]:
+    # Decoding and encoding happen in the worker too, so the main process only copies bytes.
+    # Every line gets a result, an error record if it can't be read, so output
+    # lines still match input lines.
+    output = []
+    failed = 0
+    for line in lines:
+        try:
+            text = read_text(line)
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            failed += 1
+            output.append(json.dumps({"error": f"Invalid input line: {e}"}))
+            continue
+        parsed = parse_receipt(text, locale)
+        output.append(json.dumps({key: str(value) if value is not None else None for key, value in parsed.items()}))
+    return "".join(line + "\n" for line in output), len(output) - failed, failed
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """
+    Parses receipt texts from an NDJSON file (or stdin) and writes one NDJSON
+    result per input line, in input order, then a throughput summary to stderr.
+    Lines that aren't a receipt text (see read_text) get an {"error": ...} record.
+
+        python -m app.parser texts.ndjson --workers 8 > parsed.ndjson
+    """
+    arg_parser = argparse.ArgumentParser(description="Parse receipt texts into amount, date, merchant and currency.")
+    arg_parser.add_argument("input", nargs="?", default="-", help="NDJSON file of receipt texts; '-' for stdin")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parser processes")
+    arg_parser.add_argument("--chunksize", type=int, default=500, help="Texts per chunk sent to a worker")
+    arg_parser.add_argument("--locale", help="Locale for ambiguous dates, e.g. en-GB (default: month first)")
+    args = arg_parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = errors = 0
+    with (sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")) as source:
+        for output, parsed, failed in _map_chunks(
+            partial(_parse_ndjson_chunk, locale=args.locale), source, max(1, args.workers), args.chunksize
+        ):
+            sys.stdout.write(output)
+            count += parsed
+            errors += failed
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0.0
+    print(f"Parsed {count} receipts in {elapsed:.2f}s ({rate:.0f}/s)", file=sys.stderr)
+    if errors:
+        print(f"{errors} input lines could not be read", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
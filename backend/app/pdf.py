@@ -0,0 +1,99 @@
+import math
+from typing import Optional
+
+import pypdfium2 as pdfium
+from PIL import Image
+
+from . import layout, ocr_engines, preprocess
+from .config import settings
+
+# A page with less embedded text than this is treated as a scan and OCRed
+_MIN_TEXT_LAYER_CHARS = 20
+
+
+def is_pdf(data: bytes) -> bool:
+    return data[:5] == b"%PDF-"
+
+
+def page_sizes(pdf_data: bytes) -> list[tuple[float, float]]:
+    """Width and height in points of every page; only reads the document structure, no page content."""
+    document = pdfium.PdfDocument(pdf_data)
+    try:
+        return [document.get_page_size(index) for index in range(len(document))]
+    finally:
+        document.close()
+
+
+def render_pixels(size: tuple[float, float], dpi: int) -> int:
+    """Pixels in a page of `size` points rendered at `dpi`."""
+    width, height = size
+    return round(width * dpi / 72) * round(height * dpi / 72)
+
+
+def text_layer(pdf_data: bytes) -> list[Optional[str]]:
+    """
+    Worker-side: the embedded text of every page, or None for pages that have
+    no usable text layer (scans) and need OCR.
+    """
+    document = pdfium.PdfDocument(pdf_data)
+    try:
+        texts = []
+        for page in document:
+            textpage = page.get_textpage()
+            text = textpage.get_text_bounded().replace("\r\n", "\n").replace("\r", "\n")
+            textpage.close()
+            page.close()
+            texts.append(text if len(text.strip()) >= _MIN_TEXT_LAYER_CHARS else None)
+        return texts
+    finally:
+        document.close()
+
+
+def _render(document: pdfium.PdfDocument, page_index: int, dpi: int) -> Image.Image:
+    page = document[page_index]
+    try:
+        # Uploads with pages this large are rejected (uploads.check_pdf_header), but
+        # never render past OCR_MAX_PIXELS whatever the caller checked
+        pixels = render_pixels(page.get_size(), dpi)
+        if pixels > settings.OCR_MAX_PIXELS:
+            dpi = dpi * math.sqrt(settings.OCR_MAX_PIXELS / pixels)
+        return page.render(scale=dpi / 72, grayscale=True).to_pil()
+    finally:
+        page.close()
+
+
+def render_page(pdf_data: bytes, page_index: int, dpi: int) -> Image.Image:
+    """Renders one page to a grayscale PIL image at `dpi`, or less if that exceeds OCR_MAX_PIXELS."""
+    document = pdfium.PdfDocument(pdf_data)
+    try:
+        return _render(document, page_index, dpi)
+    finally:
+        document.close()
+
+
+def ocr_pages(pdf_data: bytes, page_indexes: list[int], timeout: float) -> list[list[list[dict]]]:
+    """
+    Worker-side: rasterizes and OCRs the given pages, one at a time, so a long
+    PDF is never fully rasterized in memory. The document is sent to and opened
+    by the worker once for all of them.
+
+    :param timeout: Seconds allowed per page.
+    :return: The OCR lines of each page, in the order of `page_indexes`.
+    """
+    document = pdfium.PdfDocument(pdf_data)
+    try:
+        pages = []
+        for page_index in page_indexes:
+            image, _ = preprocess.preprocess_image(_render(document, page_index, settings.OCR_PDF_DPI))
+            pages.append(layout.ocr_lines(ocr_engines.image_to_data(image, timeout)))
+        return pages
+    finally:
+        document.close()
+
+
+def text_lines(text: str) -> list[list[dict]]:
+    """Embedded page text as OCR lines (see layout.ocr_lines); it is exact, so full confidence."""
+    return [
+        [{"text": word, "conf": 100.0} for word in line.split()]
+        for line in text.split("\n") if line.strip()
+    ]
@@ -0,0 +1,185 @@
+import io
+import logging
+import statistics
+import time
+from typing import Optional
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Width of the thumbnail used to estimate text height; small enough to be cheap,
+# large enough that receipt lines stay separate.
+_ANALYSIS_WIDTH = 800
+# Margin (in pixels) kept around the ink when cropping borders
+_CROP_MARGIN = 12
+_EXIF_ORIENTATION = 0x0112
+
+
+def open_image(image_data: bytes) -> Image.Image:
+    """
+    Opens an uploaded image for OCR with bounded memory. Pillow's own
+    decompression-bomb guard is set to OCR_MAX_PIXELS, and JPEGs are decoded
+    straight at a reduced scale (and in grayscale when that step is enabled)
+    so the full-size bitmap never exists in memory.
+    """
+    Image.MAX_IMAGE_PIXELS = settings.OCR_MAX_PIXELS
+    image = Image.open(io.BytesIO(image_data))
+    if image.width * image.height > settings.OCR_MAX_PIXELS:
+        raise Image.DecompressionBombError(f"Image has {image.width * image.height} pixels")
+
+    long_side = max(image.size)
+    if image.format == "JPEG":
+        # draft() picks the largest 1/2, 1/4 or 1/8 DCT scale that is still at least this size
+        scale = min(1.0, settings.OCR_DECODE_MAX_SIDE / long_side)
+        mode = "L" if settings.OCR_PREPROCESS_GRAYSCALE else image.mode
+        image.draft(mode, (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    return image
+
+
+def options_fingerprint() -> str:
+    """Describes the enabled preprocessing steps; part of the OCR cache key."""
+    return (
+        f"exif={settings.OCR_PREPROCESS_EXIF},gray={settings.OCR_PREPROCESS_GRAYSCALE},"
+        f"down={settings.OCR_PREPROCESS_DOWNSCALE}:{settings.OCR_TARGET_TEXT_HEIGHT}:{settings.OCR_TARGET_DPI},"
+        f"bin={settings.OCR_PREPROCESS_BINARIZE}:{settings.OCR_BINARIZE_RADIUS}:{settings.OCR_BINARIZE_OFFSET},"
+        f"crop={settings.OCR_PREPROCESS_CROP},decode={settings.OCR_DECODE_MAX_SIDE}"
+    )
+
+
+def adaptive_binarize(image: Image.Image, radius: int, offset: int) -> Image.Image:
+    """
+    Local-mean thresholding: a pixel is ink if it is darker than its neighbourhood
+    by more than `offset`. Copes with shadows and uneven lighting in phone photos,
+    where a single global threshold doesn't.
+    """
+    gray = image if image.mode == "L" else image.convert("L")
+    local_mean = gray.filter(ImageFilter.BoxBlur(radius))
+    darkness = ImageChops.subtract(local_mean, gray)
+    return darkness.point(lambda v: 0 if v > offset else 255)
+
+
+def find_text_rows(binary: Image.Image) -> list[tuple[int, int]]:
+    """
+    Finds the horizontal runs of rows that contain ink in a binarized image.
+
+    :return: (start, end) row ranges, end exclusive, top to bottom.
+    """
+    # Squashing the image to one column averages each row in C; rows with
+    # enough ink in them belong to a text line.
+    row_means = binary.resize((1, binary.height), Image.Resampling.BOX).getdata()
+    runs = []
+    start = None
+    for y, mean in enumerate(row_means):
+        if mean < 250:
+            if start is None:
+                start = y
+        elif start is not None:
+            runs.append((start, y))
+            start = None
+    if start is not None:
+        runs.append((start, binary.height))
+    return runs
+
+
+def estimate_text_height(image: Image.Image) -> Optional[float]:
+    """
+    Estimates the height in pixels of a line of text from the horizontal
+    projection profile of a binarized thumbnail. Returns None if no text lines
+    could be found.
+    """
+    scale = min(1.0, _ANALYSIS_WIDTH / image.width)
+    thumb = image.convert("L")
+    if scale < 1.0:
+        thumb = thumb.resize((_ANALYSIS_WIDTH, max(1, round(image.height * scale))), Image.Resampling.BILINEAR)
+    binary = adaptive_binarize(thumb, radius=10, offset=settings.OCR_BINARIZE_OFFSET)
+
+    # Ignore specks and rules that are too thin to be text
+    run_heights = [end - start for start, end in find_text_rows(binary) if end - start >= 3]
+    if len(run_heights) < 2:
+        return None
+    return statistics.median(run_heights) / scale
+
+
+def _downscale_factor(image: Image.Image, target_text_height: int) -> float:
+    text_height = estimate_text_height(image)
+    if text_height:
+        return target_text_height / text_height
+
+    # No usable lines found: fall back to the resolution the file claims to have
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0]:
+        return settings.OCR_TARGET_DPI / float(dpi[0])
+    return 1.0
+
+
+def preprocess_image(image: Image.Image, target_text_height: Optional[int] = None) -> tuple[Image.Image, dict]:
+    """
+    Prepares a receipt photo for Tesseract: fixes EXIF orientation, converts to
+    grayscale, downscales so text lines are about `target_text_height` pixels
+    tall, binarizes, and crops away the background around the receipt.
+    Each step is toggled in settings.
+
+    :return: The processed image and a dict of step name -> milliseconds taken.
+    """
+    target_text_height = target_text_height or settings.OCR_TARGET_TEXT_HEIGHT
+    timings = {}
+
+    def timed(name, step, img):
+        start = time.perf_counter()
+        result = step(img)
+        timings[name] = (time.perf_counter() - start) * 1000
+        return result
+
+    if settings.OCR_PREPROCESS_EXIF:
+        def fix_orientation(img):
+            # exif_transpose() copies the whole image even when nothing needs rotating
+            if img.getexif().get(_EXIF_ORIENTATION, 1) == 1:
+                return img
+            return ImageOps.exif_transpose(img)
+
+        image = timed("exif", fix_orientation, image)
+
+    if settings.OCR_PREPROCESS_GRAYSCALE:
+        image = timed("grayscale", lambda img: img.convert("L"), image)
+
+    if settings.OCR_PREPROCESS_DOWNSCALE:
+        def downscale(img):
+            factor = _downscale_factor(img, target_text_height)
+            # Only ever shrink; upscaling makes Tesseract slower without adding detail
+            if factor >= 0.95:
+                return img
+            size = (max(1, round(img.width * factor)), max(1, round(img.height * factor)))
+            return img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+        image = timed("downscale", downscale, image)
+
+    if settings.OCR_PREPROCESS_BINARIZE:
+        image = timed(
+            "binarize",
+            lambda img: adaptive_binarize(img, settings.OCR_BINARIZE_RADIUS, settings.OCR_BINARIZE_OFFSET),
+            image,
+        )
+
+    if settings.OCR_PREPROCESS_CROP:
+        def crop(img):
+            ink = img if settings.OCR_PREPROCESS_BINARIZE else adaptive_binarize(
+                img, settings.OCR_BINARIZE_RADIUS, settings.OCR_BINARIZE_OFFSET
+            )
+            bbox = ImageOps.invert(ink.convert("L")).getbbox()
+            if not bbox:
+                return img
+            left, top, right, bottom = bbox
+            return img.crop((
+                max(0, left - _CROP_MARGIN),
+                max(0, top - _CROP_MARGIN),
+                min(img.width, right + _CROP_MARGIN),
+                min(img.height, bottom + _CROP_MARGIN),
+            ))
+
+        image = timed("crop", crop, image)
+
+    logger.debug("Preprocessed receipt to %sx%s: %s", image.width, image.height, timings)
+    return image, timings
@@ -0,0 +1,72 @@
+"""
+Raw OCR text kept with an expense, so improved parsers can be re-run over old
+receipts (see app/reparse.py) instead of OCRing the images again.
+
+The text is stored zlib-compressed in `Expense.ocr_text`. `Expense.ocr_fields`
+records, as strings, the values of the fields that came from the parser; a
+field whose current value no longer matches was corrected by the user and is
+left alone by a re-parse.
+"""
+import zlib
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from . import parser
+
+FIELDS = ("amount", "date", "merchant", "currency")
+
+
+def compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def expense_fields(parsed: dict) -> dict:
+    """parser.parse_receipt output as the values they would be stored as on an expense."""
+    merchant = parsed["merchant"]
+    return {
+        "amount": parsed["amount"],
+        "date": parsed["date"],
+        "merchant": merchant[:100] if merchant else None,
+        "currency": parsed.get("currency"),
+    }
+
+
+def to_json(fields: dict) -> dict:
+    """Field values as strings (or None), as kept in `Expense.ocr_fields`."""
+    return {
+        key: value.isoformat() if isinstance(value, date) else (str(value) if value is not None else None)
+        for key, value in fields.items()
+    }
+
+
+def from_json(field: str, value: str):
+    """The inverse of to_json for one field."""
+    if field == "amount":
+        return Decimal(value)
+    if field == "date":
+        return date.fromisoformat(value)
+    return value
+
+
+def matches(field: str, stored: Optional[str], value) -> bool:
+    """Whether an expense's `value` for `field` equals the stored parser value."""
+    if stored is None or value is None:
+        return stored is None and value is None
+    return from_json(field, stored) == value
+
+
+def parser_fields(expense_values: dict, text: str, locale: Optional[str] = None) -> dict:
+    """
+    Parses `text` and returns, for `Expense.ocr_fields`, the fields whose value in
+    `expense_values` is the one the parser found.
+    """
+    parsed = to_json(expense_fields(parser.parse_receipt(text, locale)))
+    return {
+        field: parsed[field] for field in FIELDS
+        if parsed[field] is not None and matches(field, parsed[field], expense_values.get(field))
+    }
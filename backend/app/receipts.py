@@ -0,0 +1,151 @@
+import hashlib
+from contextlib import nullcontext
+from typing import Optional
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+
+from . import admission, crud, image_store, models, ocr, parser, phash, receipt_text, schemas
+from .config import settings
+
+
+async def ingest_receipt(
+    db: AsyncSession,
+    image_data: bytes,
+    category: str = "Uncategorized",
+    notes: Optional[str] = None,
+    currency: Optional[str] = None,
+    reject_duplicate: bool = False,
+    admit: bool = True,
+) -> schemas.Expense:
+    """
+    Turns a receipt image into a stored expense in one server-side pass:
+    OCR, parsing, currency detection, normalization, image storage and insert.
+
+    A receipt that looks like one already ingested (a close perceptual hash and
+    the same amount and date) is stored with `duplicate_of` set to that expense.
+    A file ingested before byte for byte is recognized before any OCR: the text,
+    hashes and image stored for it are reused, and it is then checked like any
+    other likely duplicate.
+
+    :param currency: Overrides the currency detected on the receipt. If neither
+                     is available, the user's base currency is assumed.
+    :param reject_duplicate: Refuse likely duplicates instead of flagging them.
+    :param admit: Wait for an OCR admission slot around the OCR. Callers that
+                  bound their own concurrency, like the hot folder, pass False.
+    :raises HTTPException: 409 if the image is a likely duplicate and
+                           `reject_duplicate` is set, 422 if the amount or date
+                           can't be read from the receipt, 429/503 if OCR
+                           admission turns it away.
+    """
+    source_hash = hashlib.sha256(image_data).hexdigest()
+    known = await find_ingested(db, source_hash)
+    if known is not None and known.ocr_text is not None and known.image_phash is not None:
+        # The same file again: what OCR, hashing and image storage made of it still
+        # holds, and find_duplicate below confirms the amount and date as usual
+        perceptual_hash = phash.to_unsigned(known.image_phash)
+        text = receipt_text.decompress(known.ocr_text)
+        ocr_confidence = known.ocr_confidence
+        image_hash = known.image_hash
+    else:
+        # Only the CPU-heavy part holds the slot, not the database and
+        # exchange-rate work after it
+        async with admission.ocr_admission.slot() if admit else nullcontext():
+            perceptual_hash = await ocr.run_in_pool(phash.dct_hash, image_data)
+            ocr_result = await ocr.extract_receipt_data(image_data)
+        text = ocr_result["text"]
+        # The weakest field decides how much the whole expense can be trusted
+        confidences = [c for c in ocr.field_confidences(ocr_result).values() if c is not None]
+        ocr_confidence = min(confidences) if confidences else None
+        image_hash = None
+    prefs = await crud.get_user_preferences(db)
+    parsed = parser.parse_receipt(text, locale=prefs.locale)
+
+    if parsed["amount"] is None or parsed["date"] is None:
+        missing = [field for field in ("amount", "date") if parsed[field] is None]
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "message": f"Could not read {' and '.join(missing)} from the receipt.",
+                "parsed_data": jsonable(parsed),
+            },
+        )
+
+    duplicate_of = await find_duplicate(db, perceptual_hash, parsed)
+    if duplicate_of is not None and reject_duplicate:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "This receipt looks like one that was already added.",
+                "duplicate_of": str(duplicate_of),
+            },
+        )
+
+    if currency is None:
+        currency = parsed["currency"]
+    if currency is None:
+        currency = prefs.base_currency
+
+    expense = models.ExpenseCreate(
+        amount=parsed["amount"],
+        currency=currency,
+        category=category,
+        merchant=(parsed["merchant"] or "Unknown")[:100],
+        date=parsed["date"],
+        notes=notes,
+        ocr_text=text,
+    )
+    if image_hash is None:
+        image_hash = await ocr.run_in_pool(image_store.store, image_data)
+    db_expense = await crud.create_expense(
+        db=db,
+        expense=expense,
+        ocr_confidence=ocr_confidence,
+        image_phash=phash.to_signed(perceptual_hash),
+        image_hash=image_hash,
+        source_hash=source_hash,
+        duplicate_of=duplicate_of,
+    )
+    phash.index.add(perceptual_hash, db_expense.id)
+    return db_expense
+
+
+async def find_duplicate(db: AsyncSession, perceptual_hash: int, parsed: dict) -> Optional[UUID]:
+    """
+    The id of an expense that is likely the same receipt: its image hash is
+    within DUPLICATE_MAX_DISTANCE bits and it has the parsed amount and date.
+    Images alone aren't enough, as many receipts look alike at hash resolution.
+    """
+    candidates = phash.index.search(perceptual_hash, settings.DUPLICATE_MAX_DISTANCE)
+    if not candidates:
+        return None
+    result = await db.execute(
+        select(schemas.Expense.id).where(
+            schemas.Expense.id.in_([expense_id for _, expense_id in candidates]),
+            schemas.Expense.amount == parsed["amount"],
+            schemas.Expense.date == parsed["date"],
+        )
+    )
+    matches = set(result.scalars().all())
+    # Closest image first
+    return next((expense_id for _, expense_id in candidates if expense_id in matches), None)
+
+
+async def find_ingested(db: AsyncSession, source_hash: str) -> Optional[schemas.Expense]:
+    """The first expense ingested from exactly this file (its SHA-256), with its OCR text, if any."""
+    result = await db.execute(
+        select(schemas.Expense)
+        .options(undefer(schemas.Expense.ocr_text))
+        .where(schemas.Expense.source_hash == source_hash)
+        .order_by(schemas.Expense.created_at)
+        .limit(1)
+    )
+    return result.scalar()
+
+
+def jsonable(parsed: dict) -> dict:
+    """parser.parse_receipt output with every value as a string (or None), for JSON."""
+    return {key: str(value) if value is not None else None for key, value in parsed.items()}
@@ -0,0 +1,178 @@
+"""
+Bulk re-parse of stored receipt text.
+
+Streams the compressed OCR text stored with each expense (receipt_text.py)
+through the current parser.parse_receipt, in chunks spread across worker
+processes, and updates only the fields whose parsed value changed. Fields the
+user corrected since they were parsed are never touched.
+
+    python -m app.reparse --workers 8 --chunk-size 2000 [--dry-run]
+
+No OCR is involved, so this takes minutes for a million receipts.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import select, update
+
+from . import crud, currency, merchants, parser, receipt_text, schemas
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_chunk(rows: list[tuple[UUID, bytes]], locale: Optional[str]) -> list[tuple[UUID, dict]]:
+    """Worker side: decompresses and parses one chunk of stored texts."""
+    return [
+        (expense_id, receipt_text.to_json(receipt_text.expense_fields(
+            parser.parse_receipt(receipt_text.decompress(blob), locale)
+        )))
+        for expense_id, blob in rows
+    ]
+
+
+def _changes(row: dict, parsed: dict) -> dict:
+    """
+    The fields of `row` to update to their newly parsed value: only those that
+    still hold the value the parser gave them last time.
+    """
+    stored = row["ocr_fields"] or {}
+    changes = {}
+    for field in receipt_text.FIELDS:
+        if field not in stored or parsed[field] is None:
+            continue
+        current = row[field]
+        if receipt_text.matches(field, stored[field], current) and not receipt_text.matches(field, parsed[field], current):
+            changes[field] = receipt_text.from_json(field, parsed[field])
+    return changes
+
+
+class Reparser:
+    def __init__(self, workers: int, chunk_size: int, dry_run: bool = False):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.updated = 0
+        self.skipped = 0
+        self.field_changes: Counter = Counter()
+        # Exchange rates to the base currency, fetched once per currency per run
+        self._rates: dict = {}
+
+    async def _rate(self, db, code: str):
+        if code not in self._rates:
+            base_currency = (await crud.get_user_preferences(db)).base_currency
+            self._rates[code] = await currency.get_exchange_rate(code, base_currency)
+        return self._rates[code]
+
+    async def _fetch_chunk(self, db, after: Optional[UUID]) -> list:
+        query = (
+            select(
+                schemas.Expense.id, schemas.Expense.ocr_text, schemas.Expense.ocr_fields,
+                schemas.Expense.amount, schemas.Expense.date, schemas.Expense.merchant, schemas.Expense.currency,
+            )
+            .where(schemas.Expense.ocr_text.is_not(None))
+            .order_by(schemas.Expense.id)
+            .limit(self.chunk_size)
+        )
+        if after is not None:
+            query = query.where(schemas.Expense.id > after)
+        return (await db.execute(query)).all()
+
+    async def _apply(self, db, rows: dict, results: list[tuple[UUID, dict]]) -> None:
+        updates = []
+        for expense_id, parsed in results:
+            row = rows[expense_id]
+            changes = _changes(row, parsed)
+            if not changes:
+                continue
+            if "amount" in changes or "currency" in changes:
+                rate = await self._rate(db, changes.get("currency", row["currency"]))
+                if rate is None:
+                    # Can't normalize the new amount; leave this expense as it is
+                    self.skipped += 1
+                    continue
+                changes["normalized_amount"] = changes.get("amount", row["amount"]) * rate
+            if "merchant" in changes and not self.dry_run:
+                changes["merchant_id"] = await merchants.resolve(db, changes["merchant"])
+
+            ocr_fields = dict(row["ocr_fields"])
+            ocr_fields.update({field: parsed[field] for field in receipt_text.FIELDS if field in changes})
+            updates.append({"id": expense_id, **changes, "ocr_fields": ocr_fields})
+            self.field_changes.update(field for field in receipt_text.FIELDS if field in changes)
+
+        self.updated += len(updates)
+        if updates and not self.dry_run:
+            await db.execute(update(schemas.Expense), updates)
+            await db.commit()
+
+    async def run(self) -> dict:
+        """Re-parses every expense with stored text and returns a summary."""
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        # Chunks being parsed, oldest first; the next chunk is read from the
+        # database while the workers are busy with these.
+        in_flight: deque = deque()
+        last_id = None
+        exhausted = False
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            async with AsyncSessionLocal() as db:
+                locale = (await crud.get_user_preferences(db)).locale
+                await merchants.load_index(db)
+                while not exhausted or in_flight:
+                    if not exhausted:
+                        chunk = await self._fetch_chunk(db, last_id)
+                        if chunk:
+                            last_id = chunk[-1].id
+                            self.scanned += len(chunk)
+                            future = loop.run_in_executor(
+                                executor, _parse_chunk, [(row.id, row.ocr_text) for row in chunk], locale
+                            )
+                            # Keep only what the comparison needs, not the compressed text
+                            rows = {
+                                row.id: {key: value for key, value in row._mapping.items() if key != "ocr_text"}
+                                for row in chunk
+                            }
+                            in_flight.append((rows, future))
+                        exhausted = len(chunk) < self.chunk_size
+
+                    if in_flight and (exhausted or len(in_flight) >= 2 * self.workers):
+                        rows, future = in_flight.popleft()
+                        await self._apply(db, rows, await future)
+                        logger.info("Re-parsed %d receipts, %d updated", self.scanned, self.updated)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "scanned": self.scanned,
+            "updated": self.updated,
+            "skipped_no_exchange_rate": self.skipped,
+            "field_changes": dict(self.field_changes),
+            "seconds": round(elapsed, 3),
+            "receipts_per_second": round(self.scanned / elapsed, 1) if elapsed else None,
+            "dry_run": self.dry_run,
+        }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Re-run the receipt parser over stored OCR text.")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parser processes")
+    arg_parser.add_argument("--chunk-size", type=int, default=2000, help="Receipts per chunk")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Count the changes without writing them")
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    reparser = Reparser(max(1, args.workers), max(1, args.chunk_size), args.dry_run)
+    summary = asyncio.run(reparser.run())
+    logger.info("Done: %s", summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import uuid
-from sqlalchemy import Column, String, DECIMAL, Date, DateTime, Float, Integer, JSON
+from sqlalchemy import BigInteger, Column, String, DECIMAL, Date, DateTime, Float, ForeignKey, Integer, JSON, LargeBinary, Text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -7,15 +9,42 @@ class Expense(Base):
     __tablename__ = 'expenses'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     amount = Column(DECIMAL(precision=10, scale=2), nullable=False)
-    currency = Column(String(3), nullable=false)
+    currency = Column(String(3), nullable=False)
     normalized_amount = Column(DECIMAL(precision=10, scale=2), nullable=False)
     category = Column(String(50), nullable=False)
     merchant = Column(String(100), nullable=False)
+    # The canonical merchant `merchant` is a spelling of (see merchants.py)
+    merchant_id = Column(Integer, ForeignKey("merchants.id"), nullable=True, index=True)
     date = Column(Date, nullable=False)
     notes = Column(String, nullable=True)
     ocr_confidence = Column(Float, nullable=True)
+    # 64-bit perceptual (DCT) hash of the receipt image, stored signed
+    image_phash = Column(BigInteger, nullable=True, index=True)
+    # The expense this receipt looks like a second copy of (see receipts.find_duplicate)
+    duplicate_of = Column(UUID(as_uuid=True), nullable=True)
+    # SHA-256 of the receipt image in image_store
+    image_hash = Column(String(64), nullable=True, index=True)
+    # SHA-256 of the receipt file as it was uploaded, before image_store re-encoded it
+    source_hash = Column(String(64), nullable=True, index=True)
+    # zlib-compressed OCR text of the receipt, and which field values came from parsing it
+    # (see receipt_text.py). Deferred so listing expenses doesn't load the text.
+    ocr_text = deferred(Column(LargeBinary, nullable=True))
+    ocr_fields = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class Merchant(Base):
+    __tablename__ = "merchants"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+
+class MerchantAlias(Base):
+    __tablename__ = "merchant_aliases"
+
+    # A normalized spelling of a merchant name (merchants.normalize)
+    alias = Column(String(100), primary_key=True)
+    merchant_id = Column(Integer, ForeignKey("merchants.id"), nullable=False, index=True)
+
 # Add this new class for user preferences
 class UserPreferences(Base):
     __tablename__ = "user_preferences"
@@ -23,5 +52,20 @@ class UserPreferences(Base):
     id = Column(Integer, primary_key=True, index=True) # Simple ID for single-user
     base_currency = Column(String(3), nullable=False, default="USD")
     theme = Column(String, default="light")
+    locale = Column(String(35), nullable=False, default="en-US", server_default="en-US")
     # custom_categories can be stored as JSON
     custom_categories = Column(JSON, nullable=True)
+
+class OcrJob(Base):
+    __tablename__ = "ocr_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # queued -> running -> done | failed
+    status = Column(String(10), nullable=False, default="queued", index=True)
+    # The uploaded image is kept until the job finishes, so queued work survives a restart
+    image_data = Column(LargeBinary, nullable=True)
+    filename = Column(String, nullable=True)
+    text = Column(Text, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
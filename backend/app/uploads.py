@@ -0,0 +1,123 @@
+import io
+import tempfile
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from . import pdf
+from .config import settings
+
+_CHUNK_SIZE = 64 * 1024
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """
+    Reads an uploaded file in chunks, giving up as soon as it exceeds `max_bytes`.
+    Starlette spools large uploads to disk, so nothing bigger than the cap is
+    ever held in memory.
+
+    :raises HTTPException: 413 if the file is larger than `max_bytes`.
+    """
+    data = bytearray()
+    while True:
+        chunk = await file.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"'{file.filename}' is larger than the {max_bytes / (1024 * 1024):.1f} MB upload limit."
+            )
+    return bytes(data)
+
+
+async def spool_upload(file: UploadFile, max_bytes: int) -> BinaryIO:
+    """
+    Copies an upload, in chunks, into a temporary file we own (memory up to 1 MB,
+    disk beyond), so it can still be read after the request's own upload has been
+    closed, e.g. while a streamed response is being sent. The caller closes it.
+
+    :raises HTTPException: 413 if the file is larger than `max_bytes`.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    size = 0
+    while True:
+        chunk = await file.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spooled.close()
+            raise HTTPException(
+                status_code=413,
+                detail=f"'{file.filename}' is larger than the {max_bytes / (1024 * 1024):.1f} MB upload limit."
+            )
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def check_image_header(image_data: bytes, filename: str | None = None) -> None:
+    """
+    Validates an image from its header alone, before anything is decoded:
+    it must be a format Pillow recognizes, with no more than OCR_MAX_PIXELS pixels.
+
+    :raises HTTPException: 400 for unreadable files, 413 for oversized images.
+    """
+    try:
+        # Image.open only parses the header; pixel data is decoded lazily
+        with Image.open(io.BytesIO(image_data)) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        width = height = None
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"'{filename}' is not a supported image.")
+
+    if width is None or width * height > settings.OCR_MAX_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"'{filename}' has too many pixels (limit is {settings.OCR_MAX_PIXELS})."
+        )
+
+
+def check_pdf_header(pdf_data: bytes, filename: str | None = None) -> None:
+    """
+    Validates a PDF from its document structure: it must open and have no more
+    than OCR_PDF_MAX_PAGES pages, none of which has more than OCR_MAX_PIXELS
+    pixels when rendered at OCR_PDF_DPI.
+
+    :raises HTTPException: 400 for unreadable files, 413 for too many or too large pages.
+    """
+    try:
+        sizes = pdf.page_sizes(pdf_data)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"'{filename}' is not a readable PDF.")
+    if len(sizes) > settings.OCR_PDF_MAX_PAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"'{filename}' has {len(sizes)} pages (limit is {settings.OCR_PDF_MAX_PAGES})."
+        )
+    for number, size in enumerate(sizes, 1):
+        if pdf.render_pixels(size, settings.OCR_PDF_DPI) > settings.OCR_MAX_PIXELS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Page {number} of '{filename}' has too many pixels at {settings.OCR_PDF_DPI} dpi "
+                       f"(limit is {settings.OCR_MAX_PIXELS})."
+            )
+
+
+def check_receipt_header(data: bytes, filename: str | None = None) -> None:
+    """Validates an uploaded receipt, which may be an image or a PDF."""
+    if pdf.is_pdf(data):
+        check_pdf_header(data, filename)
+    else:
+        check_image_header(data, filename)
+
+
+async def read_receipt_upload(file: UploadFile) -> bytes:
+    """Reads an uploaded receipt image or PDF with the size, pixel and page limits applied."""
+    data = await read_upload(file, settings.OCR_MAX_UPLOAD_BYTES)
+    check_receipt_header(data, file.filename)
+    return data
@@ -0,0 +1,8 @@
+"""
+Offline benchmarks for the receipt pipeline. Run from the backend directory:
+
+    python -m bench.ocr_bench --count 200 --output report.json
+
+See bench/ocr_bench.py for the options. Nothing here touches the network or the
+database, so reports from different commits on the same machine are comparable.
+"""
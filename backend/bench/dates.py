@@ -0,0 +1,113 @@
+"""
+Fuzz test and benchmark for the receipt date engine (app/dates.py).
+
+The fuzz pass writes random dates in every supported format into receipt-like
+text and checks that parser.parse_date reads them back for a locale of the
+matching field order, then feeds it random garbage that must never raise.
+The benchmark compares parse_date with the naive approach of trying
+strptime with each format on every date-looking token.
+
+    python -m bench.dates --fuzz 20000 --benchmark 5000
+"""
+import argparse
+import json
+import random
+import re
+import string
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from app import parser
+
+# strftime format -> field order it needs the locale to have, None if unambiguous
+FORMATS = {
+    "%Y-%m-%d": None, "%Y/%m/%d": None, "%Y.%m.%d": None,
+    "%m/%d/%Y": "MDY", "%m/%d/%y": "MDY", "%m-%d-%Y": "MDY",
+    "%d/%m/%Y": "DMY", "%d.%m.%Y": "DMY", "%d.%m.%y": "DMY", "%d-%m-%Y": "DMY",
+    "%d %b %Y": None, "%d %B %Y": None, "%b %d, %Y": None, "%B %d %Y": None, "%d-%b-%y": None,
+}
+LOCALES = {"MDY": "en-US", "DMY": "en-GB", "YMD": "ja-JP"}
+_FILLER = ["STORE #1042", "TOTAL 12.50", "TEL 555-0142", "CARD ****1234", "THANK YOU", "QTY 2 @ 3.99"]
+
+
+def random_date(rng: random.Random) -> date:
+    return date(2000, 1, 1) + timedelta(days=rng.randrange(365 * 40))
+
+
+def receipt_with_date(rng: random.Random, value: str) -> str:
+    lines = rng.sample(_FILLER, 3)
+    label = rng.choice(["", "Date: ", "DATE ", "Datum "])
+    lines.insert(rng.randrange(len(lines) + 1), label + value + rng.choice(["", " 14:32"]))
+    return "\n".join(lines)
+
+
+def fuzz(count: int, seed: int) -> dict:
+    """Round-trips `count` random dates and parses `count` garbage strings."""
+    rng = random.Random(seed)
+    failures = []
+    for _ in range(count):
+        fmt = rng.choice(list(FORMATS))
+        expected = random_date(rng)
+        text = receipt_with_date(rng, expected.strftime(fmt))
+        order = FORMATS[fmt] or rng.choice(list(LOCALES))
+        found = parser.parse_date(text, LOCALES[order])
+        if found != expected:
+            failures.append({"format": fmt, "text": text, "expected": str(expected), "found": str(found)})
+
+    alphabet = string.digits * 4 + "./-, :\n" + string.ascii_letters + "äéû€$"
+    for _ in range(count):
+        garbage = "".join(rng.choice(alphabet) for _ in range(rng.randrange(80)))
+        parser.parse_date(garbage, rng.choice([None, "en-US", "de-DE", "zh-CN"]))
+    return {"round_trips": count, "garbage": count, "failures": len(failures), "examples": failures[:5]}
+
+
+_NAIVE_TOKEN = re.compile(r'[\w.,/-]+(?:,? [\w.,/-]+){0,2}')
+
+
+def naive_parse_date(text: str) -> Optional[date]:
+    """The strptime approach: every format tried on every run of one to three words."""
+    for line in text.splitlines():
+        for start in range(len(line)):
+            match = _NAIVE_TOKEN.match(line, start)
+            if not match or (start and line[start - 1].isalnum()):
+                continue
+            for fmt in FORMATS:
+                try:
+                    return datetime.strptime(match.group(), fmt).date()
+                except ValueError:
+                    pass
+    return None
+
+
+def benchmark(count: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    texts = [receipt_with_date(rng, random_date(rng).strftime(rng.choice(list(FORMATS)))) for _ in range(count)]
+    report = {"texts": count}
+    for name, parse in (("engine", parser.parse_date), ("strptime", naive_parse_date)):
+        start = time.perf_counter()
+        for text in texts:
+            parse(text)
+        elapsed = time.perf_counter() - start
+        report[name] = {"seconds": round(elapsed, 4), "microseconds_per_text": round(elapsed / count * 1e6, 2)}
+    report["speedup"] = round(report["strptime"]["seconds"] / report["engine"]["seconds"], 2)
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Fuzz test and benchmark the receipt date engine.")
+    arg_parser.add_argument("--fuzz", type=int, default=10000, help="Random dates (and garbage strings) to check")
+    arg_parser.add_argument("--benchmark", type=int, default=5000, help="Texts to time; 0 to skip")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    report = {"fuzz": fuzz(args.fuzz, args.seed)}
+    if args.benchmark:
+        report["benchmark"] = benchmark(args.benchmark, args.seed)
+    print(json.dumps(report, indent=2))
+    if report["fuzz"]["failures"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+OCR + parse throughput and accuracy benchmark.
+
+Renders a synthetic corpus (bench/synth.py), runs every receipt through
+ocr.extract_receipt_data and parser.parse_receipt with the OCR cache disabled,
+and prints a JSON report: receipts/sec, p50/p95 latency, peak RSS and
+per-field accuracy.
+
+    python -m bench.ocr_bench --count 200 --seed 0 --output before.json
+    python -m bench.ocr_bench --count 200 --seed 0 --compare before.json
+
+Use --save-corpus/--corpus to pin the exact images (e.g. across machines with
+different fonts). OCR settings come from the environment as usual and are
+recorded in the report.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from app import ocr, ocr_cache, parser
+from app.config import settings
+
+from . import synth
+
+FIELDS = ("amount", "date", "merchant", "currency")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _percentile(values: list[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))], 3)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def score(parsed: dict, truth: dict) -> dict:
+    """Which fields of parser.parse_receipt output match the ground truth."""
+    return {
+        "amount": parsed["amount"] is not None and parsed["amount"] == Decimal(truth["amount"]),
+        "date": parsed["date"] is not None and parsed["date"] == date.fromisoformat(truth["date"]),
+        "merchant": parsed["merchant"] is not None and _normalize(parsed["merchant"]) == _normalize(truth["merchant"]),
+        "currency": parsed.get("currency") == truth["currency"],
+    }
+
+
+async def _run(receipts: list[synth.Receipt], concurrency: int) -> list[dict]:
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def one(receipt: synth.Receipt) -> dict:
+        async with limiter:
+            start = time.perf_counter()
+            try:
+                result = await ocr.extract_receipt_data(receipt.image)
+                parsed = parser.parse_receipt(result["text"])
+            except Exception as e:
+                return {"name": receipt.name, "error": str(getattr(e, "detail", e))}
+            return {
+                "name": receipt.name,
+                "latency_ms": (time.perf_counter() - start) * 1000,
+                "correct": score(parsed, receipt.truth),
+            }
+
+    return await asyncio.gather(*(one(receipt) for receipt in receipts))
+
+
+def run_benchmark(receipts: list[synth.Receipt], concurrency: int) -> dict:
+    """Runs the corpus through OCR and the parser and builds the report."""
+    # Every receipt must really be OCRed, never served from an earlier run
+    ocr_cache.cache = ocr_cache.OCRCache(max_bytes=0)
+    ocr.start_ocr_pool()
+    try:
+        start = time.perf_counter()
+        results = asyncio.run(_run(receipts, concurrency))
+        elapsed = time.perf_counter() - start
+    finally:
+        # Workers must have exited for RUSAGE_CHILDREN to include their peak
+        ocr.shutdown_ocr_pool()
+
+    ok = [r for r in results if "error" not in r]
+    latencies = [r["latency_ms"] for r in ok]
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+
+    accuracy = {
+        field: sum(r["correct"][field] for r in ok) / len(results) if results else None
+        for field in FIELDS
+    }
+    accuracy["all"] = sum(all(r["correct"].values()) for r in ok) / len(results) if results else None
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "ocr_config": ocr.ocr_config_fingerprint(),
+        "workers": settings.OCR_WORKERS,
+        "concurrency": concurrency,
+        "receipts": len(results),
+        "errors": len(results) - len(ok),
+        "seconds": round(elapsed, 3),
+        "receipts_per_second": round(len(results) / elapsed, 3) if elapsed else None,
+        "latency_ms": {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "mean": round(statistics.fmean(latencies), 3) if latencies else None,
+        },
+        "peak_rss_mb": {
+            "main": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * rss_unit / 2**20, 1),
+            "worker": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * rss_unit / 2**20, 1),
+        },
+        "accuracy": accuracy,
+        "failures": [
+            {"name": r["name"], "fields": [f for f, good in r["correct"].items() if not good]}
+            for r in ok if not all(r["correct"].values())
+        ] + [r for r in results if "error" in r],
+    }
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Differences (report minus baseline) of the headline numbers."""
+    def delta(new, old):
+        return None if new is None or old is None else round(new - old, 4)
+
+    return {
+        "baseline_commit": baseline.get("commit"),
+        "receipts_per_second": delta(report["receipts_per_second"], baseline["receipts_per_second"]),
+        "latency_ms": {key: delta(report["latency_ms"][key], baseline["latency_ms"][key]) for key in ("p50", "p95")},
+        "peak_rss_mb": {key: delta(report["peak_rss_mb"][key], baseline["peak_rss_mb"][key]) for key in ("main", "worker")},
+        "accuracy": {key: delta(report["accuracy"][key], baseline["accuracy"][key]) for key in report["accuracy"]},
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Benchmark OCR and parsing on synthetic receipts.")
+    arg_parser.add_argument("--count", type=int, default=100, help="Receipts to generate")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Corpus seed; same seed, same receipts")
+    arg_parser.add_argument("--corpus", help="Read receipts from a directory written by --save-corpus")
+    arg_parser.add_argument("--save-corpus", help="Write the generated receipts to this directory and exit")
+    arg_parser.add_argument("--concurrency", type=int, default=settings.OCR_WORKERS, help="Receipts in flight at once")
+    arg_parser.add_argument("--output", help="Write the report here instead of stdout")
+    arg_parser.add_argument("--compare", help="Baseline report to diff against")
+    args = arg_parser.parse_args(argv)
+
+    if args.save_corpus:
+        written = synth.save_corpus(synth.generate(args.count, args.seed), args.save_corpus)
+        print(f"Wrote {written} receipts to {args.save_corpus}", file=sys.stderr)
+        return
+
+    receipts = list(synth.load_corpus(args.corpus) if args.corpus else synth.generate(args.count, args.seed))
+    report = run_benchmark(receipts, max(1, args.concurrency))
+    report["corpus"] = args.corpus or {"count": args.count, "seed": args.seed}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["compared_to_baseline"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Parser microbenchmark.
+
+Times parser.parse_receipt over a corpus of receipt texts and, with
+--baseline, against parser.py as it was at another git revision (checking that
+both give the same fields).
+
+    python -m bench.parser_bench --count 20000 --baseline 24028ac
+    python -m bench.parser_bench --texts texts.ndjson
+
+Compare against 24028ac, the per-field regex parser from before the tokenizer,
+rather than just the previous commit: it reads fewer formats (no currencies,
+decimal commas or month names), so it is the bar the parser is measured against,
+and its fields differ wherever it can't read the text.
+
+--texts reads one receipt per line, either a JSON string or an object with a
+"text" key (e.g. exported OCR text); without it, synthetic receipt texts from
+bench/synth.py are used.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import types
+from typing import Callable, Optional
+
+from app import parser
+
+from . import synth
+
+
+def load_parser_at(revision: str) -> types.ModuleType:
+    """Imports app/parser.py as of a git revision, alongside the current one."""
+    source = subprocess.run(
+        ["git", "show", f"{revision}:./app/parser.py"], capture_output=True, text=True, check=True
+    ).stdout
+    module = types.ModuleType("app._baseline_parser")
+    # Relative imports in the old file resolve against the current package
+    module.__package__ = "app"
+    exec(compile(source, f"parser.py@{revision}", "exec"), module.__dict__)
+    return module
+
+
+def time_parse(parse: Callable[[str], dict], texts: list[str], repeat: int) -> dict:
+    """Best of `repeat` passes over all texts."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            parse(text)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "seconds": round(best, 4),
+        "texts_per_second": round(len(texts) / best),
+        "microseconds_per_text": round(best / len(texts) * 1e6, 2),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    arg_parser = argparse.ArgumentParser(description="Benchmark parser.parse_receipt.")
+    arg_parser.add_argument("--count", type=int, default=10000, help="Synthetic texts to generate")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--texts", help="NDJSON file of receipt texts ('-' for stdin)")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Passes per implementation; the best is kept")
+    arg_parser.add_argument("--baseline", help="Git revision whose parser.py to compare against")
+    args = arg_parser.parse_args(argv)
+
+    if args.texts:
+        with (sys.stdin if args.texts == "-" else open(args.texts, encoding="utf-8")) as f:
+            texts = list(parser.read_texts(f))
+    else:
+        texts = [text for text, _ in synth.generate_texts(args.count, args.seed)]
+
+    report = {"texts": len(texts), "current": time_parse(parser.parse_receipt, texts, args.repeat)}
+    if args.baseline:
+        baseline = load_parser_at(args.baseline)
+        report["baseline"] = {"revision": args.baseline, **time_parse(baseline.parse_receipt, texts, args.repeat)}
+        report["speedup"] = round(report["baseline"]["seconds"] / report["current"]["seconds"], 2)
+        differing = {}
+        for text in texts:
+            old, new = baseline.parse_receipt(text), parser.parse_receipt(text)
+            for field in new:
+                if old.get(field) != new[field]:
+                    differing[field] = differing.get(field, 0) + 1
+        report["differing_fields"] = differing
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
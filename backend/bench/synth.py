@@ -0,0 +1,193 @@
+"""
+Synthetic receipt generator with known ground truth.
+
+Receipts are rendered with Pillow from a seeded random generator, so the same
+seed always yields the same corpus on a given machine (fonts are looked up on
+the system, so pin them with a saved corpus when comparing across machines).
+"""
+import io
+import json
+import os
+import random
+from datetime import date, timedelta
+from decimal import ROUND_CEILING, Decimal
+from typing import Iterator, NamedTuple, Optional
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+FONT_DIRS = ("/usr/share/fonts", "/usr/local/share/fonts", "/Library/Fonts", "C:\\Windows\\Fonts")
+
+MERCHANTS = (
+    "SHOP MART", "CORNER GROCERY", "BLUE BOTTLE CAFE", "CITY PHARMACY", "FRESH FOODS MARKET",
+    "HARDWARE PLUS", "NOODLE HOUSE", "BOOK NOOK", "GAS AND GO", "SUNRISE BAKERY",
+)
+ITEMS = (
+    "MILK 2L", "BREAD", "EGGS 12", "COFFEE", "BANANAS", "PASTA", "OLIVE OIL", "CHEESE",
+    "SHAMPOO", "BATTERIES AA", "NOTEBOOK", "SANDWICH", "TEA", "APPLES", "RICE 1KG", "SOAP",
+)
+
+# ISO code -> how amounts are printed: symbol/code, symbol before the number,
+# number of decimals, thousands separator, decimal separator
+CURRENCY_FORMATS = {
+    "USD": ("$", True, 2, ",", "."),
+    "EUR": ("€", False, 2, ".", ","),
+    "GBP": ("£", True, 2, ",", "."),
+    "JPY": ("¥", True, 0, ",", "."),
+    "CAD": ("CAD", False, 2, ",", "."),
+}
+
+# Date formats as strftime patterns; "%b" is kept English by formatting it ourselves
+DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d", "%d.%m.%Y", "%d %b %Y")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+class Receipt(NamedTuple):
+    name: str
+    image: bytes
+    truth: dict
+
+
+def find_fonts() -> list[str]:
+    """TrueType fonts installed on this machine, sorted so the choice is stable."""
+    fonts = []
+    for font_dir in FONT_DIRS:
+        for root, _, files in os.walk(font_dir):
+            fonts.extend(os.path.join(root, f) for f in files if f.lower().endswith(".ttf"))
+    return sorted(fonts)
+
+
+def format_amount(amount: Decimal, currency: str) -> str:
+    symbol, before, decimals, thousands, decimal_sep = CURRENCY_FORMATS[currency]
+    number = f"{amount:,.{decimals}f}".replace(",", "\0").replace(".", decimal_sep).replace("\0", thousands)
+    return f"{symbol}{number}" if before else f"{number} {symbol}"
+
+
+def format_date(value: date, pattern: str) -> str:
+    return value.strftime(pattern.replace("%b", _MONTHS[value.month - 1]))
+
+
+def _load_font(rng: random.Random, fonts: list[str], size: int) -> ImageFont.FreeTypeFont:
+    if fonts:
+        return ImageFont.truetype(rng.choice(fonts), size)
+    return ImageFont.load_default(size)
+
+
+def _receipt_lines(rng: random.Random, currency: str) -> tuple[list[str], dict]:
+    decimals = CURRENCY_FORMATS[currency][2]
+    unit = Decimal(1).scaleb(-decimals)
+    # Zero-decimal currencies have prices in the hundreds or thousands
+    scale = 100 if decimals == 0 else 1
+
+    merchant = rng.choice(MERCHANTS)
+    if rng.random() < 0.3:
+        merchant = f"{merchant} #{rng.randint(100, 9999)}"
+    receipt_date = date(2020, 1, 1) + timedelta(days=rng.randint(0, 5 * 365))
+    date_format = rng.choice(DATE_FORMATS)
+
+    lines = [merchant, f"{rng.randint(1, 999)} MAIN ST", ""]
+    lines.append(f"DATE {format_date(receipt_date, date_format)}  {rng.randint(7, 21):02d}:{rng.randint(0, 59):02d}")
+    lines.append("")
+
+    subtotal = Decimal(0)
+    for _ in range(rng.randint(2, 25)):
+        price = (Decimal(rng.randint(50, 5000 if rng.random() < 0.9 else 150000)) / 100 * scale).quantize(unit)
+        subtotal += price
+        lines.append(f"{rng.choice(ITEMS):<16}{format_amount(price, currency):>14}")
+    tax = (subtotal * Decimal(rng.choice(("0", "0.05", "0.08", "0.2")))).quantize(unit)
+    total = subtotal + tax
+
+    lines += ["", f"{'SUBTOTAL':<16}{format_amount(subtotal, currency):>14}"]
+    if tax:
+        lines.append(f"{'TAX':<16}{format_amount(tax, currency):>14}")
+    lines.append(f"{'TOTAL':<16}{format_amount(total, currency):>14}")
+    if rng.random() < 0.3:
+        cash = (total / (10 * scale)).to_integral_value(rounding=ROUND_CEILING) * 10 * scale
+        lines.append(f"{'CASH':<16}{format_amount(cash, currency):>14}")
+    lines += ["", "THANK YOU"]
+
+    truth = {
+        "amount": str(total),
+        "date": receipt_date.isoformat(),
+        "merchant": merchant,
+        "currency": currency,
+        "date_format": date_format,
+        "lines": len(lines),
+    }
+    return lines, truth
+
+
+def render(lines: list[str], rng: random.Random, fonts: list[str]) -> bytes:
+    """Renders receipt lines onto a thermal-paper-sized image, with optional noise, blur and skew."""
+    size = rng.randint(18, 28)
+    font = _load_font(rng, fonts, size)
+    line_height = int(size * 1.35)
+    margin = rng.randint(10, 40)
+    width = max(int(font.getlength(line)) for line in lines) + 2 * margin
+    height = line_height * len(lines) + 2 * margin
+
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((margin, margin + index * line_height), line, font=font, fill=rng.randint(0, 60))
+
+    if rng.random() < 0.5:
+        # Paper texture / sensor noise
+        noise = Image.effect_noise(image.size, rng.uniform(10, 40))
+        image = Image.blend(image, noise, rng.uniform(0.05, 0.2))
+    if rng.random() < 0.3:
+        image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 1.0)))
+    if rng.random() < 0.5:
+        image = image.rotate(rng.uniform(-3, 3), resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+
+    buffer = io.BytesIO()
+    if rng.random() < 0.5:
+        image.save(buffer, "JPEG", quality=rng.randint(60, 95))
+    else:
+        image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def generate(count: int, seed: int = 0, fonts: Optional[list[str]] = None) -> Iterator[Receipt]:
+    """
+    Yields `count` synthetic receipts. The truth dict holds the printed total
+    (`amount`, as a decimal string), ISO `date`, `merchant` (the first line),
+    `currency` and the date format used.
+    """
+    fonts = find_fonts() if fonts is None else fonts
+    for index in range(count):
+        # One generator per receipt, so receipt N is the same whatever `count` is
+        rng = random.Random(f"{seed}:{index}")
+        lines, truth = _receipt_lines(rng, rng.choice(sorted(CURRENCY_FORMATS)))
+        image = render(lines, rng, fonts)
+        extension = "jpg" if image[:2] == b"\xff\xd8" else "png"
+        yield Receipt(f"{index:05d}.{extension}", image, truth)
+
+
+def generate_texts(count: int, seed: int = 0) -> Iterator[tuple[str, dict]]:
+    """Yields the text (as printed, no OCR) and truth of `count` receipts, for parser benchmarks."""
+    for index in range(count):
+        rng = random.Random(f"{seed}:{index}")
+        lines, truth = _receipt_lines(rng, rng.choice(sorted(CURRENCY_FORMATS)))
+        yield "\n".join(lines), truth
+
+
+def save_corpus(receipts: Iterator[Receipt], directory: str) -> int:
+    """Writes receipts as image files plus a truth.json; returns how many were written."""
+    os.makedirs(directory, exist_ok=True)
+    truths = {}
+    for receipt in receipts:
+        with open(os.path.join(directory, receipt.name), "wb") as f:
+            f.write(receipt.image)
+        truths[receipt.name] = receipt.truth
+    with open(os.path.join(directory, "truth.json"), "w", encoding="utf-8") as f:
+        json.dump(truths, f, indent=1, ensure_ascii=False)
+    return len(truths)
+
+
+def load_corpus(directory: str) -> Iterator[Receipt]:
+    """Reads a corpus written by save_corpus."""
+    with open(os.path.join(directory, "truth.json"), encoding="utf-8") as f:
+        truths = json.load(f)
+    for name in sorted(truths):
+        with open(os.path.join(directory, name), "rb") as f:
+            yield Receipt(name, f.read(), truths[name])
@@ -0,0 +1,5 @@
+import os
+
+# app.config needs a database URL at import; the tests that touch the database
+# use their own in-memory SQLite engine.
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
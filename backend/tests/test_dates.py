@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+from app import dates, parser
+
+
+@pytest.mark.parametrize("locale, order", [
+    (None, "MDY"),
+    ("en", "MDY"),
+    ("en-US", "MDY"),
+    ("en_GB", "DMY"),
+    ("de-DE", "DMY"),
+    ("fr", "DMY"),
+    ("ja-JP", "YMD"),
+    ("zh", "YMD"),
+    ("zh-Hant-TW", "YMD"),
+    ("sv-SE", "YMD"),
+    ("es-PR", "MDY"),
+])
+def test_date_order(locale, order):
+    assert dates.date_order(locale) == order
+
+
+def readings(value):
+    return [(found, order) for found, order, _ in dates.numeric_candidates(value)]
+
+
+def test_numeric_candidates_iso_dates_have_one_reading():
+    assert readings("2024-03-15") == [(date(2024, 3, 15), "YMD")]
+    assert readings("2024/3/5") == [(date(2024, 3, 5), "YMD")]
+
+
+def test_numeric_candidates_ambiguous_dates_have_both_readings():
+    assert sorted(readings("03/04/24")) == [(date(2024, 3, 4), "MDY"), (date(2024, 4, 3), "DMY")]
+    # Dots are a day-first habit
+    assert dates.numeric_candidates("03.04.2024")[0][1] == "DMY"
+
+
+def test_numeric_candidates_keep_only_valid_dates():
+    assert readings("15/03/2024") == [(date(2024, 3, 15), "DMY")]
+    assert readings("02/29/2023") == []
+    assert readings("02/29/2024") == [(date(2024, 2, 29), "MDY")]
+    assert readings("1/2/1850") == []
+
+
+@pytest.mark.parametrize("value", ["2024-03", "15/03-2024", "123/4/2024", "1.2.3.4", "", "12/ab/2024"])
+def test_numeric_candidates_reject_other_shapes(value):
+    assert dates.numeric_candidates(value) == []
+
+
+@pytest.mark.parametrize("text, locale, expected", [
+    ("Date: 03/04/24", "en-US", date(2024, 3, 4)),
+    ("Date: 03/04/24", "en-GB", date(2024, 4, 3)),
+    ("15 Mar 2024 14:32", None, date(2024, 3, 15)),
+    ("Datum 15. März 2024", "de-DE", date(2024, 3, 15)),
+    ("TEL 555-0142\n2024-03-15", "fr-FR", date(2024, 3, 15)),
+])
+def test_parse_date(text, locale, expected):
+    assert parser.parse_date(text, locale) == expected
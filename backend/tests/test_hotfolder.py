@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import os
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from app import hotfolder, schemas
+
+
+@pytest.fixture
+def folder(tmp_path, sessions, monkeypatch):
+    monkeypatch.setattr(hotfolder, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(hotfolder, "_RETRY_SECONDS", 0)
+    monkeypatch.setattr(hotfolder.uploads, "check_receipt_header", lambda data, filename: None)
+    folder = hotfolder.HotFolder(str(tmp_path), workers=1, poll_interval=1, category="Food")
+    folder._setup()
+    return folder
+
+
+def claim(folder, data):
+    path = os.path.join(folder.processing_dir, "receipt.jpg")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def run_worker(folder, path, until):
+    async def run():
+        worker = asyncio.create_task(folder._worker())
+        await folder.queue.put(path)
+        while not until():
+            await asyncio.sleep(0.01)
+        worker.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+
+def test_busy_ocr_is_retried_and_bad_files_fail(folder, monkeypatch):
+    outcomes = [HTTPException(status_code=503, detail="OCR queue is full."),
+                HTTPException(status_code=504, detail="OCR timed out."),
+                HTTPException(status_code=422, detail="Could not read amount.")]
+
+    async def ingest_receipt(db, data, category, admit):
+        raise outcomes.pop(0)
+
+    monkeypatch.setattr(hotfolder.receipts, "ingest_receipt", ingest_receipt)
+    run_worker(folder, claim(folder, b"scan"), until=lambda: os.listdir(folder.failed_dir))
+
+    assert not outcomes
+    assert sorted(os.listdir(folder.failed_dir)) == ["receipt.jpg", "receipt.jpg.error.txt"]
+    with open(os.path.join(folder.failed_dir, "receipt.jpg.error.txt")) as f:
+        assert f.read() == "Could not read amount.\n"
+
+
+def test_gives_up_on_a_file_the_ocr_keeps_turning_away(folder, monkeypatch):
+    async def ingest_receipt(db, data, category, admit):
+        raise HTTPException(status_code=503, detail="OCR worker crashed.")
+
+    monkeypatch.setattr(hotfolder.receipts, "ingest_receipt", ingest_receipt)
+    run_worker(folder, claim(folder, b"scan"), until=lambda: os.listdir(folder.failed_dir))
+    with open(os.path.join(folder.failed_dir, "receipt.jpg.error.txt")) as f:
+        assert "gave up after 5 retries" in f.read()
+
+
+def test_file_ingested_before_a_crash_is_not_ingested_again(folder, sessions, monkeypatch):
+    data = b"scan"
+
+    async def add_expense():
+        async with sessions() as db:
+            expense = schemas.Expense(
+                amount=Decimal("4.20"), currency="EUR", normalized_amount=Decimal("4.20"), category="Food",
+                merchant="Bakery", date=date(2024, 5, 1), source_hash=hashlib.sha256(data).hexdigest(),
+            )
+            db.add(expense)
+            await db.commit()
+            return expense.id
+
+    async def ingest_receipt(db, data, category, admit):
+        raise AssertionError("ingested twice")
+
+    # The expense was committed, but the ledger entry never written
+    expense_id = asyncio.run(add_expense())
+    monkeypatch.setattr(hotfolder.receipts, "ingest_receipt", ingest_receipt)
+    asyncio.run(folder._process(claim(folder, data)))
+
+    assert os.listdir(folder.done_dir) == ["receipt.jpg"]
+    with open(folder.ledger_path) as f:
+        assert f.read() == f"{hashlib.sha256(data).hexdigest()} {expense_id}\n"
+
@@ -0,0 +1,20 @@
+import io
+
+from PIL import Image
+
+from app import image_store
+from app.config import settings
+
+
+def test_store_keeps_colour_of_jpeg_originals(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RECEIPT_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "OCR_PREPROCESS_GRAYSCALE", True)
+    upload = io.BytesIO()
+    Image.new("RGB", (4000, 3000), (200, 30, 30)).save(upload, "JPEG")
+
+    path, _ = image_store.find(image_store.store(upload.getvalue()))
+    with Image.open(path) as stored:
+        assert stored.mode == "RGB"
+        assert max(stored.size) == settings.RECEIPT_IMAGE_MAX_SIDE
+        red, green, blue = stored.getpixel((10, 10))
+        assert red > 150 and green < 80 and blue < 80
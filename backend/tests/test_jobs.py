@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import jobs, ocr, schemas
+from app.config import settings
+
+
+@pytest.fixture
+def job_sessions(sessions, monkeypatch):
+    monkeypatch.setattr(jobs, "AsyncSessionLocal", sessions)
+    return sessions
+
+
+async def add_job(sessions, status):
+    async with sessions() as db:
+        job = schemas.OcrJob(filename="receipt.jpg", status=status)
+        db.add(job)
+        await db.commit()
+        return job.id
+
+
+def test_event_stream_stops_listening_when_the_client_goes_away(job_sessions):
+    async def run():
+        job_id = await add_job(job_sessions, "queued")
+        first, second = jobs.stream_events(job_id), jobs.stream_events(job_id)
+        assert "queued" in await first.__anext__()
+        assert "queued" in await second.__anext__()
+
+        pending = asyncio.ensure_future(second.__anext__())
+        await asyncio.sleep(0)
+        await first.aclose()
+        assert len(jobs._changed[job_id]) == 1
+
+        await jobs._set_status(job_id, status="done")
+        assert "done" in await pending
+        with pytest.raises(StopAsyncIteration):
+            await second.__anext__()
+        assert job_id not in jobs._changed
+
+    asyncio.run(run())
+
+
+def test_event_stream_of_a_finished_job_leaves_nothing_behind(job_sessions):
+    async def run():
+        job_id = await add_job(job_sessions, "failed")
+        events = [event async for event in jobs.stream_events(job_id)]
+        assert len(events) == 1 and "failed" in events[0]
+        assert job_id not in jobs._changed
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def no_retry_wait(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_JOB_RETRY_SECONDS", 0)
+    monkeypatch.setattr(settings, "OCR_JOB_MAX_RETRIES", 2)
+
+
+async def add_image_job(sessions):
+    async with sessions() as db:
+        job = schemas.OcrJob(filename="receipt.jpg", status="queued", image_data=b"image")
+        db.add(job)
+        await db.commit()
+        return job.id
+
+
+def run_job(sessions, monkeypatch, outcomes):
+    calls = []
+
+    async def extract_text_from_image(image_data):
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(jobs.ocr, "extract_text_from_image", extract_text_from_image)
+
+    async def run():
+        job_id = await add_image_job(sessions)
+        await jobs._run_job(job_id)
+        async with sessions() as db:
+            return await db.get(schemas.OcrJob, job_id)
+
+    return asyncio.run(run()), len(calls)
+
+
+def test_job_waits_out_a_full_ocr_queue(job_sessions, monkeypatch, no_retry_wait):
+    job, calls = run_job(job_sessions, monkeypatch, [ocr.OcrQueueFull(), ocr.OcrQueueFull(), "TOTAL 1.00"])
+    assert (job.status, job.text, calls) == ("done", "TOTAL 1.00", 3)
+
+
+def test_job_fails_once_the_ocr_queue_stays_full(job_sessions, monkeypatch, no_retry_wait):
+    job, calls = run_job(job_sessions, monkeypatch, [ocr.OcrQueueFull()] * 3)
+    assert (job.status, calls) == ("failed", 3)
+    assert "queue is full" in job.error and job.image_data is None
+
+
+def test_job_fails_at_once_when_a_worker_crashes(job_sessions, monkeypatch, no_retry_wait):
+    crashed = HTTPException(status_code=503, detail="OCR worker crashed. Please try again.")
+    job, calls = run_job(job_sessions, monkeypatch, [crashed, "unused"])
+    assert (job.status, job.error, calls) == ("failed", "OCR worker crashed. Please try again.", 1)
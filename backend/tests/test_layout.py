@@ -0,0 +1,56 @@
+from app import layout
+
+
+def line(text, top, height=10):
+    return {"text": text, "left": 0, "top": top, "right": 100, "bottom": top + height, "words": []}
+
+
+def test_roi_bands_include_dates_with_month_names():
+    lines = [line("CORNER BAKERY", 0)] + [line(f"ITEM {i} 2.50", 40 * i) for i in range(1, 8)]
+    lines[3] = line("15 Mar 2024 14:32", 120)
+    lines[6] = line("TOTAL 12.50", 240)
+
+    bands = layout.find_roi_bands(lines, scale=1.0, image_height=400, header_lines=1)
+
+    assert bands == [(0, 20, True), (110, 140, False), (230, 260, False)]
+
+
+def test_plan_strips_cuts_between_rows_with_one_line_of_overlap():
+    rows = [(top, top + 20) for top in range(0, 1000, 50)]
+
+    strips = layout.plan_strips(rows, height=1000, count=3)
+
+    gaps = {(end + next_start) // 2 for (_, end), (next_start, _) in zip(rows, rows[1:])}
+    assert len(strips) == 3
+    assert strips[0][0] == 0 and strips[-1][1] == 1000
+    for (_, bottom), (next_top, _) in zip(strips, strips[1:]):
+        assert bottom in gaps and next_top in gaps
+        # The next strip starts at the gap one row above the cut
+        assert next_top == bottom - 50
+
+
+def test_plan_strips_keeps_pages_without_gaps_whole():
+    assert layout.plan_strips([(0, 900)], height=1000, count=4) == [(0, 1000)]
+    assert layout.plan_strips([(0, 20), (50, 70)], height=100, count=1) == [(0, 100)]
+
+
+def words(text):
+    return [{"text": word, "conf": 90.0} for word in text.split()]
+
+
+def test_merge_strip_lines_drops_the_repeated_overlap():
+    first = [words("CORNER BAKERY"), words("BREAD 3.50"), words("MILK 1.20")]
+    second = [words("milk  1.20"), words("TOTAL 4.70")]
+
+    merged = layout.merge_strip_lines([first, second])
+
+    assert [layout.line_text(line) for line in merged] == ["CORNER BAKERY", "BREAD 3.50", "MILK 1.20", "TOTAL 4.70"]
+
+
+def test_merge_strip_lines_keeps_strips_that_dont_overlap():
+    first = [words("BREAD 3.50")]
+    second = [words("MILK 1.20"), words("BREAD 3.50")]
+
+    merged = layout.merge_strip_lines([first, second])
+
+    assert [layout.line_text(line) for line in merged] == ["BREAD 3.50", "MILK 1.20", "BREAD 3.50"]
@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, ocr
+from app.config import settings
+
+
+@pytest.fixture
+def client():
+    # Not entered as a context manager: the startup hooks (database, OCR pool) don't run
+    return TestClient(main.app)
+
+
+def post_with_length(client, path, length):
+    headers = {"Content-Length": str(length), "Content-Type": "multipart/form-data; boundary=x"}
+    return client.post(path, content=b"", headers=headers)
+
+
+def test_single_file_routes_are_capped_at_one_file(client):
+    too_large = settings.OCR_MAX_UPLOAD_BYTES * 2
+    for path in ("/ocr/receipt", "/ocr/jobs", "/receipts/ingest"):
+        assert post_with_length(client, path, too_large).status_code == 413
+
+
+def test_batch_and_zip_routes_have_their_own_caps(client):
+    batch_limit = settings.OCR_MAX_UPLOAD_BYTES * settings.OCR_BATCH_MAX_FILES
+    assert post_with_length(client, "/ocr/receipts/batch", settings.OCR_MAX_UPLOAD_BYTES * 2).status_code != 413
+    assert post_with_length(client, "/ocr/receipts/batch", batch_limit * 2).status_code == 413
+    assert post_with_length(client, "/receipts/zip", settings.ZIP_MAX_UPLOAD_BYTES // 2).status_code != 413
+    assert post_with_length(client, "/receipts/zip", settings.ZIP_MAX_UPLOAD_BYTES * 2).status_code == 413
+
+
+def test_batch_ocrs_each_spooled_file(client, monkeypatch):
+    async def extract_text_from_image(image_data):
+        return f"{len(image_data)} bytes"
+
+    monkeypatch.setattr(ocr, "extract_text_from_image", extract_text_from_image)
+    monkeypatch.setattr(main.uploads, "check_receipt_header", lambda data, filename: None)
+    files = [("files", (f"{size}.png", b"x" * size, "image/png")) for size in (10, 2 * 1024 * 1024, 30)]
+
+    response = client.post("/ocr/receipts/batch", files=files)
+
+    assert response.status_code == 200
+    assert [result["text"] for result in response.json()["results"]] == ["10 bytes", "2097152 bytes", "30 bytes"]
+
+
+def test_batch_rejects_an_oversized_file(client, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_MAX_UPLOAD_BYTES", 100)
+    files = [("files", ("a.png", b"x" * 50, "image/png")), ("files", ("b.png", b"x" * 200, "image/png"))]
+    assert client.post("/ocr/receipts/batch", files=files).status_code == 413
+
+
+def test_ocr_receipt_returns_the_text_and_the_fields_parsed_from_it(client, sessions, monkeypatch):
+    async def extract_receipt_data(image_data):
+        return {"text": "CORNER BAKERY\nTOTAL 4,20 EUR\n01/05/2024", "words": []}
+
+    async def get_db():
+        async with sessions() as db:
+            yield db
+
+    monkeypatch.setattr(ocr, "extract_receipt_data", extract_receipt_data)
+    monkeypatch.setattr(main.uploads, "check_receipt_header", lambda data, filename: None)
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_db, get_db)
+
+    response = client.post("/ocr/receipt", files={"file": ("receipt.png", b"scan", "image/png")})
+
+    assert response.status_code == 200
+    assert response.json()["text"].startswith("CORNER BAKERY")
+    assert response.json()["parsed_data"] == {
+        "amount": "4.20", "date": "2024-01-05", "merchant": "CORNER BAKERY", "currency": "EUR",
+    }
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app import analytics, merchants, schemas
+
+
+@pytest.mark.parametrize("name, key", [
+    ("WAL*MART SUPERCTR #1234", "wal mart supercenter"),
+    ("Walmart Supercenter 0042", "walmart supercenter"),
+    ("Target T-1234", "target"),
+    ("McDonald's #4521", "mcdonalds"),
+    ("SQ *BLUE BOTTLE COFFEE", "blue bottle coffee"),
+    ("Aldi Store No. 42", "aldi"),
+    ("7-Eleven", "7 eleven"),
+    ("7-ELEVEN 35512", "7 eleven"),
+    ("3M", "3m"),
+    ("#123", "123"),
+    ("***", ""),
+])
+def test_normalize(name, key):
+    assert merchants.normalize(name) == key
+
+
+def test_merchant_index_search():
+    index = merchants.MerchantIndex()
+    index.add("walmart supercenter", 1)
+    index.add("whole foods market", 2)
+    index.add("7 eleven", 3)
+
+    assert index.lookup("whole foods market") == 2
+    assert index.search("wal mart supercenter", 0.6) == (1.0, 1)
+    similarity, merchant_id = index.search("whole food market", 0.6)
+    assert merchant_id == 2 and similarity < 1
+    assert index.search("7 elevn", 0.6)[1] == 3
+    assert index.search("shell", 0.6) is None
+    assert index.search("walmart", 0.9) is None
+
+
+@pytest.fixture(autouse=True)
+def empty_index(monkeypatch):
+    monkeypatch.setattr(merchants, "index", merchants.MerchantIndex())
+
+
+def test_resolve_indexes_aliases_only_once_committed(sessions):
+    async def run():
+        async with sessions() as db:
+            rolled_back = await merchants.resolve(db, "Corner Bakery")
+            assert await merchants.resolve(db, "CORNER BAKERY #12") == rolled_back
+            await db.rollback()
+        assert merchants.index.lookup("corner bakery") is None
+
+        async with sessions() as db:
+            merchant_id = await merchants.resolve(db, "Corner Bakery")
+            assert merchants.index.lookup("corner bakery") is None
+            await db.commit()
+        assert merchants.index.lookup("corner bakery") == merchant_id
+        async with sessions() as db:
+            assert await db.get(schemas.Merchant, merchant_id) is not None
+
+    asyncio.run(run())
+
+
+def test_resolve_matches_spellings_learnt_earlier_in_the_transaction(sessions):
+    async def run():
+        async with sessions() as db:
+            first = await merchants.resolve(db, "Walmart Supercenter")
+            assert await merchants.resolve(db, "WAL-MART SUPERCTR") == first
+            await db.commit()
+        assert merchants.index.lookup("wal mart supercenter") == first
+
+    asyncio.run(run())
+
+
+def test_resolve_uses_the_alias_a_concurrent_request_stored(sessions, monkeypatch):
+    async def run():
+        async with sessions() as db:
+            db.add(schemas.Merchant(id=7, name="Corner Bakery"))
+            db.add(schemas.MerchantAlias(alias="corner bakery", merchant_id=7))
+            await db.commit()
+
+        # As if the other request stored it between our lookup and our insert
+        stored = merchants._stored_merchant_id
+        calls = []
+
+        async def stored_after_first_call(db, key):
+            calls.append(key)
+            return None if len(calls) == 1 else await stored(db, key)
+
+        monkeypatch.setattr(merchants, "_stored_merchant_id", stored_after_first_call)
+        async with sessions() as db:
+            assert await merchants.resolve(db, "Corner Bakery") == 7
+            await db.commit()
+        async with sessions() as db:
+            assert len((await db.execute(schemas.Merchant.__table__.select())).all()) == 1
+
+    asyncio.run(run())
+
+
+def test_spending_by_merchant_counts_unlinked_expenses_under_their_name(sessions):
+    def expense(merchant, amount, merchant_id=None):
+        return schemas.Expense(
+            amount=amount, currency="USD", normalized_amount=amount, category="Food",
+            merchant=merchant, merchant_id=merchant_id, date=date(2024, 5, 1),
+        )
+
+    async def run():
+        async with sessions() as db:
+            db.add(schemas.Merchant(id=1, name="Walmart Supercenter"))
+            db.add_all([
+                expense("WAL*MART SUPERCTR #12", Decimal("10.00"), 1),
+                expense("Walmart Supercenter 0042", Decimal("5.00"), 1),
+                expense("3M", Decimal("7.00")),
+                expense("3M", Decimal("1.00")),
+            ])
+            await db.commit()
+            return [tuple(row) for row in await analytics.get_spending_by_merchant(db)]
+
+    assert asyncio.run(run()) == [("Walmart Supercenter", Decimal("15.00")), ("3M", Decimal("8.00"))]
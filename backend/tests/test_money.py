@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+import pytest
+
+from app import money, parser
+
+
+@pytest.mark.parametrize("value, currency, amount", [
+    ("12.50", None, "12.50"),
+    ("12,50", None, "12.50"),
+    ("1,234.56", None, "1234.56"),
+    ("1.234,56", "EUR", "1234.56"),
+    ("1'234.50", "CHF", "1234.50"),
+    ("1,23,456.00", "INR", "123456.00"),
+    ("1 234,56", "EUR", "1234.56"),
+    ("1\u202f234\u202f567,89", "EUR", "1234567.89"),
+    ("1\u00a0234.56", None, "1234.56"),
+    ("1200", "JPY", "1200"),
+    ("1,200", "JPY", "1200"),
+    ("1.250", "KWD", "1.250"),
+    ("1.250", "EUR", "1250"),
+    ("1\u00a0250", "KWD", "1250"),
+])
+def test_read_amount(value, currency, amount):
+    assert money.read_amount(value, currency) == Decimal(amount)
+
+
+@pytest.mark.parametrize("value, currency", [
+    ("12.5", None),
+    ("1,2345.00", None),
+    ("1.234.56", None),
+    ("1,234,56", None),
+    ("12 34", None),
+    ("1 234.567", None),
+    ("1200.50", "JPY"),
+])
+def test_read_amount_rejects(value, currency):
+    assert money.read_amount(value, currency) is None
+
+
+@pytest.mark.parametrize("text, total, currency", [
+    ("Total 1 234,56 €", "1234.56", "EUR"),
+    ("TOTAL 1\u202f234,56 EUR", "1234.56", "EUR"),
+    ("Montant total\u00a0: 12\u00a0345,00\u00a0€", "12345.00", "EUR"),
+    ("TOTAL ¥1 200", "1200", "JPY"),
+    ("TEL 555 123 4567\nTOTAL 12.50", "12.50", None),
+])
+def test_parse_money_with_space_grouping(text, total, currency):
+    assert parser.parse_money(text) == (Decimal(total), currency)
+
+
+def test_space_grouped_integers_need_a_currency():
+    assert parser.parse_amount("Account 555 123\nThank you") is None
+
+
+@pytest.mark.parametrize("text, total, currency", [
+    # Quantity then price
+    ("REWE\nKAFFEE 1 299,00\nSUMME EUR 305,50", "305.50", "EUR"),
+    ("SHOP\nTOTAL 2 149.99", "149.99", None),
+    # Store number then price
+    ("Store #12 112.97", "112.97", None),
+    ("Store #12 112.97 USD", "112.97", "USD"),
+    # Time then price
+    ("SHOP\n12:45 128.00", "128.00", None),
+    ("SHOP\n12:45 128.00 EUR", "128.00", "EUR"),
+])
+def test_plain_spaces_dont_join_numbers_onto_prices(text, total, currency):
+    assert parser.parse_money(text) == (Decimal(total), currency)
+
+
+def test_plain_space_grouping_needs_a_currency_but_no_break_spaces_dont():
+    assert parser.parse_amount("TOTAL 1 234,56") == Decimal("234.56")
+    assert parser.parse_amount("TOTAL 1\u202f234,56") == Decimal("1234.56")
+    assert parser.parse_amount("TOTAL 1\u00a0234,56") == Decimal("1234.56")
+    assert parser.parse_amount("TOTAL EUR 1 234,56") == Decimal("1234.56")
@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import ocr, ocr_cache
+from app.config import settings
+
+
+@pytest.fixture
+def slow_recognize(monkeypatch):
+    monkeypatch.setattr(ocr, "ocr_config_fingerprint", lambda: "test")
+    monkeypatch.setattr(ocr_cache, "cache", ocr_cache.OCRCache(max_bytes=1 << 20, cache_dir=""))
+    calls = []
+
+    async def recognize(image_data):
+        calls.append(image_data)
+        await asyncio.sleep(0.05)
+        return {"text": "TOTAL 12.50", "words": []}
+
+    monkeypatch.setattr(ocr, "_recognize", recognize)
+    return calls
+
+
+def test_concurrent_requests_share_one_ocr_job(slow_recognize):
+    async def run():
+        return await asyncio.gather(*(ocr.extract_receipt_data(b"same image") for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert [result["text"] for result in results] == ["TOTAL 12.50"] * 3
+    assert len(slow_recognize) == 1
+    assert not ocr._inflight
+
+
+def test_cancelling_the_first_request_does_not_cancel_the_others(slow_recognize):
+    async def run():
+        first = asyncio.create_task(ocr.extract_receipt_data(b"same image"))
+        second = asyncio.create_task(ocr.extract_receipt_data(b"same image"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return result
+
+    assert asyncio.run(run())["text"] == "TOTAL 12.50"
+    assert len(slow_recognize) == 1
+    assert not ocr._inflight
+
+
+def test_full_queue_turns_away_new_requests_but_not_their_sub_jobs(monkeypatch):
+    monkeypatch.setattr(ocr, "_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(ocr, "_pending_jobs", settings.OCR_MAX_QUEUE)
+
+    with pytest.raises(ocr.OcrQueueFull):
+        asyncio.run(ocr.run_in_pool(len, "first job"))
+    assert asyncio.run(ocr.run_in_pool(len, "strip", sub_job=True)) == 5
+    assert ocr._pending_jobs == settings.OCR_MAX_QUEUE
+    ocr._executor.shutdown()
+
+
+def test_totals_whitelist_keeps_every_word_the_parser_reads_in_a_totals_band():
+    for word in ["TOTAL", "Balance", "EUR", "chf", "März", "Décembre", "Datum", "$€£¥"]:
+        assert set(word) <= set(ocr._TOTALS_WHITELIST), word
+    text = "TOTAL EUR 1.234,56\nDatum 15. März 2024"
+    assert "".join(c for c in text if c in ocr._TOTALS_WHITELIST + " \n") == text
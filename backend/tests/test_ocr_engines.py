@@ -0,0 +1,30 @@
+import pytest
+import pytesseract
+from PIL import Image
+
+from app import ocr_engines
+from app.config import settings
+
+
+@pytest.fixture
+def image_to_data_raising(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_BACKEND", "pytesseract")
+
+    def set_error(error):
+        def image_to_data(*args, **kwargs):
+            raise error
+        monkeypatch.setattr(pytesseract, "image_to_data", image_to_data)
+
+    return set_error
+
+
+def test_pytesseract_timeout_is_a_timeout_error(image_to_data_raising):
+    image_to_data_raising(RuntimeError("Tesseract process timeout"))
+    with pytest.raises(TimeoutError):
+        ocr_engines.image_to_data(Image.new("L", (10, 10)), timeout=1)
+
+
+def test_tesseract_errors_are_not_timeouts(image_to_data_raising):
+    image_to_data_raising(pytesseract.TesseractError(1, "Failed loading language 'xyz'"))
+    with pytest.raises(pytesseract.TesseractError):
+        ocr_engines.image_to_data(Image.new("L", (10, 10)), timeout=1)
@@ -0,0 +1,61 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from app import parser
+
+
+def test_main_writes_one_record_per_input_line(tmp_path, capsys):
+    source = tmp_path / "texts.ndjson"
+    source.write_text('"TOTAL 12.50"\n{"bad": 1}\n\n{"text": "TOTAL 3.00"}\nnot json\n42\n', encoding="utf-8")
+
+    parser.main([str(source), "--workers", "1", "--chunksize", "2"])
+
+    captured = capsys.readouterr()
+    records = [json.loads(line) for line in captured.out.splitlines()]
+    assert [record.get("amount") for record in records] == ["12.50", None, None, "3.00", None, None]
+    assert ["error" in record for record in records] == [False, True, True, False, True, True]
+    assert "blank line" in records[2]["error"]
+    assert "4 input lines could not be read" in captured.err
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("REWE\n1 KAFFEE\nKAFFEE 1 299,00\nSUMME 305,50\n", "305.50"),
+    ("SHOP\nTOTAL 2 149.99\n", "149.99"),
+    ("Store #12 112.97\n", "112.97"),
+    ("SHOP\n12:45 128.00\n", "128.00"),
+    ("MARKT\nQTY 3 100.00\nTOTAL 300.00 EUR\n", "300.00"),
+])
+def test_parse_receipt_keeps_quantities_store_numbers_and_times_apart_from_prices(text, amount):
+    assert parser.parse_receipt(text, "de-DE")["amount"] == Decimal(amount)
+
+
+def test_tokenize_joins_plain_space_groups_only_next_to_a_currency():
+    def amounts(text):
+        return [text[start:end] for kind, start, end, _ in parser.tokenize(text) if kind == "money"]
+
+    assert amounts("KAFFEE 1 299,00") == ["299,00"]
+    assert amounts("KAFFEE 1 299,00 €") == ["1 299,00"]
+    assert amounts("€ 12 345 678,90") == ["12 345 678,90"]
+    assert amounts("#12 112.97 EUR") == ["112.97"]
+
+
+@pytest.mark.parametrize("text", [
+    "SHOP\nTOTAL 12.50\n01/02/2024",
+    # The total keyword's line has no amount: fall back to the whole receipt
+    "SHOP\nTOTAL\n12.50 EUR\n3.00\n1.2.24",
+    "SHOP\nNo keyword 7,25 \u20ac\n15 Mar 2024",
+    # The currency code and sign are off the keyword lines
+    "CHF\nITEM $3.00\nSUBTOTAL 9.90\nTOTAL 10.00\nDate: 2024-03-15",
+    "MARKT\n\u20ac 1 234,56\nSumme EUR 1 234,56 15.03.2024\n",
+])
+def test_parse_receipt_reads_the_same_fields_as_a_full_tokenize(text):
+    tokens = parser.tokenize(text)
+    total = parser._money_from_tokens(text, tokens)
+    assert parser.parse_receipt(text, "de-DE") == {
+        "amount": total[0] if total else None,
+        "date": parser._date_from_tokens(text, tokens, "de-DE")[0],
+        "merchant": text.split("\n")[0],
+        "currency": (total and total[1]) or parser._currency_from_tokens(text, tokens),
+    }
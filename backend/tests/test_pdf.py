@@ -0,0 +1,78 @@
+import asyncio
+import io
+
+import pypdfium2 as pdfium
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from app import ocr, ocr_engines, pdf, uploads
+from app.config import settings
+
+
+@pytest.fixture
+def scanned_pdf():
+    # Pages of different widths and no text layer, as a scanner makes them
+    pages = [Image.new("L", (100 + 50 * i, 300), 255) for i in range(5)]
+    buffer = io.BytesIO()
+    pages[0].save(buffer, "PDF", save_all=True, append_images=pages[1:], resolution=72)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def fake_tesseract(monkeypatch):
+    # One word per page: the width the page was rendered at
+    def image_to_data(image, timeout, psm=None, whitelist=None):
+        return [{"text": str(image.width), "conf": 90.0, "left": 0, "top": 0, "width": 10, "height": 10,
+                 "block": 1, "line": 1}]
+
+    monkeypatch.setattr(ocr_engines, "image_to_data", image_to_data)
+    monkeypatch.setattr(settings, "OCR_PDF_DPI", 72)
+    monkeypatch.setattr(settings, "OCR_PREPROCESS_DOWNSCALE", False)
+    monkeypatch.setattr(settings, "OCR_PREPROCESS_CROP", False)
+
+
+def test_ocr_pages_reads_pages_in_the_requested_order(scanned_pdf, fake_tesseract):
+    pages = pdf.ocr_pages(scanned_pdf, [3, 0], timeout=5)
+    assert [layout_lines[0][0]["text"] for layout_lines in pages] == ["250", "100"]
+
+
+def test_scanned_pdf_is_sent_to_each_worker_once(scanned_pdf, fake_tesseract, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_WORKERS", 2)
+    jobs = []
+
+    async def run_in_pool(func, *args, timeout=None, sub_job=False):
+        jobs.append((func.__name__, sub_job))
+        return func(*args)
+
+    monkeypatch.setattr(ocr, "run_in_pool", run_in_pool)
+    result = asyncio.run(ocr._recognize_pdf(scanned_pdf))
+
+    # Only the first job can be turned away by a full queue
+    assert jobs == [("text_layer", False), ("ocr_pages", True), ("ocr_pages", True)]
+    assert result["text"].split() == ["100", "150", "200", "250", "300"]
+
+
+@pytest.fixture
+def huge_page_pdf():
+    # A few hundred bytes that would render at 1.6 gigapixels at 200 dpi
+    document = pdfium.PdfDocument.new()
+    document.new_page(14400, 14400)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    document.close()
+    return buffer.getvalue()
+
+
+def test_pages_too_large_to_render_are_rejected(huge_page_pdf, scanned_pdf):
+    with pytest.raises(HTTPException) as error:
+        uploads.check_pdf_header(huge_page_pdf, "huge.pdf")
+    assert error.value.status_code == 413
+    uploads.check_pdf_header(scanned_pdf, "scan.pdf")
+
+
+def test_render_page_never_exceeds_the_pixel_limit(huge_page_pdf, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_MAX_PIXELS", 1_000_000)
+    image = pdf.render_page(huge_page_pdf, 0, dpi=48)
+    assert image.width * image.height <= 1_000_000
+    assert image.width > 900
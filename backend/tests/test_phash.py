@@ -0,0 +1,98 @@
+import io
+import itertools
+import random
+import uuid
+
+import pytest
+from PIL import Image
+
+from app import phash
+from app.config import settings
+from bench import synth
+
+
+def _reencode(image_data: bytes, scale: float) -> bytes:
+    image = Image.open(io.BytesIO(image_data)).convert("L")
+    image = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=70)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    receipts = list(synth.generate(150, seed=1))
+    return receipts, [phash.dct_hash(receipt.image) for receipt in receipts]
+
+
+def test_distinct_receipts_are_not_duplicates(corpus):
+    receipts, hashes = corpus
+    pairs = list(itertools.combinations(range(len(receipts)), 2))
+    close_pairs = [
+        (a, b) for a, b in pairs if phash.hamming(hashes[a], hashes[b]) <= settings.DUPLICATE_MAX_DISTANCE
+    ]
+    # A few lookalikes at hash resolution are expected; they are told apart by amount and date
+    assert len(close_pairs) < len(pairs) * 0.005
+    assert not [
+        (a, b) for a, b in close_pairs
+        if receipts[a].truth["amount"] == receipts[b].truth["amount"]
+        and receipts[a].truth["date"] == receipts[b].truth["date"]
+    ]
+
+
+def test_reencoded_receipt_is_found(corpus):
+    receipts, hashes = corpus
+    index = phash.HammingIndex()
+    for position, value in enumerate(hashes):
+        index.add(value, position)
+
+    found = 0
+    for position, receipt in enumerate(receipts[:30]):
+        matches = index.search(phash.dct_hash(_reencode(receipt.image, 0.8)), settings.DUPLICATE_MAX_DISTANCE)
+        found += position in [item_id for _, item_id in matches]
+    assert found >= 27
+
+
+def _flip(value: int, bits: list[int]) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_hamming_index_search_matches_brute_force():
+    rng = random.Random(3)
+    index = phash.HammingIndex()
+    base = rng.getrandbits(64)
+    stored = {}
+    # Near copies at every distance up to 12, and unrelated hashes
+    for distance in range(13):
+        for _ in range(3):
+            stored[uuid.uuid4()] = _flip(base, rng.sample(range(64), distance))
+    for _ in range(200):
+        stored[uuid.uuid4()] = rng.getrandbits(64)
+    for item_id, value in stored.items():
+        index.add(value, item_id)
+
+    for max_distance in (0, 3, 7, 8, 10):
+        expected = sorted(
+            (phash.hamming(base, value), item_id) for item_id, value in stored.items()
+            if phash.hamming(base, value) <= max_distance
+        )
+        found = index.search(base, max_distance)
+        assert sorted(found) == expected
+        assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_hamming_index_discard_and_re_add():
+    index = phash.HammingIndex()
+    item_id = uuid.uuid4()
+    index.add(0, item_id)
+    index.add(0xFFFF, item_id)
+    assert len(index) == 1
+    assert index.search(0, 8) == []
+    assert index.search(0xFFFF, 0) == [(0, item_id)]
+
+    index.discard(item_id)
+    index.discard(item_id)
+    assert len(index) == 0
+    assert index.search(0xFFFF, 8) == []
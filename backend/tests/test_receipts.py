@@ -0,0 +1,56 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from app import crud, merchants, ocr, phash, receipts
+
+TEXT = "CORNER BAKERY\nTOTAL 4.20\n05/01/2024"
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch):
+    calls = []
+
+    async def run_in_pool(func, *args, timeout=None):
+        calls.append(func.__name__)
+        return 0x0123456789ABCDEF if func is phash.dct_hash else "a" * 64
+
+    async def extract_receipt_data(image_data):
+        calls.append("ocr")
+        return {"text": TEXT, "words": []}
+
+    async def get_exchange_rate(base_currency, target_currency):
+        return Decimal("1")
+
+    monkeypatch.setattr(ocr, "run_in_pool", run_in_pool)
+    monkeypatch.setattr(ocr, "extract_receipt_data", extract_receipt_data)
+    monkeypatch.setattr(crud.currency, "get_exchange_rate", get_exchange_rate)
+    monkeypatch.setattr(phash, "index", phash.HammingIndex())
+    monkeypatch.setattr(merchants, "index", merchants.MerchantIndex())
+    return calls
+
+
+def test_a_file_ingested_before_is_not_ocred_again(sessions, ocr_calls):
+    async def run():
+        async with sessions() as db:
+            first = await receipts.ingest_receipt(db, b"receipt scan", admit=False)
+            assert ocr_calls == ["dct_hash", "ocr", "store"]
+
+            ocr_calls.clear()
+            second = await receipts.ingest_receipt(db, b"receipt scan", admit=False)
+            assert ocr_calls == []
+            assert (second.amount, second.duplicate_of, second.image_hash) == (
+                Decimal("4.20"), first.id, first.image_hash
+            )
+
+            with pytest.raises(HTTPException) as error:
+                await receipts.ingest_receipt(db, b"receipt scan", reject_duplicate=True, admit=False)
+            assert error.value.status_code == 409 and ocr_calls == []
+
+            # Any other file is OCRed, even if it hashes to the same image
+            await receipts.ingest_receipt(db, b"another scan", admit=False)
+            assert ocr_calls == ["dct_hash", "ocr", "store"]
+
+    asyncio.run(run())
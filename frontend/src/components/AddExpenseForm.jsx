@@ -9,6 +9,7 @@ function AddExpenseForm({ onExpenseAdded }) {
     currency: 'USD',
     category: '',
     date: new Date().toISOString().split('T')[0], // Defaults to today
+    ocr_text: null, // Raw text of an uploaded receipt, stored with the expense
   });
   const [error, setError] = useState('');
 
@@ -19,7 +20,9 @@ function AddExpenseForm({ onExpenseAdded }) {
       // Use the OCR data if available, otherwise keep the existing value
       merchant: ocrData.merchant || prevState.merchant,
       amount: ocrData.amount || prevState.amount,
+      currency: ocrData.currency || prevState.currency,
       date: ocrData.date ? new Date(ocrData.date).toISOString().split('T')[0] : prevState.date,
+      ocr_text: ocrData.text || null,
     }));
   };
 
@@ -51,6 +54,7 @@ function AddExpenseForm({ onExpenseAdded }) {
         currency: 'USD',
         category: '',
         date: new Date().toISOString().split('T')[0],
+        ocr_text: null,
       });
     } catch (err) {
       setError('Failed to add expense.');
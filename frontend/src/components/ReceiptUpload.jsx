@@ -21,8 +21,8 @@ function ReceiptUpload({ onOcrComplete }) {
           'Content-Type': 'multipart/form-data',
         },
       });
-      // Pass the parsed data up to the parent component
-      onOcrComplete(response.data.parsed_data);
+      // Pass the parsed data and the OCR text up to the parent component
+      onOcrComplete({ ...response.data.parsed_data, text: response.data.text });
     } catch (err) {
       setError('Failed to process receipt. Please try again.');
       console.error(err);